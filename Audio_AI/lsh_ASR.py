@@ -1,11 +1,16 @@
 import numpy as np
 import logging
-import whisper
+import os
+import struct
+import time
+import wave
 from scipy.signal import resample, butter, lfilter  # 用于滤波和重采样
 from scipy.io import wavfile  # 用于保存调试音频
 
-import librosa
-import matplotlib.pyplot as plt
+from Audio_AI.lsh_mel import MelFeatureExtractor, plot_mel
+from Audio_AI.lsh_asr_backend import create_backend
+from client.lshMetrics import METRICS
+from client.sampleFormat import downmix, to_float32
 
 # 配置日志
 logging.basicConfig(
@@ -14,12 +19,138 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 识别各阶段耗时
+_STAGE_HELP = "pcmToText各阶段耗时"
+_STAGE_RESAMPLE = METRICS.histogram("asr_stage_seconds", _STAGE_HELP, {"stage": "resample"})
+_STAGE_FILTER = METRICS.histogram("asr_stage_seconds", _STAGE_HELP, {"stage": "filter"})
+_STAGE_NORMALIZE = METRICS.histogram("asr_stage_seconds", _STAGE_HELP, {"stage": "normalize"})
+_STAGE_TRANSCRIBE = METRICS.histogram("asr_stage_seconds", _STAGE_HELP, {"stage": "transcribe"})
+_AUDIO_SECONDS = METRICS.counter("asr_audio_seconds_total", "送入识别的音频总时长")
+_CASCADE_UTTERANCES = METRICS.counter("asr_cascade_utterances_total", "级联模式识别的语音段数")
+_CASCADE_ESCALATIONS = METRICS.counter("asr_cascade_escalations_total", "级联模式升级到大模型的次数")
+
+# 级联模式默认升级阈值（任一分段不满足即升级到大模型）
+CASCADE_THRESHOLDS = {
+    "min_avg_logprob": -0.8,      # 平均对数概率低于该值视为置信度不足
+    "max_compression_ratio": 2.4, # 压缩比过高说明出现重复/幻觉
+    "max_no_speech_prob": 0.6,    # 无语音概率过高
+}
+
+# 识别结果异常时的提示文本（模型输出"lalala"或空结果）
+GARBAGE_TEXTS = ["lalala", "la la", "啦啦啦", ""]
+GARBAGE_HINT = "识别结果异常（可能原始音频噪音过大或语音不清晰），请先检查 debug_cleaned_audio.wav 是否清晰"
+
+
+def load_audio_file(path, sample_rate=16000, channels=1):
+    """
+    读取离线音频文件，统一返回 (int16数组, 采样率, 声道数)
+    .pcm: 裸16位小端PCM，采样率/声道数需外部指定
+    .wav: 用wave模块读取头信息（仅支持16位）
+    其他(.mp3等): 交给whisper.load_audio(依赖ffmpeg)，输出16kHz单声道
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pcm":
+        return np.fromfile(path, dtype=np.int16), sample_rate, channels
+    if ext == ".wav":
+        with wave.open(path, "rb") as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"仅支持16位WAV: {path}")
+            frames = wf.readframes(wf.getnframes())
+            return np.frombuffer(frames, dtype=np.int16), wf.getframerate(), wf.getnchannels()
+    import whisper
+    audio = whisper.load_audio(path)  # float32 [-1, 1], 16kHz
+    return (audio * 32767).astype(np.int16), 16000, 1
+
+
+def open_audio_memmap(path, sample_rate=16000, channels=1):
+    """
+    以内存映射方式打开.pcm/.wav文件，不把整段音频读入内存
+    返回 (形状为(采样组数, 声道数)的int16 memmap, 采样率, 声道数)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    offset = 0
+    available = os.path.getsize(path)
+    length = None
+    if ext == ".wav":
+        with open(path, "rb") as f:
+            riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave_id != b"WAVE":
+                raise ValueError(f"不是有效的WAV文件: {path}")
+            # 逐个跳过RIFF块，找到fmt和data块
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"WAV文件缺少data块: {path}")
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = f.read(chunk_size)
+                    channels, sample_rate = struct.unpack("<HI", fmt[2:8])
+                    if struct.unpack("<H", fmt[14:16])[0] != 16:
+                        raise ValueError(f"仅支持16位WAV: {path}")
+                    f.seek(chunk_size % 2, 1)
+                elif chunk_id == b"data":
+                    offset = f.tell()
+                    available -= offset
+                    # 只映射data块本身，后面可能还有LIST等块；
+                    # 长度为0或超出文件（录音未正常结束、头部未回写）时取到文件末尾
+                    if 0 < chunk_size <= available:
+                        length = chunk_size
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+    elif ext != ".pcm":
+        raise ValueError(f"长音频模式仅支持.pcm/.wav: {path}")
+    data = np.memmap(path, dtype=np.int16, mode="r", offset=offset, shape=((length or available) // 2,))
+    usable = len(data) - len(data) % channels
+    return data[:usable].reshape(-1, channels), sample_rate, channels
+
+
+def _segments_for_cache(segments):
+    """只保留可JSON序列化、下游会用到的分段字段"""
+    keys = ("start", "end", "text", "avg_logprob", "compression_ratio", "no_speech_prob")
+    return [{k: seg[k] for k in keys if k in seg} for seg in segments]
+
+
 class ASRTransform:
-    def __init__(self, language="zh"):
+    def __init__(self, language="zh", model_name="small", cache=None, backend=None,
+                 cascade_model=None, cascade_thresholds=None, **backend_options):
+        """
+        language: 识别语言
+        model_name: Whisper模型名称
+        cache: 可选的TranscriptCache，相同音频+相同解码参数直接返回缓存结果
+        backend: 推理后端 "whisper"（默认）或 "faster-whisper"（CPU int8量化），
+                 未指定时读取环境变量 ASR_BACKEND
+        cascade_model: 级联模式的小模型（如"tiny"），先用它识别，置信度不足或结果异常时再用model_name识别
+        cascade_thresholds: 级联升级阈值，默认见 CASCADE_THRESHOLDS
+        backend_options: 透传给后端的参数（如 compute_type、cpu_threads）
+        """
         self.language = language
-        # 1. 改用small模型（平衡识别精度与速度，比base更擅长处理模糊语音）
-        self.model = whisper.load_model("small")
-        logger.info("Whisper small模型加载完成")
+        self.model_name = model_name
+        self.cache = cache
+        # Whisper识别参数调优
+        self.decode_options = {
+            "fp16": False,  # 非NVIDIA显卡禁用
+            "no_speech_threshold": 0.3,  # 降低“无语音”判断阈值（更灵敏捕捉弱语音）
+            "temperature": 0.1,  # 降低随机性（减少模型对“lalala”这类无意义结果的偏好）
+            # "initial_prompt": "这是一段中文语音，内容可能包含日常对话、天气预报等，请注意识别准确的中文词汇。",  # 给模型提示，引导正确识别
+            "word_timestamps": False,  # 关闭词级时间戳，加快识别速度
+        }
+        # 1. 默认small模型（平衡识别精度与速度，比base更擅长处理模糊语音）
+        backend = backend or os.environ.get("ASR_BACKEND", "whisper")
+        self.backend = create_backend(backend, model_name, **backend_options)
+        self.model = self.backend.model
+
+        # 级联模式：小模型先识别
+        self.fast_backend = create_backend(backend, cascade_model, **backend_options) if cascade_model else None
+        self.cascade_thresholds = {**CASCADE_THRESHOLDS, **(cascade_thresholds or {})}
+        self.cascade_stats = {
+            "utterances": 0,
+            "escalations": 0,
+            "reasons": {"low_logprob": 0, "compression_ratio": 0, "no_speech": 0, "garbage": 0},
+            "fast_seconds": 0.0,   # 小模型累计耗时
+            "slow_seconds": 0.0,   # 大模型累计耗时
+            "audio_seconds": 0.0,
+        }
 
     def butter_bandpass_filter(self, data, lowcut, highcut, fs, order=5):
         """带通滤波器：保留人声频率（300-3400Hz，人类语音核心频率范围），过滤高低频噪音"""
@@ -108,60 +239,233 @@ class ASRTransform:
             return data  # 无有效非静音段，返回原始数据
         return np.concatenate(non_silence_data)
 
-    def pcmToText(self, pcm_stream, sample_rate=8000, sample_width=2, channels=1):
-        try:
-            # -------------------------- 1. 基础PCM转换 --------------------------
-            # 将PCM字节流转换为16位整数数组（原始音频数据）
+    def preprocess(self, pcm_stream, sample_rate=8000, channels=1, sample_width=2):
+        """PCM前处理：转int16 → 单声道 → 重采样到16kHz → 带通滤波 → 归一化，输出float32"""
+        # -------------------------- 1. 基础PCM转换 --------------------------
+        # 将PCM字节流转换为16位整数数组（原始音频数据），已是数组时直接使用
+        if isinstance(pcm_stream, np.ndarray):
+            audio_int16 = pcm_stream.astype(np.int16, copy=False)
+        elif sample_width != 2:
+            # I2S 24/32位采样：一次遍历转成float32并下混为单声道，保留全部精度（后面会峰值归一化，幅度尺度不影响结果）
+            audio_int16 = to_float32(pcm_stream, sample_width, channels)
+            channels = 1
+        else:
             audio_int16 = np.frombuffer(pcm_stream, dtype=np.int16)
-            logger.info(f"原始音频长度：{len(audio_int16)} 采样点，采样率：{sample_rate}Hz")
-
-            # -------------------------- 2. 多声道转单声道 --------------------------
-            if channels > 1:
-                logger.info(f"将{channels}声道转换为单声道")
-                # 重塑为（采样组数，声道数），再对声道求平均
-                audio_int16 = audio_int16.reshape(-1, channels).mean(axis=1).astype(np.int16)
-
-            # -------------------------- 3. 重采样到16kHz（Whisper最优输入） --------------------------
-            if sample_rate != 16000:
-                logger.info(f"从{sample_rate}Hz重采样到16000Hz")
-                # 计算重采样后的采样点数（保证时长不变）
-                num_samples = int(len(audio_int16) * 16000 / sample_rate)
+        logger.info(f"原始音频长度：{len(audio_int16)} 采样点，采样率：{sample_rate}Hz")
+
+        # -------------------------- 2. 多声道转单声道 --------------------------
+        if channels > 1:
+            logger.info(f"将{channels}声道转换为单声道")
+            # 重塑为（采样组数，声道数），再对声道求平均（float32累加，不产生float64临时数组）
+            audio_int16 = downmix(audio_int16.reshape(-1, channels))
+
+        # -------------------------- 3. 重采样到16kHz（Whisper最优输入） --------------------------
+        if sample_rate != 16000:
+            logger.info(f"从{sample_rate}Hz重采样到16000Hz")
+            # 计算重采样后的采样点数（保证时长不变）
+            num_samples = int(len(audio_int16) * 16000 / sample_rate)
+            with METRICS.timer(_STAGE_RESAMPLE):
                 audio_resampled = resample(audio_int16, num_samples)
-            else:
-                audio_resampled = audio_int16.astype(np.float32)
+        else:
+            audio_resampled = audio_int16.astype(np.float32)
 
-            # -------------------------- 4. 核心音频增强（关键步骤） --------------------------
-            # 4.1 带通滤波：保留人声频率（300-3400Hz），过滤低频噪音（如电流声）和高频噪音（如尖锐杂音）
+        # -------------------------- 4. 核心音频增强（关键步骤） --------------------------
+        # 4.1 带通滤波：保留人声频率（300-3400Hz），过滤低频噪音（如电流声）和高频噪音（如尖锐杂音）
+        with METRICS.timer(_STAGE_FILTER):
             audio_filtered = self.butter_bandpass_filter(audio_resampled, 300, 3400, 16000)
-            # 4.2 归一化：统一音量，避免忽大忽小
+        # 4.2 归一化：统一音量，避免忽大忽小
+        with METRICS.timer(_STAGE_NORMALIZE):
             audio_normalized = self.normalize_audio(audio_filtered)
-            # # 4.3 去除静音段：减少无意义静音对模型的干扰
-            # audio_cleaned = self.remove_silence(audio_normalized, 16000)
-
-            # -------------------------- 5. 保存调试音频（验证处理效果） --------------------------
-            # 保存处理后的音频为WAV文件，手动听是否清晰
-            # wavfile.write("debug_cleaned_audio.wav", 16000, audio_cleaned.astype(np.float32))
-            # logger.info("处理后的音频已保存到：debug_cleaned_audio.wav")
-
-            audio_data = audio_normalized.astype(np.float32)
-
-            # -------------------------- 6. Whisper识别参数调优 --------------------------
-            result = self.model.transcribe(
-                audio_data,
-                language=self.language,
-                fp16=False,  # 非NVIDIA显卡禁用
-                no_speech_threshold=0.3,  # 降低“无语音”判断阈值（更灵敏捕捉弱语音）
-                temperature=0.1,  # 降低随机性（减少模型对“lalala”这类无意义结果的偏好）
-                # initial_prompt="这是一段中文语音，内容可能包含日常对话、天气预报等，请注意识别准确的中文词汇。",  # 给模型提示，引导正确识别
-                word_timestamps=False  # 关闭词级时间戳，加快识别速度
-            )
+        # # 4.3 去除静音段：减少无意义静音对模型的干扰
+        # audio_cleaned = self.remove_silence(audio_normalized, 16000)
+
+        # -------------------------- 5. 保存调试音频（验证处理效果） --------------------------
+        # 保存处理后的音频为WAV文件，手动听是否清晰
+        # wavfile.write("debug_cleaned_audio.wav", 16000, audio_cleaned.astype(np.float32))
+        # logger.info("处理后的音频已保存到：debug_cleaned_audio.wav")
+
+        return audio_normalized.astype(np.float32)
+
+    def transcribe(self, pcm_stream, sample_rate=8000, sample_width=2, channels=1):
+        """
+        完整识别流程，返回whisper原始结果字典（包含text和segments），供批处理/索引使用
+        异常直接抛出，由调用方决定如何处理
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(pcm_stream, self.cacheParams(sample_rate, channels, sample_width))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("命中识别缓存")
+                return {"text": cached["text"], "segments": cached["segments"], "language": self.language}
+
+        audio_data = self.preprocess(pcm_stream, sample_rate, channels, sample_width)
+        result = self._decode(audio_data)
+        if cache_key is not None:
+            self.cache.put(cache_key, result["text"], _segments_for_cache(result.get("segments", [])))
+        return result
+
+    def cacheParams(self, sample_rate, channels, sample_width=2):
+        """影响识别结果的全部参数，作为缓存键的一部分（16位输入不写入采样宽度，保持已有缓存键不变）"""
+        params = {
+            **self.backend.describe(),
+            "language": self.language,
+            "sample_rate": sample_rate,
+            "channels": channels,
+            **self.decode_options,
+        }
+        if sample_width != 2:
+            params["sample_width"] = sample_width
+        if self.fast_backend is not None:
+            params["cascade"] = {**self.fast_backend.describe(), **self.cascade_thresholds}
+        return params
+
+    def _decode(self, audio_data):
+        """对前处理后的16kHz float32音频执行识别（由所选后端完成）"""
+        # -------------------------- 6. Whisper识别 --------------------------
+        if METRICS.enabled:
+            _AUDIO_SECONDS.inc(len(audio_data) / 16000)
+        if self.fast_backend is not None:
+            return self._decode_cascade(audio_data)
+        with METRICS.timer(_STAGE_TRANSCRIBE):
+            result = self.backend.transcribe(audio_data, self.language, **self.decode_options)
+        result["text"] = result["text"].strip()
+        return result
+
+    def _escalation_reason(self, result):
+        """判断小模型结果是否需要升级，返回原因（不需要时返回None）"""
+        if result["text"].lower() in GARBAGE_TEXTS:
+            return "garbage"
+        thresholds = self.cascade_thresholds
+        for seg in result.get("segments", []):
+            if seg.get("compression_ratio", 0.0) > thresholds["max_compression_ratio"]:
+                return "compression_ratio"
+            if seg.get("no_speech_prob", 0.0) > thresholds["max_no_speech_prob"]:
+                return "no_speech"
+            if seg.get("avg_logprob", 0.0) < thresholds["min_avg_logprob"]:
+                return "low_logprob"
+        return None
+
+    def _decode_cascade(self, audio_data):
+        """级联识别：小模型 → (置信度不足/结果异常) → 大模型"""
+        stats = self.cascade_stats
+        stats["utterances"] += 1
+        stats["audio_seconds"] += len(audio_data) / 16000
+        if METRICS.enabled:
+            _CASCADE_UTTERANCES.inc()
+
+        start = time.perf_counter()
+        with METRICS.timer(_STAGE_TRANSCRIBE):
+            result = self.fast_backend.transcribe(audio_data, self.language, **self.decode_options)
+        stats["fast_seconds"] += time.perf_counter() - start
+        result["text"] = result["text"].strip()
+
+        reason = self._escalation_reason(result)
+        if reason is None:
+            result["model"] = self.fast_backend.model_name
+            return result
+
+        logger.info(f"小模型结果置信度不足（{reason}），升级到{self.model_name}模型")
+        stats["escalations"] += 1
+        stats["reasons"][reason] += 1
+        if METRICS.enabled:
+            _CASCADE_ESCALATIONS.inc()
+        start = time.perf_counter()
+        with METRICS.timer(_STAGE_TRANSCRIBE):
+            result = self.backend.transcribe(audio_data, self.language, **self.decode_options)
+        stats["slow_seconds"] += time.perf_counter() - start
+        result["text"] = result["text"].strip()
+        result["model"] = self.model_name
+        result["escalation_reason"] = reason
+        return result
+
+    def cascadeReport(self):
+        """级联模式统计：升级率、平均每段耗时、整体实时率，用于调节阈值"""
+        stats = self.cascade_stats
+        n = stats["utterances"]
+        total = stats["fast_seconds"] + stats["slow_seconds"]
+        return {
+            "utterances": n,
+            "escalations": stats["escalations"],
+            "escalation_rate": stats["escalations"] / n if n else 0.0,
+            "reasons": dict(stats["reasons"]),
+            "avg_cost_seconds": total / n if n else 0.0,
+            "avg_fast_seconds": stats["fast_seconds"] / n if n else 0.0,
+            "avg_slow_seconds": stats["slow_seconds"] / stats["escalations"] if stats["escalations"] else 0.0,
+            "rtf": total / stats["audio_seconds"] if stats["audio_seconds"] else 0.0,
+        }
+
+    def _find_quiet_cut(self, frames, search_start, search_end, fs):
+        """在[search_start, search_end)范围内找能量最低的20ms帧中心作为切分点（近似VAD边界）"""
+        frame_len = int(fs * 0.02)
+        region = frames[search_start:search_end]
+        if region.shape[0] < frame_len * 2:
+            return search_end
+        mono = region.mean(axis=1, dtype=np.float32) if region.shape[1] > 1 else region[:, 0].astype(np.float32)
+        n_frames = len(mono) // frame_len
+        energy = np.square(mono[:n_frames * frame_len]).reshape(n_frames, frame_len).mean(axis=1)
+        return search_start + int(np.argmin(energy)) * frame_len + frame_len // 2
+
+    def transcribeLong(self, source, sample_rate=16000, channels=1,
+                       window_seconds=30.0, overlap_seconds=1.0, search_seconds=5.0):
+        """
+        长音频模式：内存映射读取，按约30秒窗口分段识别，再拼接分段结果
+        source: .pcm/.wav路径，或已打开的(采样组数, 声道数)数组
+        window_seconds: 每个窗口最大时长
+        overlap_seconds: 相邻窗口重叠时长（防止切分点处丢字）
+        search_seconds: 在窗口末尾多长范围内寻找静音切分点
+        峰值内存只与窗口长度有关，与文件总时长无关
+        """
+        if isinstance(source, str):
+            frames, sample_rate, channels = open_audio_memmap(source, sample_rate, channels)
+        else:
+            frames = np.asarray(source).reshape(-1, channels)
+        total = frames.shape[0]
+        window = int(window_seconds * sample_rate)
+        overlap = int(overlap_seconds * sample_rate)
+        search = int(search_seconds * sample_rate)
+        logger.info(f"长音频模式：总时长{total / sample_rate:.1f}秒，窗口{window_seconds}秒")
+
+        segments = []
+        texts = []
+        stitched_until = 0.0  # 已拼接结果的结束时间（秒）
+        start = 0
+        while start < total:
+            end = min(start + window, total)
+            if end < total:
+                # 窗口末尾对齐到静音处，减少切断单词
+                end = self._find_quiet_cut(frames, max(end - search, start + overlap + 1), end, sample_rate)
+            # 只拷贝当前窗口的数据
+            chunk = np.ascontiguousarray(frames[start:end]).reshape(-1)
+            result = self._decode(self.preprocess(chunk, sample_rate, channels))
+            offset = start / sample_rate
+            for seg in result.get("segments", []):
+                seg = dict(seg)
+                seg["start"] += offset
+                seg["end"] += offset
+                # 重叠区域里上一个窗口已经识别过的片段丢弃（以片段中点判断）
+                if (seg["start"] + seg["end"]) / 2 < stitched_until:
+                    continue
+                segments.append(seg)
+                texts.append(seg["text"].strip())
+                stitched_until = seg["end"]
+            if end >= total:
+                break
+            start = max(end - overlap, start + 1)
+
+        return {"text": "".join(texts) if self.language == "zh" else " ".join(texts),
+                "segments": segments, "language": self.language}
+
+    def pcmToText(self, pcm_stream, sample_rate=8000, sample_width=2, channels=1):
+        try:
+            result = self.transcribe(pcm_stream, sample_rate, sample_width, channels)
 
             # -------------------------- 7. 结果处理 --------------------------
-            text = result["text"].strip()
+            text = result["text"]
             logger.info(f"最终识别结果：{text}")
             # 若结果仍为“lalala”，提示检查原始音频
-            if text.lower() in ["lalala", "la la", "啦啦啦", ""]:
-                return "识别结果异常（可能原始音频噪音过大或语音不清晰），请先检查 debug_cleaned_audio.wav 是否清晰"
+            if text.lower() in GARBAGE_TEXTS:
+                return GARBAGE_HINT
             return text
 
         except Exception as e:
@@ -169,33 +473,26 @@ class ASRTransform:
             return f"处理错误: {str(e)}"
 
 
-    def mel(self, pcmData, sample=16000,n_mels=80):
+    def mel(self, pcmData, sample=16000, n_mels=80, plot=False):
+        """
+        计算log-mel谱（dB，以本段最大能量为0dB参考），返回float32数组 (n_mels, 帧数)
+        pcmData 可以是单段 (样本数,) 或批量 (条数, 样本数)
+        plot=True 时弹出谱图（仅调试用）
+        """
         n_fft = 512 #傅立叶变换的单位片段采样点数
         hop_length = 160 #分帧： 10ms in 16000
-        mes_spectrogram = librosa.feature.melspectrogram(
-            y = pcmData,
-            sr = sample,
-            n_fft = n_fft,
-            hop_length = hop_length,
-            n_mels = n_mels
-        )
-        #ref=np.max 表示以这段音频中最大能量最为0db点的参考值
-        # db = 10 * log10(P/Pref) , P表示当前信号了，Pref 人为定义的参考量
-        mel_spectrogram_db = librosa.power_to_db(mes_spectrogram, ref=np.max)
-        
-        #可视化
-        plt.figure(figsize=(10, 4))
-        librosa.display.specshow(mel_spectrogram_db, sr=sample,hop_length=hop_length,x_axis='time',y_axis='mel')
-        plt.colorbar(format='%2.0f dB')
-        plt.title('Mel Spectrogram')
-        plt.show()
+        extractor = MelFeatureExtractor(sr=sample, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels)
+        mel_spectrogram_db = extractor.log_mel(pcmData)
+        if plot:
+            plot_mel(mel_spectrogram_db, sr=sample, hop_length=hop_length)
+        return mel_spectrogram_db
 
 # 测试代码
 if __name__ == '__main__':
     pcm_data = np.fromfile("./demo/Audio_AI/test.pcm", dtype=np.int16)
     audio = pcm_data.astype(np.float32) / 32768.0
     transform = ASRTransform(language="zh")
-    transform.mel(audio)
+    transform.mel(audio, plot=True)
 
     import time
     while True:
@@ -0,0 +1,88 @@
+import logging
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 统一输出的分段字段
+SEGMENT_KEYS = ("start", "end", "text", "avg_logprob", "compression_ratio", "no_speech_prob")
+
+
+class WhisperBackend:
+    """openai-whisper（PyTorch）推理后端，即原有实现"""
+    name = "whisper"
+
+    def __init__(self, model_name="small", device="cpu"):
+        import whisper
+        self.model_name = model_name
+        self.model = whisper.load_model(model_name, device=device)
+
+    def describe(self):
+        return {"backend": self.name, "model": self.model_name}
+
+    def transcribe(self, audio_data, language, **options):
+        """audio_data: 16kHz float32；options 为whisper原生的解码参数"""
+        result = self.model.transcribe(audio_data, language=language, **options)
+        return {
+            "text": result["text"],
+            "segments": [{k: seg[k] for k in SEGMENT_KEYS if k in seg} for seg in result["segments"]],
+            "language": result.get("language", language),
+        }
+
+
+class FasterWhisperBackend:
+    """
+    faster-whisper（CTranslate2）推理后端，CPU上默认int8量化
+    解码参数沿用whisper的命名，这里转换成faster-whisper的参数
+    """
+    name = "faster-whisper"
+
+    def __init__(self, model_name="small", device="cpu", compute_type="int8", cpu_threads=0):
+        from faster_whisper import WhisperModel
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def describe(self):
+        return {"backend": self.name, "model": self.model_name, "compute_type": self.compute_type}
+
+    def transcribe(self, audio_data, language, **options):
+        options = dict(options)
+        options.pop("fp16", None)  # 精度由compute_type决定
+        # faster-whisper 默认beam_size=5，openai-whisper在temperature>0时是贪心解码，保持一致
+        options.setdefault("beam_size", 1)
+        segments, info = self.model.transcribe(audio_data, language=language, **options)
+        segments = [
+            {
+                "start": seg.start,
+                "end": seg.end,
+                "text": seg.text,
+                "avg_logprob": seg.avg_logprob,
+                "compression_ratio": seg.compression_ratio,
+                "no_speech_prob": seg.no_speech_prob,
+            }
+            for seg in segments  # 生成器，遍历时才真正解码
+        ]
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": info.language,
+        }
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def create_backend(name, model_name="small", **kwargs):
+    """按名称创建推理后端（whisper / faster-whisper）"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知的识别后端: {name}，可选: {', '.join(BACKENDS)}")
+    backend = BACKENDS[name](model_name=model_name, **kwargs)
+    logger.info(f"识别后端加载完成: {backend.describe()}")
+    return backend
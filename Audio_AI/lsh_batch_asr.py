@@ -0,0 +1,324 @@
+"""
+离线批量转写工具
+
+用法示例（在仓库根目录执行）:
+    python -m Audio_AI.lsh_batch_asr ./recordings -o ./transcripts -j 4
+    python -m Audio_AI.lsh_batch_asr files.txt -o ./transcripts --vector-db ./vector_db
+    python -m Audio_AI.lsh_batch_asr ./recordings -o ./transcripts --vector-db ./shards --sharded --tenant team_a
+
+输入可以是目录（递归查找 .pcm/.wav/.mp3），也可以是清单文件：
+每行一个路径，或每行一个JSON {"path": ..., "sample_rate": ..., "channels": ...}
+每个文件输出 <名称>.txt（文本）和 <名称>.json（分段结果），任务进度追加写入 manifest.jsonl，
+进程崩溃后重新执行同一命令即可跳过已完成文件继续处理。
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".pcm", ".wav", ".mp3")
+MANIFEST_NAME = "manifest.jsonl"
+# 工作进程异常退出（段错误、OOM被杀）后最多重建几次进程池
+MAX_POOL_RESTARTS = 2
+
+# 工作进程内的模型实例（每个进程只加载一次）
+_transform = None
+
+
+def _init_worker(model_name, language, cache_path=None, backend=None):
+    """进程池初始化：每个工作进程加载一次模型"""
+    global _transform
+    from Audio_AI.lsh_ASR import ASRTransform
+    cache = None
+    if cache_path:
+        from Audio_AI.lsh_transcript_cache import TranscriptCache
+        cache = TranscriptCache(db_path=cache_path)
+    _transform = ASRTransform(language=language, model_name=model_name, cache=cache, backend=backend)
+
+
+def _transcribe_job(job):
+    """工作进程执行：读取音频 → 识别，返回文本、分段和耗时"""
+    from Audio_AI.lsh_ASR import load_audio_file, open_audio_memmap
+    long_threshold = job.get("long_threshold")
+    if long_threshold and job["path"].lower().endswith((".pcm", ".wav")):
+        # 超长文件走内存映射分窗模式，避免整段读入内存
+        frames, sample_rate, channels = open_audio_memmap(
+            job["path"], job.get("sample_rate", 16000), job.get("channels", 1)
+        )
+        duration = frames.shape[0] / sample_rate
+        if duration > long_threshold:
+            start = time.perf_counter()
+            result = _transform.transcribeLong(frames, sample_rate=sample_rate, channels=channels)
+            elapsed = time.perf_counter() - start
+            return _job_result(result, duration, elapsed)
+    pcm_data, sample_rate, channels = load_audio_file(
+        job["path"], job.get("sample_rate", 16000), job.get("channels", 1)
+    )
+    duration = len(pcm_data) / channels / sample_rate
+    start = time.perf_counter()
+    result = _transform.transcribe(pcm_data, sample_rate=sample_rate, channels=channels)
+    elapsed = time.perf_counter() - start
+    return _job_result(result, duration, elapsed)
+
+
+def _job_result(result, duration, elapsed):
+    segments = [
+        {
+            "start": seg["start"],
+            "end": seg["end"],
+            "text": seg["text"].strip(),
+            "avg_logprob": seg.get("avg_logprob"),
+            "no_speech_prob": seg.get("no_speech_prob"),
+        }
+        for seg in result.get("segments", [])
+    ]
+    return {"text": result["text"], "segments": segments, "duration": duration, "elapsed": elapsed}
+
+
+def collect_jobs(source, sample_rate=16000, channels=1, long_threshold=None):
+    """从目录或清单文件收集任务列表"""
+    jobs = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    jobs.append({"path": os.path.join(root, name)})
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                jobs.append(json.loads(line) if line.startswith("{") else {"path": line})
+    for job in jobs:
+        job.setdefault("sample_rate", sample_rate)
+        job.setdefault("channels", channels)
+        job.setdefault("long_threshold", long_threshold)
+    return jobs
+
+
+def load_manifest(manifest_path):
+    """读取任务清单，返回 {path: 最后一条记录}；崩溃时写了一半的行直接忽略"""
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["path"]] = record
+    return records
+
+
+def _append_manifest(manifest_file, record):
+    manifest_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+
+
+def _write_atomic(path, content):
+    """先写临时文件再替换，避免崩溃留下半截输出"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _output_stem(job_path, source):
+    """
+    输出文件名：目录输入时保留相对路径结构（用__连接）；
+    清单输入的文件可能来自不同目录，文件名后加上完整路径的短哈希，避免同名文件冲突
+    """
+    if os.path.isdir(source):
+        rel = os.path.relpath(job_path, source)
+        return os.path.splitext(rel)[0].replace(os.sep, "__")
+    digest = hashlib.sha1(os.path.abspath(job_path).encode("utf-8")).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(job_path))[0]}_{digest}"
+
+
+def _recording_id(job_path):
+    """分片模式的录音名：文件名 + 绝对路径的哈希，不同目录下的同名文件、不同批次的输入都不会落到同一个分片"""
+    stem = re.sub(r"[^\w\-.]", "_", os.path.splitext(os.path.basename(job_path))[0])
+    digest = hashlib.sha1(os.path.abspath(job_path).encode("utf-8")).hexdigest()[:12]
+    return f"{stem}_{digest}"
+
+
+def _make_indexer(vector_db, sharded, tenant):
+    """返回 index_text(text, path) -> 是否写入成功"""
+    if not sharded:
+        from Audio_AI.lsh_vector_db import BuildVectorDB
+        db_builder = BuildVectorDB()
+
+        def index_flat(text, path):
+            # 空转写没有可索引的片段，视为已写入，避免每次运行都重试
+            if not text or not text.strip():
+                return True
+            # addTexts 按 source 幂等：写库后、记清单前崩溃，补录时不会重复追加文本块
+            return db_builder.addTexts(text, vector_db, {"source": path}) is not None
+        return index_flat
+
+    from Audio_AI.lsh_sharded_vector_db import ShardedVectorStore
+    store = ShardedVectorStore(vector_db)
+
+    def index_text(text, path):
+        day = time.strftime("%Y%m%d", time.localtime(os.path.getmtime(path))) if os.path.exists(path) else None
+        try:
+            # 每个文件独占一个分片，整片重建：崩溃后补录或重复执行都不会写入重复的文本块
+            return store.rebuildShard([(text, {"source": path})], tenant=tenant, day=day,
+                                      recording=_recording_id(path), wait=True) is not None
+        except Exception as e:
+            logger.error(f"写入分片失败 {path}: {e}")
+            return False
+    return index_text
+
+
+def run_batch(source, output_dir, workers=2, model_name="small", language="zh",
+              sample_rate=16000, channels=1, vector_db=None, retry_failed=False,
+              long_threshold=600.0, cache_path=None, backend=None, sharded=False, tenant="default"):
+    """
+    批量转写主流程
+    source: 目录或清单文件
+    output_dir: 输出目录（包含manifest.jsonl）
+    workers: 进程数
+    vector_db: 持久化向量库目录，为None时不写入
+    retry_failed: 是否重试清单中失败的文件
+    long_threshold: 超过该时长（秒）的.pcm/.wav文件使用长音频分窗模式，None表示不启用
+    cache_path: 识别结果缓存的SQLite文件，为None时不使用缓存
+    backend: 推理后端（whisper / faster-whisper），None时按ASR_BACKEND环境变量
+    sharded: 向量库按 租户/日期/录音 分片写入（日期取文件修改时间，每个文件一个分片）
+    tenant: 分片模式下的租户名
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    records = load_manifest(manifest_path)
+
+    jobs = collect_jobs(source, sample_rate, channels, long_threshold)
+    finished_status = ("done",) if retry_failed else ("done", "failed")
+    pending = [job for job in jobs if records.get(job["path"], {}).get("status") not in finished_status]
+    logger.info(f"共{len(jobs)}个文件，已完成{len(jobs) - len(pending)}个，待处理{len(pending)}个")
+
+    index_text = None
+    if vector_db:
+        index_text = _make_indexer(vector_db, sharded, tenant)
+        # 上次崩溃时已转写但未入库的文件先补录
+        for record in records.values():
+            if record.get("status") == "done" and not record.get("indexed"):
+                with open(record["text_file"], "r", encoding="utf-8") as f:
+                    if index_text(f.read(), record["path"]):
+                        record["indexed"] = True
+                        with open(manifest_path, "a", encoding="utf-8") as manifest_file:
+                            _append_manifest(manifest_file, record)
+
+    total_audio = 0.0
+    total_compute = 0.0
+    wall_start = time.perf_counter()
+    done_count = 0
+    restarts = 0
+    remaining = pending
+    with open(manifest_path, "a", encoding="utf-8") as manifest_file:
+        while remaining:
+            crashed = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_name, language, cache_path, backend)) as executor:
+                futures = {executor.submit(_transcribe_job, job): job for job in remaining}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    record = {"path": job["path"]}
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        # 进程池整体失效，不代表这个文件本身有问题：不写失败记录，重建进程池后重新提交
+                        crashed.append(job)
+                        continue
+                    except Exception as e:
+                        logger.error(f"转写失败 {job['path']}: {e}")
+                        record.update(status="failed", error=str(e))
+                        _append_manifest(manifest_file, record)
+                        continue
+
+                    done_count += 1
+                    stem = _output_stem(job["path"], source)
+                    text_file = os.path.join(output_dir, stem + ".txt")
+                    segments_file = os.path.join(output_dir, stem + ".json")
+                    _write_atomic(text_file, result["text"])
+                    _write_atomic(segments_file, json.dumps(
+                        {"path": job["path"], "text": result["text"], "segments": result["segments"]},
+                        ensure_ascii=False, indent=2))
+
+                    total_audio += result["duration"]
+                    total_compute += result["elapsed"]
+                    record.update(status="done", text_file=text_file, segments_file=segments_file,
+                                  duration=result["duration"], elapsed=result["elapsed"])
+                    if index_text is not None:
+                        record["indexed"] = index_text(result["text"], job["path"])
+                    _append_manifest(manifest_file, record)
+                    rtf = result["elapsed"] / result["duration"] if result["duration"] else 0.0
+                    logger.info(f"[{done_count}/{len(pending)}] {job['path']} 时长{result['duration']:.1f}s RTF={rtf:.3f}")
+
+            remaining = crashed
+            if not remaining:
+                break
+            if restarts >= MAX_POOL_RESTARTS:
+                # 不写清单记录，下次执行同一命令时这些文件仍是待处理状态
+                logger.error(f"工作进程反复异常退出，放弃本次剩余的{len(remaining)}个文件")
+                break
+            restarts += 1
+            logger.warning(f"工作进程异常退出，重建进程池并重新提交{len(remaining)}个文件（第{restarts}次）")
+
+    wall_elapsed = time.perf_counter() - wall_start
+    summary = {
+        "files": len(pending),
+        "audio_seconds": total_audio,
+        "compute_seconds": total_compute,
+        "wall_seconds": wall_elapsed,
+        # 单进程实时率（计算耗时/音频时长）与整体吞吐实时率（墙钟耗时/音频时长）
+        "rtf": total_compute / total_audio if total_audio else 0.0,
+        "wall_rtf": wall_elapsed / total_audio if total_audio else 0.0,
+    }
+    logger.info(f"批量转写完成: {summary}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量语音转写")
+    parser.add_argument("source", help="音频目录或清单文件")
+    parser.add_argument("-o", "--output-dir", default="./transcripts", help="输出目录")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--model", default="small", help="Whisper模型名称")
+    parser.add_argument("--language", default="zh", help="识别语言")
+    parser.add_argument("--backend", default=None, choices=["whisper", "faster-whisper"], help="推理后端")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="PCM文件采样率")
+    parser.add_argument("--channels", type=int, default=1, help="PCM文件声道数")
+    parser.add_argument("--vector-db", default=None, help="持久化向量库目录（可选）")
+    parser.add_argument("--sharded", action="store_true", help="向量库按 租户/日期/录音 分片写入")
+    parser.add_argument("--tenant", default="default", help="分片模式下的租户名")
+    parser.add_argument("--retry-failed", action="store_true", help="重试之前失败的文件")
+    parser.add_argument("--long-threshold", type=float, default=600.0,
+                        help="超过该时长(秒)的PCM/WAV走内存映射分窗模式，0表示关闭")
+    parser.add_argument("--cache", default=None, help="识别结果缓存SQLite文件（可选）")
+    args = parser.parse_args()
+
+    summary = run_batch(args.source, args.output_dir, workers=args.workers, model_name=args.model,
+                        language=args.language, sample_rate=args.sample_rate, channels=args.channels,
+                        vector_db=args.vector_db, retry_failed=args.retry_failed,
+                        long_threshold=args.long_threshold or None, cache_path=args.cache,
+                        backend=args.backend, sharded=args.sharded, tenant=args.tenant)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
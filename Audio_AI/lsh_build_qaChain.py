@@ -2,7 +2,7 @@ from langchain.llms import HuggingFacePipeline
 from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
 from langchain.chains import RetrievalQA
 
-from Audio_AI.lsh_ASR import ASRTransform
+from Audio_AI.lsh_ASR import ASRTransform, load_audio_file
 from Audio_AI.lsh_vector_db import BuildVectorDB
 
 import logging
@@ -16,16 +16,18 @@ logger = logging.getLogger(__name__)
 
 
 class BuildAudioQAChain:
-    def __init__(self, llv_modelname="", temperature=0) -> None:
+    def __init__(self, llv_modelname="", temperature=0, batch_size=1) -> None:
+        """batch_size: 一次调用generate传入多条提示词时，pipeline每批送入模型的条数（问答服务微批处理用）"""
         model_path = "THUDM/chatglm3-6b" #本地模型路径
         tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
         model = AutoModelForCausalLM.from_pretrained(model_path, trust_remote_code=True).quantize(4).cuda() #4-bit 量化
-        pipe = pipeline("text-generation",model=model, tokenizer=tokenizer, max_new_tokens=512)
+        pipe = pipeline("text-generation",model=model, tokenizer=tokenizer, max_new_tokens=512, batch_size=batch_size)
         llm = HuggingFacePipeline(pipeline=pipe)
 
         self.llm = llm
 
     def buildQAChian(self, db):
+        """db: FAISS向量库，或ShardedVectorStore（按分片检索）"""
         try:
             qa_chain = RetrievalQA.from_chain_type(
                 llm=self.llm,
@@ -42,7 +44,8 @@ class BuildAudioQAChain:
 if __name__ == "__main__":
     # 1. 音频转文本
     audio_path = "meeting_recording.mp3"  # 你的音频文件路径
-    audio_text = audio_to_text(audio_path)
+    pcm_data, sample_rate, channels = load_audio_file(audio_path)
+    audio_text = ASRTransform(language="zh").pcmToText(pcm_data, sample_rate=sample_rate, channels=channels)
     
     # 2. 构建向量数据库
     vector_db = BuildVectorDB().buildWithText(audio_text)
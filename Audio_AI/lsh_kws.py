@@ -0,0 +1,365 @@
+"""
+唤醒词检测门控：放在Whisper之前，只有唤醒词之后 / 对话窗口内的语音才送去识别
+
+检测器基于log-mel特征的模板匹配（子序列DTW）：
+    1. enroll() 用几段唤醒词录音注册模板
+    2. 流式push音频，每隔check_interval对最近一段特征做DTW匹配，距离低于阈值即判为唤醒
+    3. 能量门限：最近一段能量没有明显高于噪声底时直接跳过DTW，静音时几乎不耗CPU
+
+用法：
+    detector = KeywordDetector()
+    detector.enroll(load_audio_file("wake.wav")[0])
+    gate = WakeWordGate(detector, on_utterance=lambda pcm: asr.pcmToText(pcm, sample_rate=16000))
+    gate.attach(stream)   # ESP32AudioStream
+    ...
+    gate.close()          # 等待已排队的语音段识别完成
+"""
+import time
+import queue
+import logging
+import threading
+
+import numpy as np
+
+from Audio_AI.lsh_mel import MelFeatureExtractor
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+N_MELS = 40
+HOP_LENGTH = 160        # 10ms一帧
+FRAME_STACK = 2         # 相邻两帧取平均，DTW按20ms一帧计算，计算量减为1/4
+STEP_PENALTY = 0.1      # 非对角步进的惩罚，限制过度拉伸，减少误唤醒
+
+
+def _normalize_frames(log_mel):
+    """(帧数, n_mels) 每帧去均值后做L2归一化，DTW用余弦距离，对音量变化不敏感"""
+    frames = log_mel - log_mel.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(frames, axis=1, keepdims=True)
+    return frames / np.maximum(norms, 1e-6)
+
+
+def _stack_frames(frames):
+    n = len(frames) // FRAME_STACK * FRAME_STACK
+    return frames[:n].reshape(-1, FRAME_STACK, frames.shape[1]).mean(axis=1)
+
+
+def subsequence_dtw(template, window):
+    """
+    子序列DTW：template整体对齐到window中的任意一段，返回 (最小平均距离, 匹配结束的帧下标)
+    步进限制为(1,1)/(1,2)/(2,1)，每一行只依赖前两行，可以整行向量化计算；
+    (1,2)/(2,1)额外加STEP_PENALTY，语速差异可以容忍，但不能靠随意拉伸去凑相似
+    """
+    m, n = len(template), len(window)
+    if n < m // 2 or m < 2:
+        return np.inf, -1
+    cost = 1.0 - template @ window.T  # (m, n) 余弦距离
+    inf = np.float32(np.inf)
+    prev2 = np.full(n, inf, dtype=np.float32)
+    prev1 = cost[0].astype(np.float32)  # 第一行：可以从window任意位置开始
+    for i in range(1, m):
+        best = np.full(n, inf, dtype=np.float32)
+        best[1:] = prev1[:-1]                                       # (1,1)
+        best[2:] = np.minimum(best[2:], prev1[:-2] + STEP_PENALTY)   # (1,2)
+        best[1:] = np.minimum(best[1:], prev2[:-1] + STEP_PENALTY)   # (2,1)
+        prev2, prev1 = prev1, cost[i] + best
+    end = int(np.argmin(prev1))
+    return float(prev1[end] / m), end
+
+
+class KeywordDetector:
+    """基于log-mel模板匹配的流式唤醒词检测器"""
+
+    def __init__(self, threshold=0.17, check_interval=0.1, refractory=1.0,
+                 energy_margin_db=10.0, sample_rate=SAMPLE_RATE):
+        """
+        threshold: DTW平均余弦距离阈值，越小越严格（误唤醒少、漏检多）
+        check_interval: 每隔多少秒做一次匹配
+        refractory: 检测到之后多少秒内不再重复触发
+        energy_margin_db: 最近一段能量需高于噪声底多少dB才做匹配
+        """
+        self.threshold = threshold
+        self.refractory = refractory
+        self.energy_margin_db = energy_margin_db
+        self.sample_rate = sample_rate
+        self.extractor = MelFeatureExtractor(sr=sample_rate, n_fft=512, hop_length=HOP_LENGTH, n_mels=N_MELS)
+        self.check_frames = max(1, int(check_interval * sample_rate / HOP_LENGTH))
+        self.templates = []
+        self.reset()
+
+    def reset(self):
+        self._stream = self.extractor.stream()
+        self._features = np.zeros((0, N_MELS), dtype=np.float32)
+        self._energy = np.zeros(0, dtype=np.float32)
+        self._noise_floor = None
+        self.last_level = None         # 最近一次push的帧能量峰值(dB)，供门控判断有无语音
+        self._frames_since_check = 0
+        self._last_detection = -np.inf
+        self.samples_seen = 0
+        self.dtw_runs = 0
+
+    def _log_mel(self, audio):
+        power = self.extractor.melspectrogram(audio)  # (n_mels, 帧数)
+        return 10.0 * np.log10(np.maximum(power.T, 1e-10))
+
+    def enroll(self, audio):
+        """注册一段唤醒词录音（float32 [-1,1] 或 int16），可多次调用注册多个模板"""
+        audio = np.asarray(audio)
+        if audio.dtype == np.int16:
+            audio = audio.astype(np.float32) / 32768.0
+        log_mel = self._log_mel(audio)
+        # 去掉首尾静音帧，只保留唤醒词本身
+        energy = log_mel.max(axis=1)
+        active = np.where(energy > energy.max() - 30.0)[0]
+        if len(active):
+            log_mel = log_mel[active[0]:active[-1] + 1]
+        self.templates.append(_normalize_frames(_stack_frames(log_mel)).astype(np.float32))
+        self._max_template = max(len(t) for t in self.templates)
+
+    def push(self, samples):
+        """
+        输入新的音频（int16或float32），返回本次检测到的唤醒事件列表
+        每个事件: {"sample": 检测时刻的采样点位置, "distance": 匹配距离}
+        """
+        if not self.templates:
+            raise RuntimeError("请先调用 enroll() 注册唤醒词模板")
+        samples = np.asarray(samples)
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        self.samples_seen += len(samples)
+        power = self._stream.push(samples)
+        if power.shape[1] == 0:
+            return []
+        log_mel = 10.0 * np.log10(np.maximum(power.T, 1e-10))
+        energy = log_mel.max(axis=1)
+        self._track_noise_floor(energy)
+        self.last_level = float(energy.max())
+
+        # 只保留匹配需要的最近一段特征（最长模板的1.5倍）
+        keep = int(self._max_template * FRAME_STACK * 1.5)
+        self._features = np.concatenate([self._features, log_mel])[-keep:]
+        self._energy = np.concatenate([self._energy, energy])[-keep:]
+        self._frames_since_check += len(log_mel)
+        if self._frames_since_check < self.check_frames:
+            return []
+        self._frames_since_check = 0
+
+        now = self.samples_seen / self.sample_rate
+        if now - self._last_detection < self.refractory:
+            return []
+        # 能量门限：最近一段没有明显高于噪声底，不做DTW
+        if self._energy.max() < self._noise_floor + self.energy_margin_db:
+            return []
+
+        window = _normalize_frames(_stack_frames(self._features)).astype(np.float32)
+        self.dtw_runs += 1
+        best = min(subsequence_dtw(t, window)[0] for t in self.templates)
+        if best < self.threshold:
+            self._last_detection = now
+            return [{"sample": self.samples_seen, "distance": best}]
+        return []
+
+    @property
+    def noise_floor(self):
+        return self._noise_floor
+
+    def _track_noise_floor(self, energy):
+        """噪声底：遇到更低的能量立即下降，否则缓慢上升"""
+        for e in energy:
+            if self._noise_floor is None or e < self._noise_floor:
+                self._noise_floor = float(e)
+            else:
+                self._noise_floor += 0.002 * (float(e) - self._noise_floor)
+
+
+class WakeWordGate:
+    """
+    唤醒词门控：只在唤醒后的对话窗口内收集语音，按静音切分成语音段交给on_utterance（通常是pcmToText）
+    对话窗口内每检测到一次语音就顺延，超过conversation_window秒没有语音则回到待唤醒状态
+    on_utterance在单独的工作线程中执行：push/process_bytes运行在WebSocket接收线程上，
+    不能在这里同步做一次完整的Whisper识别，否则播放和录音都会卡住
+    """
+
+    def __init__(self, detector, on_utterance, sample_rate=SAMPLE_RATE, conversation_window=8.0,
+                 end_silence=0.8, speech_margin_db=10.0, max_utterance=30.0, max_pending=4):
+        """
+        detector: KeywordDetector
+        on_utterance: 回调，参数为一段int16 PCM（numpy数组）
+        conversation_window: 唤醒后/上一句之后保持激活的时长(秒)
+        end_silence: 静音超过多少秒认为一句话结束
+        speech_margin_db: 高于噪声底多少dB算有语音
+        max_utterance: 单段语音最长时长(秒)，超过强制切分
+        max_pending: 等待识别的语音段上限，识别跟不上时丢弃新的语音段
+        """
+        self.detector = detector
+        self.on_utterance = on_utterance
+        self.sample_rate = sample_rate
+        self.conversation_window = conversation_window
+        self.end_silence = end_silence
+        self.speech_margin_db = speech_margin_db
+        self.max_utterance = int(max_utterance * sample_rate)
+        self.active_until = -np.inf
+        self._utterance = []
+        self._utterance_len = 0
+        self._silence = 0.0
+        self._has_speech = False
+        self._pending = b""
+        self.forwarded_samples = 0
+        self.total_samples = 0
+        self.wake_events = 0
+        self.dropped_utterances = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._worker = None
+
+    @property
+    def active(self):
+        return self.total_samples / self.sample_rate < self.active_until
+
+    def attach(self, stream):
+        """挂到ESP32AudioStream上，作为额外的音频接收端"""
+        stream.add_audio_sink(self.process_bytes)
+        return self
+
+    def process_bytes(self, data: bytes):
+        """与ESP32AudioStream的audio_callback签名一致"""
+        if self._pending:
+            data = self._pending + data
+        usable = len(data) - len(data) % 2
+        self._pending = data[usable:]
+        if usable:
+            self.push(np.frombuffer(data, dtype=np.int16, count=usable // 2))
+
+    def push(self, samples):
+        """输入int16音频块"""
+        samples = np.asarray(samples, dtype=np.int16)
+        was_active = self.active
+        events = self.detector.push(samples)
+        self.total_samples += len(samples)
+        now = self.total_samples / self.sample_rate
+        if events:
+            self.wake_events += 1
+            self.active_until = now + self.conversation_window
+            if not was_active:
+                logger.info(f"检测到唤醒词（距离{events[0]['distance']:.3f}），进入对话窗口")
+                # 唤醒词本身不送识别，从下一块开始收集
+                return
+
+        if not was_active and not self.active:
+            return
+
+        # 与检测器共用mel帧能量和噪声底，不重复计算
+        level, floor = self.detector.last_level, self.detector.noise_floor
+        is_speech = level is not None and level > floor + self.speech_margin_db
+        if is_speech:
+            self._has_speech = True
+            self._silence = 0.0
+            self.active_until = now + self.conversation_window
+        else:
+            self._silence += len(samples) / self.sample_rate
+
+        self._utterance.append(samples.copy())
+        self._utterance_len += len(samples)
+        if self._has_speech and (self._silence >= self.end_silence or self._utterance_len >= self.max_utterance):
+            self._flush()
+        elif not self._has_speech and self._utterance_len >= int(self.end_silence * self.sample_rate):
+            # 只有静音，不保留
+            self._utterance = []
+            self._utterance_len = 0
+
+        if not self.active:
+            self._flush()
+            logger.info("对话窗口结束，回到待唤醒状态")
+
+    def _flush(self):
+        if self._has_speech and self._utterance:
+            pcm = np.concatenate(self._utterance)
+            self._submit(pcm)
+        self._utterance = []
+        self._utterance_len = 0
+        self._silence = 0.0
+        self._has_speech = False
+
+    def _submit(self, pcm):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="kws-utterance", daemon=True)
+            self._worker.start()
+        try:
+            self._queue.put_nowait(pcm)
+            self.forwarded_samples += len(pcm)
+        except queue.Full:
+            self.dropped_utterances += 1
+            logger.warning("识别处理不过来，丢弃一段语音")
+
+    def _run(self):
+        while True:
+            pcm = self._queue.get()
+            if pcm is None:
+                return
+            try:
+                self.on_utterance(pcm)
+            except Exception as e:
+                logger.error(f"语音段处理失败: {e}")
+
+    def close(self):
+        """提交未结束的语音段，并等待已排队的语音段处理完成"""
+        self._flush()
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def stats(self):
+        return {
+            "wake_events": self.wake_events,
+            "dropped_utterances": self.dropped_utterances,
+            "forwarded_ratio": self.forwarded_samples / self.total_samples if self.total_samples else 0.0,
+            "dtw_runs": self.detector.dtw_runs,
+        }
+
+
+def evaluate_detector(detector, pcm, keyword_ends, sample_rate=SAMPLE_RATE, block=512, tolerance=1.0):
+    """
+    离线评估检测器
+    pcm: 测试音频（int16）
+    keyword_ends: 每个唤醒词结束位置（秒）的真值列表
+    tolerance: 唤醒词结束后多少秒内检测到算命中
+    返回: 命中数、漏检率(FRR)、每小时误唤醒数(FA/h)、平均/最大检测延迟、CPU占用比例
+    """
+    detector.reset()
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(pcm), block):
+        for event in detector.push(pcm[i:i + block]):
+            detections.append(event["sample"] / sample_rate)
+    cpu = time.perf_counter() - start
+
+    matched = set()
+    latencies = []
+    false_accepts = 0
+    for t in detections:
+        hit = None
+        for k, end in enumerate(keyword_ends):
+            if k not in matched and end - 0.5 <= t <= end + tolerance:
+                hit = k
+                break
+        if hit is None:
+            false_accepts += 1
+        else:
+            matched.add(hit)
+            latencies.append(max(0.0, t - keyword_ends[hit]))
+    duration = len(pcm) / sample_rate
+    return {
+        "keywords": len(keyword_ends),
+        "hits": len(matched),
+        "frr": 1.0 - len(matched) / len(keyword_ends) if keyword_ends else 0.0,
+        "false_accepts": false_accepts,
+        "fa_per_hour": false_accepts / duration * 3600,
+        "latency_mean_ms": float(np.mean(latencies)) * 1000 if latencies else 0.0,
+        "latency_max_ms": float(np.max(latencies)) * 1000 if latencies else 0.0,
+        "cpu_ratio": cpu / duration,
+    }
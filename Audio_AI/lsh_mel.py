@@ -0,0 +1,225 @@
+import time
+import logging
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import get_window
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=16)
+def mel_filterbank(sr, n_fft, n_mels, fmin=0.0, fmax=None):
+    """
+    mel滤波器组（与librosa.filters.mel默认参数一致：Slaney刻度 + Slaney面积归一化）
+    按参数缓存，同一配置只计算一次；返回只读float32数组，形状(n_mels, n_fft//2+1)
+    """
+    if fmax is None:
+        fmax = sr / 2.0
+
+    def hz_to_mel(hz):
+        hz = np.asanyarray(hz, dtype=np.float64)
+        f_sp = 200.0 / 3
+        min_log_hz = 1000.0
+        min_log_mel = min_log_hz / f_sp
+        logstep = np.log(6.4) / 27.0
+        return np.where(hz >= min_log_hz,
+                        min_log_mel + np.log(np.maximum(hz, min_log_hz) / min_log_hz) / logstep,
+                        hz / f_sp)
+
+    def mel_to_hz(mels):
+        f_sp = 200.0 / 3
+        min_log_hz = 1000.0
+        min_log_mel = min_log_hz / f_sp
+        logstep = np.log(6.4) / 27.0
+        return np.where(mels >= min_log_mel,
+                        min_log_hz * np.exp(logstep * (mels - min_log_mel)),
+                        f_sp * mels)
+
+    fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    mel_freqs = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2))
+    fdiff = np.diff(mel_freqs)
+    ramps = mel_freqs[:, None] - fft_freqs[None, :]
+    lower = -ramps[:-2] / fdiff[:-1, None]
+    upper = ramps[2:] / fdiff[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    # Slaney归一化：每个三角滤波器面积近似相等
+    weights *= (2.0 / (mel_freqs[2:n_mels + 2] - mel_freqs[:n_mels]))[:, None]
+    weights = weights.astype(np.float32)
+    weights.flags.writeable = False
+    return weights
+
+
+@lru_cache(maxsize=16)
+def stft_window(n_fft):
+    """hann窗（周期窗，与librosa一致），按长度缓存"""
+    window = get_window("hann", n_fft, fftbins=True).astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+
+def power_to_db(spec, ref=None, amin=1e-10, top_db=80.0):
+    """
+    功率谱转分贝：10*log10(S/ref)
+    ref为None时，以每段音频自身的最大能量为0dB（等同librosa的ref=np.max，批量时逐条计算）
+    """
+    spec = np.asarray(spec, dtype=np.float32)
+    log_spec = 10.0 * np.log10(np.maximum(spec, amin))
+    if ref is None:
+        ref_db = log_spec.max(axis=(-2, -1), keepdims=True)
+    else:
+        ref_db = 10.0 * np.log10(max(ref, amin))
+    log_spec = log_spec - ref_db
+    if top_db is not None:
+        log_spec = np.maximum(log_spec, log_spec.max(axis=(-2, -1), keepdims=True) - top_db)
+    return log_spec.astype(np.float32, copy=False)
+
+
+class MelFeatureExtractor:
+    """
+    无界面的log-mel特征提取器
+    - 滤波器组/窗函数按 (sr, n_fft, n_mels) 缓存复用
+    - 支持 (样本数,) 单条 或 (条数, 样本数) 批量输入，一次矩阵运算完成批量STFT
+    - 全程float32
+    输出形状与librosa一致：(n_mels, 帧数) 或 (条数, n_mels, 帧数)
+    """
+
+    def __init__(self, sr=16000, n_fft=512, hop_length=160, n_mels=80, fmin=0.0, fmax=None):
+        """
+        sr: 采样率
+        n_fft: 傅立叶变换的单位片段采样点数
+        hop_length: 帧移（160点 = 16kHz下10ms）
+        n_mels: mel频带数
+        """
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.filterbank = mel_filterbank(sr, n_fft, n_mels, fmin, fmax)
+        self.window = stft_window(n_fft)
+
+    def _frames_power(self, frames):
+        """(…, 帧数, n_fft) 的分帧数据 → (…, n_mels, 帧数) 的mel功率谱"""
+        spectrum = np.fft.rfft(frames * self.window, axis=-1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        return np.swapaxes(power @ self.filterbank.T, -1, -2)
+
+    def melspectrogram(self, audio):
+        """mel功率谱，居中分帧（两端各补n_fft//2个0，与librosa center=True一致）"""
+        audio = np.asarray(audio, dtype=np.float32)
+        pad = self.n_fft // 2
+        pad_width = [(0, 0)] * (audio.ndim - 1) + [(pad, pad)]
+        padded = np.pad(audio, pad_width)
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft, axis=-1)[..., ::self.hop_length, :]
+        return self._frames_power(frames)
+
+    def log_mel(self, audio, ref=None, top_db=80.0):
+        """log-mel特征（dB），ref为None时以每条音频最大能量为0dB"""
+        return power_to_db(self.melspectrogram(audio), ref=ref, top_db=top_db)
+
+    def log_mel_batch(self, clips, ref=None, top_db=80.0):
+        """
+        不等长的多段音频批量提取：补零到相同长度后一次计算，再按各自帧数裁剪
+        返回列表，每项形状 (n_mels, 帧数)
+        """
+        if not clips:
+            return []
+        lengths = [len(clip) for clip in clips]
+        batch = np.zeros((len(clips), max(lengths)), dtype=np.float32)
+        for i, clip in enumerate(clips):
+            batch[i, :len(clip)] = clip
+        power = self.melspectrogram(batch)
+        results = []
+        for i, length in enumerate(lengths):
+            n_frames = 1 + length // self.hop_length
+            results.append(power_to_db(power[i, :, :n_frames], ref=ref, top_db=top_db))
+        return results
+
+    def stream(self):
+        """创建增量计算器，用于实时流输入"""
+        return StreamingMelExtractor(self)
+
+
+class StreamingMelExtractor:
+    """
+    流式增量mel计算：每次push新采样点，只计算新凑满的帧
+    不做居中补零（第一帧从第0个采样点开始），输出的是mel功率谱，由调用方决定如何取对数
+    """
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self.frames_emitted = 0
+
+    def push(self, samples):
+        """追加采样点，返回新增帧的mel功率谱 (n_mels, 新帧数)，不足一帧时新帧数为0"""
+        n_fft = self.extractor.n_fft
+        hop = self.extractor.hop_length
+        self._buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float32)])
+        if len(self._buffer) < n_fft:
+            return np.zeros((self.extractor.n_mels, 0), dtype=np.float32)
+        n_frames = 1 + (len(self._buffer) - n_fft) // hop
+        frames = np.lib.stride_tricks.sliding_window_view(self._buffer, n_fft)[:n_frames * hop:hop]
+        power = self.extractor._frames_power(frames)
+        # 保留下一帧起点之后的数据
+        self._buffer = self._buffer[n_frames * hop:].copy()
+        self.frames_emitted += n_frames
+        return power
+
+    def reset(self):
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self.frames_emitted = 0
+
+
+def plot_mel(mel_db, sr=16000, hop_length=160, title='Mel Spectrogram'):
+    """调试用：绘制log-mel谱图（按需导入librosa.display/matplotlib）"""
+    import librosa.display
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(10, 4))
+    librosa.display.specshow(mel_db, sr=sr, hop_length=hop_length, x_axis='time', y_axis='mel')
+    plt.colorbar(format='%2.0f dB')
+    plt.title(title)
+    plt.show()
+
+
+def benchmark_vs_librosa(duration=10.0, batch=8, repeat=5, sr=16000):
+    """与librosa逐条计算对比耗时和数值误差"""
+    import librosa
+    rng = np.random.default_rng(0)
+    clips = rng.standard_normal((batch, int(duration * sr))).astype(np.float32) * 0.1
+    extractor = MelFeatureExtractor(sr=sr)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ours = extractor.log_mel(clips)
+    ours_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ref = np.stack([
+            librosa.power_to_db(librosa.feature.melspectrogram(
+                y=clip, sr=sr, n_fft=extractor.n_fft, hop_length=extractor.hop_length,
+                n_mels=extractor.n_mels), ref=np.max)
+            for clip in clips
+        ])
+    librosa_time = (time.perf_counter() - start) / repeat
+
+    result = {
+        "clips": batch,
+        "clip_seconds": duration,
+        "ours_ms": ours_time * 1000,
+        "librosa_ms": librosa_time * 1000,
+        "speedup": librosa_time / ours_time if ours_time > 0 else 0.0,
+        "max_abs_diff_db": float(np.max(np.abs(ours - ref))),
+    }
+    logger.info(f"mel特征基准测试: {result}")
+    return result
+
+
+if __name__ == '__main__':
+    benchmark_vs_librosa()
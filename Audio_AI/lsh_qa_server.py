@@ -0,0 +1,405 @@
+"""
+异步问答服务：在问答链前面加一层本地HTTP接口，把并发到达的问题攒成微批次统一检索和生成
+
+用法示例（在仓库根目录执行）:
+    python -m Audio_AI.lsh_qa_server --vector-db ./vector_db --port 8090
+    python -m Audio_AI.lsh_qa_server --fake --load 400 --concurrency 32     # 假模型 + 压测，不需要GPU
+
+接口:
+    POST /qa      {"question": "...", "deadline_ms": 5000, "id": "可选，用于取消"}
+                  → {"answer": "...", "sources": [...], "latency_ms": ..., "batch_size": ...}
+                  超过截止时间返回504；被取消返回499；id与处理中的请求重复返回409
+    POST /cancel  {"id": "..."}   取消尚未开始生成的请求
+    GET  /stats   批次大小分布、完成/超时/取消数
+
+HTTP部分只用asyncio标准库实现（不引入新的Web框架依赖），模型推理在单独线程中执行，不阻塞事件循环
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 与RetrievalQA "stuff" 模式一致：检索到的片段直接填进提示词
+PROMPT_TEMPLATE = "已知信息：\n{context}\n\n根据上述已知信息，简洁地回答问题。问题：{question}\n回答："
+
+
+class BatchQAEngine:
+    """批量问答：一批问题一次嵌入、逐个检索、一次批量生成"""
+
+    def __init__(self, db, llm, embeddings=None, k=3, prompt_template=PROMPT_TEMPLATE):
+        """
+        db: FAISS向量库或ShardedVectorStore
+        llm: langchain LLM（如BuildAudioQAChain().llm），generate()接受一批提示词
+        embeddings: 嵌入模型；提供且db支持按向量检索时，一批问题只调用一次嵌入
+        """
+        self.db = db
+        self.llm = llm
+        self.embeddings = embeddings
+        self.k = k
+        self.prompt_template = prompt_template
+
+    def retrieve(self, questions):
+        if self.embeddings is not None and hasattr(self.db, "similarity_search_by_vector"):
+            vectors = self.embeddings.embed_documents(questions)
+            return [self.db.similarity_search_by_vector(v, k=self.k) for v in vectors]
+        return [self.db.similarity_search(q, k=self.k) for q in questions]
+
+    def answer_batch(self, questions):
+        """返回 [{"answer": str, "sources": [str]}]，顺序与questions一致"""
+        docs = self.retrieve(questions)
+        prompts = [
+            self.prompt_template.format(context="\n".join(d.page_content for d in doc_list), question=q)
+            for q, doc_list in zip(questions, docs)
+        ]
+        result = self.llm.generate(prompts)
+        return [
+            {"answer": generations[0].text.strip(), "sources": [d.page_content for d in doc_list]}
+            for generations, doc_list in zip(result.generations, docs)
+        ]
+
+
+class FakeQAEngine:
+    """
+    压测用的假引擎：模拟批量生成的耗时特征（固定开销 + 每条增量），
+    批次越大单条平均成本越低，与GPU上批量解码的规律一致
+    """
+
+    def __init__(self, base_ms=200.0, per_item_ms=15.0):
+        self.base_ms = base_ms
+        self.per_item_ms = per_item_ms
+
+    def answer_batch(self, questions):
+        time.sleep((self.base_ms + self.per_item_ms * len(questions)) / 1000)
+        return [{"answer": f"关于“{q}”的回答", "sources": []} for q in questions]
+
+
+class _Pending:
+    __slots__ = ("id", "question", "deadline", "future", "arrival", "started")
+
+    def __init__(self, request_id, question, deadline, future):
+        self.id = request_id
+        self.question = question
+        self.deadline = deadline
+        self.future = future
+        self.arrival = time.monotonic()
+        self.started = False  # 已进入生成批次
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class QAServer:
+    def __init__(self, engine, host="127.0.0.1", port=8090, max_batch=8, batch_window=0.02,
+                 default_deadline=30.0):
+        """
+        engine: 提供answer_batch(questions)的问答引擎
+        max_batch: 每批最多多少个问题
+        batch_window: 第一个问题到达后最多再等多久凑批(秒)
+        default_deadline: 请求未指定deadline_ms时的默认截止时间(秒)
+        """
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.default_deadline = default_deadline
+        self._queue = None
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-model")  # 模型只有一份，串行执行批次
+        self._server = None
+        self._batcher = None
+        self.stats = {"completed": 0, "expired": 0, "cancelled": 0, "failed": 0, "batches": 0, "batch_sizes": {}}
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"问答服务已启动: http://{self.host}:{self.port}")
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self._executor.shutdown(wait=False)
+
+    # ---------------- 提交 / 取消 ----------------
+    def submit(self, question, deadline_s=None, request_id=None):
+        """提交问题，返回 (请求id, Future)；request_id与尚未完成的请求重复时抛出ValueError"""
+        request_id = request_id or uuid.uuid4().hex
+        if request_id in self._pending:
+            raise ValueError(f"请求id重复: {request_id}")
+        deadline = time.monotonic() + (deadline_s if deadline_s is not None else self.default_deadline)
+        future = asyncio.get_event_loop().create_future()
+        item = _Pending(request_id, question, deadline, future)
+        self._pending[request_id] = item
+        future.add_done_callback(lambda _: self._pending.get(request_id) is item and self._pending.pop(request_id))
+        self._queue.put_nowait(item)
+        return request_id, future
+
+    def cancel(self, request_id):
+        """取消尚未进入生成的请求，返回是否取消成功；已在生成中的批次无法中断，返回False"""
+        item = self._pending.get(request_id)
+        if item is None or item.future.done() or item.started:
+            return False
+        item.future.cancel()
+        self.stats["cancelled"] += 1
+        return True
+
+    # ---------------- 微批调度 ----------------
+    async def _batch_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self._queue.get()]
+            window_end = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = window_end - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # 凑批期间又排进来的也一并带上（不再等待）
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            now = time.monotonic()
+            live = []
+            for item in batch:
+                if item.future.done():          # 已取消或客户端已断开
+                    continue
+                if item.deadline <= now:        # 排队期间已超时，不浪费生成算力
+                    item.future.set_exception(DeadlineExceeded())
+                    self.stats["expired"] += 1
+                    continue
+                live.append(item)
+            if not live:
+                continue
+
+            for item in live:
+                item.started = True
+            self.stats["batches"] += 1
+            sizes = self.stats["batch_sizes"]
+            sizes[len(live)] = sizes.get(len(live), 0) + 1
+            try:
+                results = await loop.run_in_executor(self._executor, self.engine.answer_batch,
+                                                     [item.question for item in live])
+            except Exception as e:
+                logger.error(f"批量问答失败: {e}")
+                for item in live:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                        self.stats["failed"] += 1
+                continue
+            now = time.monotonic()
+            for item, result in zip(live, results):
+                if item.future.done():
+                    continue
+                if item.deadline <= now:
+                    item.future.set_exception(DeadlineExceeded())
+                    self.stats["expired"] += 1
+                else:
+                    item.future.set_result(dict(result, batch_size=len(live)))
+                    self.stats["completed"] += 1
+
+    # ---------------- HTTP ----------------
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+            status, payload = await self._route(method, path, body, reader)
+        except (ValueError, UnicodeDecodeError) as e:
+            status, payload = 400, {"error": f"请求格式错误: {e}"}
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        except Exception as e:
+            logger.error(f"处理请求失败: {e}", exc_info=True)
+            status, payload = 500, {"error": str(e)}
+        if status is None:
+            writer.close()
+            return
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write((f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                      f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n").encode("latin-1") + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _route(self, method, path, body, reader):
+        if method == "GET" and path == "/stats":
+            return 200, dict(self.stats, pending=len(self._pending))
+        if method != "POST" or path not in ("/qa", "/cancel"):
+            return 404, {"error": "not found"}
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict):
+            return 400, {"error": "请求体必须是JSON对象"}
+        request_id = request.get("id")
+        if request_id is not None and not isinstance(request_id, str):
+            return 400, {"error": "id必须是字符串"}
+        if path == "/cancel":
+            return 200, {"cancelled": self.cancel(request_id or "")}
+
+        question = request.get("question")
+        if not question or not isinstance(question, str):
+            return 400, {"error": "缺少question"}
+        deadline_ms = request.get("deadline_ms")
+        if deadline_ms is not None and (isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float))
+                                        or deadline_ms <= 0):
+            return 400, {"error": "deadline_ms必须是正数"}
+        if request_id in self._pending:
+            return 409, {"error": "相同id的请求仍在处理中", "id": request_id}
+        start = time.monotonic()
+        request_id, future = self.submit(question, deadline_ms / 1000 if deadline_ms else None, request_id)
+        deadline = self._pending[request_id].deadline
+        # 同时监听客户端断开：断开即取消，尚未生成的请求不再占用批次
+        disconnected = asyncio.ensure_future(reader.read(1))
+        try:
+            done, _ = await asyncio.wait({future, disconnected}, timeout=max(0.0, deadline - time.monotonic()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
+        if not future.done():
+            if disconnected in done:
+                self.cancel(request_id)
+                return None, None
+            # 到截止时间仍未生成完（例如卡在一个很慢的批次里）：立即返回504，之后的生成结果丢弃
+            future.set_exception(DeadlineExceeded())
+            self.stats["expired"] += 1
+        if future.cancelled():
+            return 499, {"error": "请求已取消", "id": request_id}
+        if isinstance(future.exception(), DeadlineExceeded):
+            return 504, {"error": "超过截止时间", "id": request_id}
+        if future.exception() is not None:
+            return 500, {"error": str(future.exception()), "id": request_id}
+        return 200, dict(future.result(), id=request_id, latency_ms=(time.monotonic() - start) * 1000)
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 499: "Client Closed Request",
+            500: "Internal Server Error", 504: "Gateway Timeout"}
+
+
+# ---------------- 压测 ----------------
+async def _post(host, port, path, payload):
+    reader, writer = await asyncio.open_connection(host, port)
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(data)}\r\n\r\n").encode("latin-1") + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), json.loads(body or b"{}")
+
+
+async def run_load(host, port, n_requests=200, concurrency=16, deadline_ms=None, questions=None):
+    """
+    压测：concurrency个并发客户端共发送n_requests个问题
+    返回吞吐(请求/秒)、成功请求的p50/p99延迟(毫秒)、各状态码计数
+    """
+    questions = questions or ["项目截止日期是什么时候？", "预算有多少？", "谁是负责人？", "上线进度如何？"]
+    latencies, statuses = [], {}
+    counter = iter(range(n_requests))
+
+    async def client():
+        for i in counter:
+            payload = {"question": questions[i % len(questions)]}
+            if deadline_ms:
+                payload["deadline_ms"] = deadline_ms
+            start = time.perf_counter()
+            status, _ = await _post(host, port, "/qa", payload)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_s": n_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000 if latencies else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000 if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+async def benchmark_server(engine, n_requests=200, concurrency=16, max_batch=8, batch_window=0.02,
+                           deadline_ms=None):
+    """在本进程内启动服务并压测，返回压测结果和批次统计"""
+    server = await QAServer(engine, port=0, max_batch=max_batch, batch_window=batch_window).start()
+    try:
+        result = await run_load(server.host, server.port, n_requests, concurrency, deadline_ms)
+    finally:
+        await server.stop()
+    result["batches"] = server.stats["batches"]
+    return result
+
+
+def _build_engine(args):
+    from Audio_AI.lsh_build_qaChain import BuildAudioQAChain
+    from Audio_AI.lsh_vector_db import BuildVectorDB
+    builder = BuildVectorDB()
+    if args.sharded:
+        from Audio_AI.lsh_sharded_vector_db import ShardedVectorStore
+        db = ShardedVectorStore(args.vector_db, builder)
+    else:
+        db = builder.load(args.vector_db)
+        if db is None:
+            raise SystemExit(f"向量库不存在: {args.vector_db}")
+    llm = BuildAudioQAChain(batch_size=args.max_batch).llm
+    return BatchQAEngine(db, llm, embeddings=builder.embeddings, k=args.k)
+
+
+async def _main(args):
+    engine = FakeQAEngine() if args.fake else _build_engine(args)
+    if args.load:
+        for max_batch in (1, args.max_batch):
+            result = await benchmark_server(engine, args.load, args.concurrency, max_batch, args.batch_window,
+                                            args.deadline_ms)
+            print(f"max_batch={max_batch}: {json.dumps(result, ensure_ascii=False)}")
+        return
+    await QAServer(engine, args.host, args.port, args.max_batch, args.batch_window).start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="音频问答HTTP服务（微批处理）")
+    parser.add_argument("--vector-db", default="./vector_db", help="向量库目录")
+    parser.add_argument("--sharded", action="store_true", help="向量库目录为分片库根目录")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--max-batch", type=int, default=8, help="每批最多问题数")
+    parser.add_argument("--batch-window", type=float, default=0.02, help="凑批等待时间(秒)")
+    parser.add_argument("-k", type=int, default=3, help="每个问题检索的片段数")
+    parser.add_argument("--fake", action="store_true", help="使用假模型（压测/调试）")
+    parser.add_argument("--load", type=int, default=0, help="压测模式：发送的请求数（对比max_batch=1）")
+    parser.add_argument("--concurrency", type=int, default=16, help="压测并发数")
+    parser.add_argument("--deadline-ms", type=int, default=None, help="压测请求的截止时间")
+    asyncio.run(_main(parser.parse_args()))
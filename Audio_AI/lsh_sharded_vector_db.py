@@ -0,0 +1,265 @@
+"""
+分片向量库：按 租户/日期/录音 拆成多个小FAISS索引，查询只加载涉及的分片
+
+目录结构：
+    root/
+      <tenant>/<day>/<recording>/
+          CURRENT          当前版本目录名（原子替换）
+          v000001/         FAISS.save_local 的输出
+          v000002/
+
+- 分片按需加载，内存中只保留最近使用的max_open_shards个（LRU），淘汰时正在进行的查询不受影响
+- 查询时问题只做一次嵌入，在线程池里并行检索各分片，再按距离合并top-k
+- 写入/重建在后台线程完成：基于磁盘上的当前版本生成新版本目录，写完后原子替换CURRENT和内存中的对象，
+  查询全程只读旧对象，不会被重建阻塞
+"""
+import os
+import re
+import time
+import heapq
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.vectorstores import FAISS
+from langchain.schema import BaseRetriever
+
+from Audio_AI.lsh_vector_db import BuildVectorDB
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CURRENT_NAME = "CURRENT"
+KEEP_VERSIONS = 2  # 保留最近两个版本，刚被替换的旧版本可能还有进程在加载
+_SAFE_PART = re.compile(r"^[\w\-.]+$")
+
+
+def shard_id(tenant="default", day=None, recording="default"):
+    """分片标识 tenant/day/recording，day默认今天(YYYYMMDD)"""
+    day = day or time.strftime("%Y%m%d")
+    for part in (tenant, day, recording):
+        if not _SAFE_PART.match(part) or part in (".", ".."):
+            raise ValueError(f"分片名只能包含字母、数字、下划线、短横线和点: {part}")
+    return f"{tenant}/{day}/{recording}"
+
+
+def _match(value, selector):
+    """selector为None匹配全部，字符串精确匹配，列表/集合匹配其中任意一个"""
+    if selector is None:
+        return True
+    if isinstance(selector, str):
+        return value == selector
+    return value in selector
+
+
+class ShardedVectorStore:
+    def __init__(self, root_dir, builder=None, max_open_shards=8, workers=4):
+        """
+        root_dir: 分片根目录
+        builder: BuildVectorDB（提供文本切分和嵌入模型），默认新建
+        max_open_shards: 内存中最多同时打开的分片数
+        workers: 查询并行检索的线程数
+        """
+        self.root_dir = root_dir
+        self.builder = builder or BuildVectorDB()
+        self.max_open_shards = max_open_shards
+        os.makedirs(root_dir, exist_ok=True)
+        self._open = OrderedDict()          # shard_id -> FAISS，按最近使用排序
+        self._lock = threading.Lock()
+        self._load_locks = {}               # 每个分片一把加载锁，避免同一分片被并发重复加载
+        self._build_locks = {}              # 每个分片一把写入锁，与加载锁分开，重建期间查询照常加载旧版本
+        self._query_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-query")
+        self._build_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-build")
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0, "swaps": 0}
+
+    # ---------------- 分片定位 ----------------
+    def _shard_dir(self, sid):
+        return os.path.join(self.root_dir, *sid.split("/"))
+
+    def _named_lock(self, locks, sid):
+        with self._lock:
+            return locks.setdefault(sid, threading.Lock())
+
+    def _current_version(self, sid):
+        try:
+            with open(os.path.join(self._shard_dir(sid), CURRENT_NAME), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def listShards(self, tenant=None, day=None, recording=None):
+        """按条件列出已有分片（每个条件可以是None、字符串或列表）"""
+        shards = []
+        if not os.path.isdir(self.root_dir):
+            return shards
+        for t in sorted(os.listdir(self.root_dir)):
+            if not _match(t, tenant) or not os.path.isdir(os.path.join(self.root_dir, t)):
+                continue
+            for d in sorted(os.listdir(os.path.join(self.root_dir, t))):
+                if not _match(d, day) or not os.path.isdir(os.path.join(self.root_dir, t, d)):
+                    continue
+                for r in sorted(os.listdir(os.path.join(self.root_dir, t, d))):
+                    if _match(r, recording) and os.path.exists(os.path.join(self.root_dir, t, d, r, CURRENT_NAME)):
+                        shards.append(f"{t}/{d}/{r}")
+        return shards
+
+    # ---------------- 懒加载 + LRU ----------------
+    def _get(self, sid):
+        with self._lock:
+            db = self._open.get(sid)
+            if db is not None:
+                self._open.move_to_end(sid)
+                self.stats["hits"] += 1
+                return db
+        with self._named_lock(self._load_locks, sid):
+            # 等锁期间可能已被其它线程加载
+            with self._lock:
+                db = self._open.get(sid)
+            if db is not None:
+                return db
+            db = self._load_from_disk(sid)
+            if db is None:
+                return None
+            self.stats["loads"] += 1
+            return self._put(sid, db, replace=False)
+
+    def _load_from_disk(self, sid):
+        version = self._current_version(sid)
+        if version is None:
+            return None
+        return self.builder.load(os.path.join(self._shard_dir(sid), version))
+
+    def _put(self, sid, db, replace=True):
+        """放入LRU；replace=False时若已有（加载期间后台重建刚完成替换）则以已有的新版本为准"""
+        with self._lock:
+            if replace or sid not in self._open:
+                self._open[sid] = db
+            db = self._open[sid]
+            self._open.move_to_end(sid)
+            while len(self._open) > self.max_open_shards:
+                evicted, _ = self._open.popitem(last=False)
+                self.stats["evictions"] += 1
+                logger.debug(f"关闭分片 {evicted}")
+        return db
+
+    # ---------------- 查询 ----------------
+    def search(self, query, k=3, tenant=None, day=None, recording=None, shards=None):
+        """
+        在选中的分片上检索，返回按相似度排序的top-k [(Document, 距离)]
+        shards: 直接指定分片列表；否则按tenant/day/recording条件筛选
+        """
+        shards = shards if shards is not None else self.listShards(tenant, day, recording)
+        if not shards:
+            return []
+        embedding = self.builder.embeddings.embed_query(query)  # 只嵌入一次
+
+        def search_shard(sid):
+            db = self._get(sid)
+            if db is None:
+                return []
+            results = db.similarity_search_with_score_by_vector(embedding, k=k)
+            for doc, _ in results:
+                doc.metadata.setdefault("shard", sid)
+            return results
+
+        merged = []
+        for results in self._query_pool.map(search_shard, shards):
+            merged.extend(results)
+        # FAISS默认返回L2距离，越小越相似
+        return heapq.nsmallest(k, merged, key=lambda item: item[1])
+
+    def similarity_search(self, query, k=3, **filters):
+        return [doc for doc, _ in self.search(query, k=k, **filters)]
+
+    def as_retriever(self, search_kwargs=None, **filters):
+        """与FAISS.as_retriever用法一致，可直接传给BuildAudioQAChain.buildQAChian"""
+        k = (search_kwargs or {}).get("k", 3)
+        return ShardedRetriever(store=self, k=k, filters=filters)
+
+    # ---------------- 后台写入 / 重建 ----------------
+    def addTexts(self, text, metadata=None, tenant="default", day=None, recording="default", wait=False):
+        """
+        追加文本到指定分片（后台执行，基于当前版本生成新版本后原子替换）
+        返回Future；wait=True时等待完成并返回新的FAISS对象
+        """
+        sid = shard_id(tenant, day, recording)
+        future = self._build_pool.submit(self._build, sid, [(text, metadata)], False)
+        return future.result() if wait else future
+
+    def rebuildShard(self, texts, tenant="default", day=None, recording="default", wait=False):
+        """
+        用给定文本全量重建分片（例如重新转写后），旧版本在替换前照常服务查询
+        texts: [(文本, 元数据)] 列表
+        """
+        sid = shard_id(tenant, day, recording)
+        future = self._build_pool.submit(self._build, sid, list(texts), True)
+        return future.result() if wait else future
+
+    def _build(self, sid, texts, from_scratch):
+        splitter = self.builder.spliter
+        chunks, metadatas = [], []
+        for text, metadata in texts:
+            for chunk in splitter.split_text(text):
+                chunks.append(chunk)
+                metadatas.append(dict(metadata or {}, shard=sid))
+        with self._named_lock(self._build_locks, sid):
+            # 从磁盘重新加载一份私有副本再修改，正在服务查询的对象保持不变
+            db = None if from_scratch else self._load_from_disk(sid)
+            if not chunks and db is None:
+                return None
+            if db is None:
+                db = FAISS.from_texts(chunks, self.builder.embeddings, metadatas=metadatas)
+            elif chunks:
+                db.add_texts(chunks, metadatas=metadatas)
+            self._swap(sid, db)
+        return db
+
+    def _swap(self, sid, db):
+        """写新版本目录 → 原子替换CURRENT → 替换内存中的对象 → 清理旧版本"""
+        shard_dir = self._shard_dir(sid)
+        os.makedirs(shard_dir, exist_ok=True)
+        versions = sorted(v for v in os.listdir(shard_dir) if v.startswith("v"))
+        version = f"v{int(versions[-1][1:]) + 1:06d}" if versions else "v000001"
+        db.save_local(os.path.join(shard_dir, version))
+        tmp_path = os.path.join(shard_dir, CURRENT_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(shard_dir, CURRENT_NAME))
+        # 刚写入的分片大概率马上被查询，直接放进LRU；正在进行的查询继续用手里的旧对象
+        self._put(sid, db)
+        self.stats["swaps"] += 1
+        for old in (versions + [version])[:-KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(shard_dir, old), ignore_errors=True)
+        logger.info(f"分片 {sid} 已切换到 {version}")
+
+    def close(self):
+        self._build_pool.shutdown(wait=True)
+        self._query_pool.shutdown(wait=True)
+
+
+class ShardedRetriever(BaseRetriever):
+    """RetrievalQA使用的检索器：在分片向量库上检索"""
+    store: object
+    k: int = 3
+    filters: dict = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.store.similarity_search(query, k=self.k, **self.filters)
+
+    def get_relevant_documents(self, query, **kwargs):
+        # 兼容旧版langchain直接调用该方法
+        return self._get_relevant_documents(query)
+
+    async def aget_relevant_documents(self, query, **kwargs):
+        return self._get_relevant_documents(query)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCache:
+    """
+    识别结果缓存：按 PCM内容哈希 + 解码参数 作为键
+    一级：进程内LRU（条数上限）
+    二级：SQLite文件（总字节数上限，超出按最久未访问淘汰）
+    缓存值为 {"text": ..., "segments": [...]}
+    缓存不能让识别失败：磁盘读写出错（多进程共用一个文件时锁超时、磁盘已满等）只记日志，退回只用内存
+    """
+
+    def __init__(self, max_memory_items=256, db_path=None, max_disk_bytes=256 * 1024 * 1024,
+                 busy_timeout=10.0, access_resolution=3600.0):
+        """
+        max_memory_items: 内存LRU最多缓存的条数
+        db_path: SQLite文件路径，为None时只用内存缓存
+        max_disk_bytes: 磁盘缓存最大字节数
+        busy_timeout: 其它进程持有写锁时最多等待多久(秒)
+        access_resolution: 磁盘命中时，距上次记录超过多少秒才更新访问时间（避免每次读都要写锁）
+        """
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.access_resolution = access_resolution
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.disk_errors = 0
+
+        self._db = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            try:
+                self._db = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
+                # WAL：读不阻塞写，多个批处理进程共用一个缓存文件时锁冲突少得多
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS transcripts ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON transcripts(last_access)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"打开磁盘缓存失败，只使用内存缓存 {db_path}: {e}")
+                if self._db is not None:
+                    self._db.close()
+                self._db = None
+
+    @staticmethod
+    def make_key(pcm_stream, params):
+        """计算缓存键：PCM字节的sha256 + 排序后的参数JSON"""
+        digest = hashlib.sha256()
+        if isinstance(pcm_stream, np.ndarray):
+            digest.update(memoryview(np.ascontiguousarray(pcm_stream)).cast("B"))
+        else:
+            digest.update(pcm_stream)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """查询缓存，未命中返回None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            if self._db is not None:
+                value = self._get_disk(key)
+                if value is not None:
+                    self._put_memory(key, value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def _get_disk(self, key):
+        try:
+            row = self._db.execute("SELECT value, last_access FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            self._disk_error("读取", e)
+            return None
+        now = time.time()
+        if now - row[1] > self.access_resolution:
+            try:
+                self._db.execute("UPDATE transcripts SET last_access = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._disk_error("更新访问时间", e)
+        return value
+
+    def _disk_error(self, action, error):
+        self.disk_errors += 1
+        logger.warning(f"磁盘缓存{action}失败，本次只使用内存缓存: {error}")
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def put(self, key, text, segments=None):
+        """写入缓存（内存 + 磁盘）"""
+        value = {"text": text, "segments": segments or []}
+        with self._lock:
+            self._put_memory(key, value)
+            if self._db is not None:
+                payload = json.dumps(value, ensure_ascii=False)
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO transcripts (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                        (key, payload, len(payload.encode("utf-8")), time.time())
+                    )
+                    evicted = self._evict_disk()
+                    self._db.commit()
+                    self.disk_evictions += evicted
+                except sqlite3.Error as e:
+                    self._disk_error("写入", e)
+
+    def _put_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _evict_disk(self):
+        """磁盘缓存超过上限时，按最久未访问顺序删除，返回删除的条数（提交成功后才计入统计）"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return 0
+        evicted = 0
+        rows = self._db.execute("SELECT key, size FROM transcripts ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM transcripts")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    self._disk_error("清空", e)
+
+    def stats(self):
+        """命中/未命中计数，用于监控"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions,
+                "disk_errors": self.disk_errors,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -2,6 +2,7 @@ from langchain.text_splitter import CharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
 
+import os
 import logging
 # 配置日志
 logging.basicConfig(
@@ -12,12 +13,13 @@ logger = logging.getLogger(__name__)
 
 
 class BuildVectorDB:
-    def __init__(self, chunk_size=100, chunk_overlap=20,separator="。") -> None:
+    def __init__(self, chunk_size=100, chunk_overlap=20,separator="。", embeddings=None) -> None:
         """
         文本构建为向量数据库
         chunk_size: 每个段落分割字符数
         chunk_overlap: 片段重叠部分(保证上下文连贯？)
         separator: 分隔符
+        embeddings: 嵌入模型，默认使用OpenAI嵌入（基准测试等离线场景可传入本地/假嵌入）
         """
         text_splitter = CharacterTextSplitter(
             chunk_size=100,
@@ -25,12 +27,55 @@ class BuildVectorDB:
             separator=separator
         )
         self.spliter = text_splitter
-        self.embeddings = OpenAIEmbeddings()
+        self.embeddings = embeddings or OpenAIEmbeddings()
 
     def buildWithText(self, text):
         try:
             chunks = self.spliter.split_text(text) #使用openAI的嵌入模型
             db = FAISS.from_texts(chunks, self.embeddings) #构建向量库
+            return db
         except Exception as e:
             logger.error(f"buildWithText error: {str(e)}")
             return None
+
+    def load(self, db_path):
+        """从本地目录加载持久化向量库，不存在时返回None"""
+        if not os.path.exists(os.path.join(db_path, "index.faiss")):
+            return None
+        return FAISS.load_local(db_path, self.embeddings)
+
+    @staticmethod
+    def hasSource(db, source):
+        """库里是否已有 metadata["source"] == source 的片段（幂等写入用）"""
+        if db is None or source is None:
+            return False
+        docs = getattr(db.docstore, "_dict", {})
+        return any(doc.metadata.get("source") == source for doc in docs.values())
+
+    def addTexts(self, text, db_path, metadata=None):
+        """
+        增量写入持久化向量库：加载已有库（没有则新建）→ 追加文本片段 → 保存
+        text: 待索引文本
+        db_path: 向量库目录
+        metadata: 每个片段附带的元数据（如来源文件）；带 source 时按来源幂等，已写入过的来源不再重复追加
+        """
+        try:
+            chunks = self.spliter.split_text(text)
+            if not chunks:
+                return self.load(db_path)
+            metadatas = [dict(metadata or {}) for _ in chunks]
+            db = self.load(db_path)
+            source = (metadata or {}).get("source")
+            if self.hasSource(db, source):
+                # 上次已保存到库但清单没来得及记录（崩溃后补录），直接视为已写入
+                logger.info(f"addTexts: {source} 已在向量库中，跳过")
+                return db
+            if db is None:
+                db = FAISS.from_texts(chunks, self.embeddings, metadatas=metadatas)
+            else:
+                db.add_texts(chunks, metadatas=metadatas)
+            db.save_local(db_path)
+            return db
+        except Exception as e:
+            logger.error(f"addTexts error: {str(e)}")
+            return None
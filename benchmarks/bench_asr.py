@@ -0,0 +1,298 @@
+"""Audio_AI端（识别前处理、Whisper实时率、推理后端对比、mel特征、唤醒词门控、向量库/分片向量库、问答服务）基准测试"""
+import logging
+import os
+
+import numpy as np
+
+from benchmarks.common import ROOT_DIR, benchmark, error_rate, latency_stats, time_calls, time_once
+from benchmarks.synthetic import add_noise, synth_pcm, synth_speech, synth_word, word_plan
+
+SAMPLE_RATE = 16000
+
+logger = logging.getLogger(__name__)
+
+# 合成问答文本用的词表
+_WORDS = ["项目", "会议", "截止日期", "下周", "预算", "设计", "测试", "上线", "客户", "需求",
+          "讨论", "确认", "负责人", "方案", "进度", "风险", "评审", "版本", "数据", "接口"]
+
+
+def _synth_transcript(n_sentences=500, seed=0):
+    rng = np.random.default_rng(seed)
+    sentences = ["".join(rng.choice(_WORDS, size=rng.integers(4, 10))) for _ in range(n_sentences)]
+    return "。".join(sentences) + "。"
+
+
+@benchmark("asr_frontend")
+def bench_asr_frontend(duration=30.0, input_rate=8000):
+    """ASRTransform前处理各阶段耗时（不加载模型）"""
+    from scipy.signal import resample
+    from Audio_AI.lsh_ASR import ASRTransform
+    # 前处理方法不依赖模型，跳过__init__里的模型加载
+    transform = ASRTransform.__new__(ASRTransform)
+    pcm = synth_pcm(duration, input_rate)
+    num_samples = int(len(pcm) * 16000 / input_rate)
+    resampled, resample_s = time_once(resample, pcm, num_samples)
+    filtered, filter_s = time_once(transform.butter_bandpass_filter, resampled, 300, 3400, 16000)
+    _, normalize_s = time_once(transform.normalize_audio, filtered)
+    _, total_s = time_once(transform.preprocess, pcm, input_rate, 1)
+    return {
+        "resample_ms": resample_s * 1000,
+        "filter_ms": filter_s * 1000,
+        "normalize_ms": normalize_s * 1000,
+        "preprocess_ms": total_s * 1000,
+        "preprocess_rtf": total_s / duration,
+    }
+
+
+@benchmark("asr_rtf_tiny")
+def bench_asr_rtf(duration=10.0):
+    """tiny模型完整识别的实时率（识别耗时/音频时长）"""
+    from Audio_AI.lsh_ASR import ASRTransform
+    transform, load_s = time_once(ASRTransform, language="zh", model_name="tiny")
+    pcm = synth_pcm(duration, SAMPLE_RATE)
+    # 预热一次，排除首次推理的初始化开销
+    transform.transcribe(pcm[:SAMPLE_RATE], sample_rate=SAMPLE_RATE)
+    _, elapsed = time_once(transform.transcribe, pcm, sample_rate=SAMPLE_RATE)
+    return {"model_load_s": load_s, "transcribe_s": elapsed, "rtf": elapsed / duration}
+
+
+@benchmark("mel_features")
+def bench_mel(duration=10.0, batch=8):
+    """log-mel特征：批量提取与流式增量提取"""
+    from Audio_AI.lsh_mel import MelFeatureExtractor
+    extractor = MelFeatureExtractor(sr=SAMPLE_RATE)
+    clips = np.stack([synth_speech(duration, SAMPLE_RATE, seed) for seed in range(batch)])
+    extractor.log_mel(clips)  # 预热
+    _, batch_s = time_once(extractor.log_mel, clips)
+    stream = extractor.stream()
+    blocks = [(clips[0, i:i + 512],) for i in range(0, clips.shape[1], 512)]
+    timings = time_calls(stream.push, blocks)
+    metrics = latency_stats(timings, "stream_push_")
+    metrics["batch_ms"] = batch_s * 1000
+    metrics["batch_x_realtime"] = duration * batch / batch_s
+    return metrics
+
+
+@benchmark("vector_db")
+def bench_vector_db(n_sentences=2000, n_queries=50):
+    """BuildVectorDB 建库与检索耗时（使用假嵌入，只衡量切分/索引/检索开销）"""
+    from langchain.embeddings import FakeEmbeddings
+    from Audio_AI.lsh_vector_db import BuildVectorDB
+    builder = BuildVectorDB(embeddings=FakeEmbeddings(size=384))
+    text = _synth_transcript(n_sentences)
+    db, build_s = time_once(builder.buildWithText, text)
+    queries = [(q,) for q in ["截止日期是什么时候", "预算有多少", "谁是负责人", "上线进度"] * (n_queries // 4)]
+    timings = time_calls(lambda q: db.similarity_search(q, k=3), queries)
+    metrics = latency_stats(timings, "query_")
+    metrics["build_ms"] = build_s * 1000
+    return metrics
+
+
+@benchmark("sharded_vector_db")
+def bench_sharded_vector_db(n_shards=16, n_sentences=200, n_queries=40):
+    """
+    分片向量库：单分片查询 vs 全分片扇出查询 vs 单一大索引，
+    以及后台重建期间的查询延迟（重建不应阻塞查询）
+    """
+    import tempfile
+    import threading
+    from langchain.embeddings import FakeEmbeddings
+    from Audio_AI.lsh_vector_db import BuildVectorDB
+    from Audio_AI.lsh_sharded_vector_db import ShardedVectorStore
+    builder = BuildVectorDB(embeddings=FakeEmbeddings(size=384))
+    texts = [_synth_transcript(n_sentences, seed) for seed in range(n_shards)]
+    queries = [(q,) for q in ["截止日期是什么时候", "预算有多少", "谁是负责人", "上线进度"] * (n_queries // 4)]
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ShardedVectorStore(tmp, builder, max_open_shards=8)
+        try:
+            for i, text in enumerate(texts):
+                store.addTexts(text, recording=f"rec{i:03d}", day=f"2026010{i // 4 + 1}", wait=True)
+            store._open.clear()  # 从冷启动开始测
+            _, cold_s = time_once(store.similarity_search, "预算有多少", 3, recording="rec000")
+            metrics["single_cold_ms"] = cold_s * 1000
+            metrics.update(latency_stats(
+                time_calls(lambda q: store.similarity_search(q, 3, recording="rec000"), queries), "single_"))
+            metrics.update(latency_stats(
+                time_calls(lambda q: store.similarity_search(q, 3, day="20260102"), queries), "fanout_day_"))
+
+            # 后台不断重建一个分片，同时测查询延迟
+            stop = threading.Event()
+
+            def rebuild_loop():
+                while not stop.is_set():
+                    store.rebuildShard([(texts[0], None)], recording="rec000", day="20260101", wait=True)
+
+            rebuilder = threading.Thread(target=rebuild_loop, daemon=True)
+            rebuilder.start()
+            try:
+                metrics.update(latency_stats(
+                    time_calls(lambda q: store.similarity_search(q, 3, recording="rec000"), queries), "during_rebuild_"))
+            finally:
+                stop.set()
+                rebuilder.join()
+        finally:
+            store.close()
+
+    monolithic = builder.buildWithText("。".join(texts))
+    metrics.update(latency_stats(time_calls(lambda q: monolithic.similarity_search(q, k=3), queries), "monolithic_"))
+    return metrics
+
+
+# 唤醒词及其易混淆词：前两个音节相同、音节顺序颠倒、同长度的其它词
+KEYWORD_PLAN = word_plan(3, seed=42)
+CONFUSABLE_PLANS = [KEYWORD_PLAN[:2] + word_plan(1, seed=43), KEYWORD_PLAN[::-1]]
+
+
+def _rendition(plan, rng, seed):
+    """按随机的音高(±6%)和语速(±12%)合成一次发音"""
+    return synth_word(plan, SAMPLE_RATE, pitch=rng.uniform(0.94, 1.06), tempo=rng.uniform(0.88, 1.12), seed=seed)
+
+
+def _synth_keyword_stream(n_segments=40, snr_db=15.0, seed=3):
+    """
+    合成唤醒词测试流：随机语音 + 停顿，偶数段插入唤醒词、奇数段插入易混淆词，
+    每次插入都是新的发音（音高、语速、种子都与注册模板不同），返回 (int16 PCM, 唤醒词结束时间列表)
+    """
+    rng = np.random.default_rng(seed)
+    parts, ends, pos = [], [], 0
+    for i in range(n_segments):
+        filler = synth_speech(rng.uniform(2, 5), SAMPLE_RATE, seed=100 + i)
+        parts.append(filler)
+        pos += len(filler)
+        if i % 2 == 0:
+            word = _rendition(KEYWORD_PLAN, rng, seed=1000 + i)
+        else:
+            negatives = CONFUSABLE_PLANS + [word_plan(3, seed=500 + i)]
+            word = _rendition(negatives[(i // 2) % len(negatives)], rng, seed=1000 + i)
+        parts.append(word * rng.uniform(0.5, 1.5))
+        pos += len(word)
+        if i % 2 == 0:
+            ends.append(pos / SAMPLE_RATE)
+        silence = np.zeros(int(rng.uniform(1.0, 4.0) * SAMPLE_RATE), dtype=np.float32)
+        parts.append(silence)
+        pos += len(silence)
+    audio = add_noise(np.concatenate(parts), snr_db, seed + 1, SAMPLE_RATE)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16), ends
+
+
+@benchmark("kws_gate")
+def bench_kws_gate(n_segments=40):
+    """
+    唤醒词门控：漏检率、每小时误唤醒（测试流中一半插入的是易混淆词）、检测延迟、单路流CPU占用，
+    以及门控后实际送入Whisper的音频时长（对话窗口内的语音）
+    注册用的3次发音（和实际一样带环境噪声录入）与测试流中的发音互不相同
+    """
+    from Audio_AI.lsh_kws import KeywordDetector, WakeWordGate, evaluate_detector
+    detector = KeywordDetector()
+    for seed, (pitch, tempo) in enumerate([(1.0, 1.0), (0.96, 1.06), (1.04, 0.94)]):
+        word = synth_word(KEYWORD_PLAN, SAMPLE_RATE, pitch=pitch, tempo=tempo, seed=seed)
+        detector.enroll(add_noise(word, 20.0, seed=7 + seed, sample_rate=SAMPLE_RATE))
+    pcm, ends = _synth_keyword_stream(n_segments)
+    result = evaluate_detector(detector, pcm, ends)
+
+    forwarded = []
+    detector.reset()
+    gate = WakeWordGate(detector, forwarded.append, conversation_window=2.0)
+    for i in range(0, len(pcm), 512):
+        gate.push(pcm[i:i + 512])
+    gate.close()
+    duration = len(pcm) / SAMPLE_RATE
+    return {
+        "kws_frr": result["frr"],
+        "false_accepts_per_h": result["fa_per_hour"],
+        "latency_mean_ms": result["latency_mean_ms"],
+        "latency_max_ms": result["latency_max_ms"],
+        "cpu_per_stream_rtf": result["cpu_ratio"],
+        "streams_per_core": 1.0 / result["cpu_ratio"],
+        "stream_audio_s": duration,
+        "whisper_audio_s": sum(len(p) for p in forwarded) / SAMPLE_RATE,
+    }
+
+
+@benchmark("qa_server")
+def bench_qa_server(n_requests=96, concurrency=16):
+    """
+    问答服务：假模型（每批200ms固定开销+每条15ms）下逐条处理与微批处理的吞吐和延迟，
+    以及请求带截止时间时的超时率
+    """
+    import asyncio
+    from Audio_AI.lsh_qa_server import FakeQAEngine, benchmark_server
+    engine = FakeQAEngine()
+    serial = asyncio.run(benchmark_server(engine, n_requests, concurrency, max_batch=1))
+    batched = asyncio.run(benchmark_server(engine, n_requests, concurrency, max_batch=8))
+    deadline = asyncio.run(benchmark_server(engine, n_requests, concurrency, max_batch=1, deadline_ms=1500))
+    return {
+        "serial_throughput_per_s": serial["requests_per_s"],
+        "serial_p50_ms": serial["p50_ms"],
+        "serial_p99_ms": serial["p99_ms"],
+        "batched_throughput_per_s": batched["requests_per_s"],
+        "batched_p50_ms": batched["p50_ms"],
+        "batched_p99_ms": batched["p99_ms"],
+        "mean_batch_size": n_requests / max(1, batched["batches"]),
+        "serial_deadline_miss_rate": deadline["statuses"].get(504, 0) / n_requests,
+    }
+
+
+TEST_CLIP = os.path.join(ROOT_DIR, "Audio_AI", "test.pcm")
+# 测试片段的人工标注文本（UTF-8，一行）；不存在时不计算字错率。
+# 不能用某个后端自己的识别结果当参考：那个后端的字错率恒为0，其它后端只是在比谁更像它
+TEST_CLIP_REFERENCE = os.path.join(ROOT_DIR, "Audio_AI", "test.txt")
+
+
+def _run_backend(backend, model_name, repeat):
+    """在独立进程中执行：加载后端并识别测试片段，返回耗时、峰值内存和文本"""
+    import resource
+    import sys
+    import time
+    from Audio_AI.lsh_ASR import ASRTransform
+    pcm = np.fromfile(TEST_CLIP, dtype=np.int16)
+    start = time.perf_counter()
+    transform = ASRTransform(language="zh", model_name=model_name, backend=backend)
+    load_s = time.perf_counter() - start
+    transform.transcribe(pcm, sample_rate=SAMPLE_RATE)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = transform.transcribe(pcm, sample_rate=SAMPLE_RATE)
+    elapsed = (time.perf_counter() - start) / repeat
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return {"load_s": load_s, "rtf": elapsed / (len(pcm) / SAMPLE_RATE), "peak_mb": peak_mb, "text": result["text"]}
+
+
+@benchmark("asr_backends")
+def bench_asr_backends(model_name="small", repeat=3):
+    """
+    各推理后端在自带测试片段上的实时率、峰值内存和字错率
+    每个后端在单独进程中运行，峰值内存互不干扰
+    """
+    import multiprocessing
+    from Audio_AI.lsh_asr_backend import BACKENDS
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for backend in BACKENDS:
+        with ctx.Pool(1) as pool:
+            try:
+                results[backend] = pool.apply(_run_backend, (backend, model_name, repeat))
+            except ImportError as e:
+                logger.warning(f"后端 {backend} 不可用: {e}")
+    if not results:
+        raise ImportError("没有可用的识别后端")
+
+    reference = None
+    if os.path.exists(TEST_CLIP_REFERENCE):
+        with open(TEST_CLIP_REFERENCE, "r", encoding="utf-8") as f:
+            reference = f.read().strip() or None
+    if reference is None:
+        logger.warning(f"缺少人工标注文本 {TEST_CLIP_REFERENCE}，跳过字错率（_cer）指标")
+
+    metrics = {}
+    for backend, r in results.items():
+        key = backend.replace("-", "_")
+        metrics[f"{key}_load_s"] = r["load_s"]
+        metrics[f"{key}_rtf"] = r["rtf"]
+        metrics[f"{key}_peak_mb"] = r["peak_mb"]
+        if reference is not None:
+            metrics[f"{key}_cer"] = error_rate(reference, r["text"])
+        logger.info(f"{backend} 识别结果: {r['text']}")
+    return metrics
@@ -0,0 +1,484 @@
+"""client端（实时播放链路、离线降噪）基准测试"""
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.common import benchmark, latency_stats, time_calls, time_once
+from benchmarks.synthetic import synth_pcm, write_pcm
+
+SAMPLE_RATE = 16000
+BLOCK = 512
+
+
+@benchmark("audio_dispose_block")
+def bench_audio_dispose(duration=10.0):
+    """AudioDispose.process_audio 每个512点块的处理耗时"""
+    from audioDispose import AudioDispose
+    pcm = synth_pcm(duration, SAMPLE_RATE)
+    dispose = AudioDispose(SAMPLE_RATE)
+    blocks = [(pcm[i:i + BLOCK].copy(),) for i in range(0, len(pcm) - BLOCK + 1, BLOCK)]
+    timings = time_calls(dispose.process_audio, blocks)
+    metrics = latency_stats(timings, "block_")
+    metrics["blocks_per_s"] = len(timings) / sum(timings)
+    return metrics
+
+
+@benchmark("playaudio_callback")
+def bench_playaudio_callback(duration=10.0):
+    """PlayAudio.audio_playback_callback 每次回调耗时（含缓冲判断、处理、出队）"""
+    from playAudio import PlayAudio, BUFFER_SIZE
+    pcm = synth_pcm(duration, SAMPLE_RATE)
+    player = PlayAudio(SAMPLE_RATE, 1)
+    frames = BUFFER_SIZE // 2
+    outdata = np.zeros((frames, 1), dtype=np.int16)
+    chunk_bytes = BUFFER_SIZE
+    data = pcm.tobytes()
+    timings = []
+    # 每次回调前先投递一个网络包，模拟接收和播放速率一致的稳态
+    for offset in range(0, len(data) - chunk_bytes + 1, chunk_bytes):
+        player.audio_callback(data[offset:offset + chunk_bytes])
+        _, elapsed = time_once(player.audio_playback_callback, outdata, frames, None, None)
+        timings.append(elapsed)
+    metrics = latency_stats(timings, "callback_")
+    # 回调预算：p99耗时占一个块播放时长的比例（与实时率一样越小越好）
+    metrics["callback_p99_budget_rtf"] = metrics["callback_p99_ms"] / (frames / SAMPLE_RATE * 1000)
+    return metrics
+
+
+@benchmark("denoise_throughput")
+def bench_denoise(duration=30.0):
+    """离线降噪吞吐：整段模式 vs 流式分块模式"""
+    from audio_denoiser import denoise_audio, denoise_audio_stream
+    with tempfile.TemporaryDirectory() as tmp:
+        src = write_pcm(os.path.join(tmp, "in.pcm"), duration, SAMPLE_RATE)
+        _, whole_elapsed = time_once(denoise_audio, src, os.path.join(tmp, "whole.pcm"), is_pcm=True,
+                                     noise_sample_duration=0.2, show_plot=False)
+        stats = denoise_audio_stream(src, os.path.join(tmp, "stream.pcm"), is_pcm=True,
+                                     noise_sample_duration=0.2)
+    return {
+        "whole_x_realtime": duration / whole_elapsed,
+        "stream_x_realtime": stats["x_realtime"],
+        "peak_memory_mb": stats["peak_memory_mb"],
+    }
+
+
+@benchmark("metrics_overhead")
+def bench_metrics_overhead(duration=10.0):
+    """指标开启/关闭时 AudioDispose 每块耗时对比"""
+    from audioDispose import AudioDispose
+    from lshMetrics import METRICS
+    pcm = synth_pcm(duration, SAMPLE_RATE)
+    blocks = [(pcm[i:i + BLOCK].copy(),) for i in range(0, len(pcm) - BLOCK + 1, BLOCK)]
+    was_enabled = METRICS.enabled
+    try:
+        METRICS.disable()
+        disabled = time_calls(AudioDispose(SAMPLE_RATE).process_audio, [(b[0].copy(),) for b in blocks])
+        METRICS.enable()
+        enabled = time_calls(AudioDispose(SAMPLE_RATE).process_audio, [(b[0].copy(),) for b in blocks])
+    finally:
+        METRICS.enabled = was_enabled
+    metrics = latency_stats(disabled, "disabled_")
+    metrics.update(latency_stats(enabled, "enabled_"))
+    return metrics
+
+
+def _rms_handler(stream_id, samples):
+    """传输基准用的轻量处理：只算一次RMS，耗时主要来自传输本身"""
+    return float(np.sqrt(np.mean(np.square(samples, dtype=np.float32))))
+
+
+def _pickle_worker(jobs, results):
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        stream_id, data = job
+        results.put((stream_id, _rms_handler(stream_id, np.frombuffer(data, dtype=np.int16))))
+
+
+def _run_transport(ctx, workers, submit, target, args, n_jobs):
+    jobs, results = ctx.Queue(), ctx.Queue()
+    procs = [ctx.Process(target=target, args=args(jobs, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    # 预热：等待工作进程启动完毕
+    submit(jobs, -1)
+    results.get()
+    start = time.perf_counter()
+    put_timings = []
+    for i in range(n_jobs):
+        t0 = time.perf_counter()
+        submit(jobs, i)
+        put_timings.append(time.perf_counter() - t0)
+    for _ in range(n_jobs):
+        results.get()
+    elapsed = time.perf_counter() - start
+    for _ in procs:
+        jobs.put(None)
+    for p in procs:
+        p.join()
+    return elapsed, put_timings
+
+
+@benchmark("shm_transport")
+def bench_shm_transport(streams=64, chunks_per_stream=4, chunk_seconds=5.0, workers=4):
+    """
+    接收进程 → 识别工作进程的音频传输：共享内存槽池+句柄 vs 队列直接pickle PCM字节
+    streams路并发流，每路投递chunks_per_stream段chunk_seconds秒的音频
+    """
+    import multiprocessing
+    from audioSharedMemory import SharedAudioPool, worker_loop
+    ctx = multiprocessing.get_context("spawn")
+    chunk = synth_pcm(chunk_seconds, SAMPLE_RATE)
+    n_jobs = streams * chunks_per_stream
+    total_mb = n_jobs * chunk.nbytes / (1024 * 1024)
+
+    def submit_pickle(jobs, i):
+        jobs.put((i % streams, chunk.tobytes()))
+
+    pickle_s, pickle_puts = _run_transport(ctx, workers, submit_pickle, _pickle_worker,
+                                           lambda jobs, results: (jobs, results), n_jobs)
+
+    # 槽数按同时在途的段数给足，避免测到的是分配等待
+    pool = SharedAudioPool(slots=streams * 2, slot_seconds=chunk_seconds, sample_rate=SAMPLE_RATE, ctx=ctx)
+    try:
+        def submit_shm(jobs, i):
+            jobs.put((i % streams, pool.write(chunk)))
+
+        shm_s, shm_puts = _run_transport(ctx, workers, submit_shm, worker_loop,
+                                         lambda jobs, results: (pool.spec(), jobs, _rms_handler, results), n_jobs)
+        if pool.in_use():
+            raise RuntimeError(f"共享内存槽未全部释放: {pool.stats()}")
+    finally:
+        pool.close()
+
+    metrics = latency_stats(pickle_puts, "pickle_put_")
+    metrics.update(latency_stats(shm_puts, "shm_put_"))
+    metrics["pickle_mb_per_s"] = total_mb / pickle_s
+    metrics["shm_mb_per_s"] = total_mb / shm_s
+    metrics["shm_speedup"] = pickle_s / shm_s
+    return metrics
+
+
+class _VirtualPlayout:
+    """按墙钟实时消耗的虚拟播放缓冲（不依赖声卡），记录欠载时长"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.buffered = 0.0
+        self.underrun_s = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _drain(self):
+        now = time.monotonic()
+        elapsed, self._last = now - self._last, now
+        if elapsed > self.buffered:
+            self.underrun_s += elapsed - self.buffered
+        self.buffered = max(0.0, self.buffered - elapsed)
+
+    def on_audio(self, data: bytes):
+        with self._lock:
+            self._drain()
+            self.buffered += len(data) / 2 / self.sample_rate
+
+    def level(self):
+        with self._lock:
+            self._drain()
+            return self.buffered
+
+    def trim(self, keep_seconds):
+        with self._lock:
+            self._drain()
+            dropped = max(0.0, self.buffered - keep_seconds)
+            self.buffered -= dropped
+            return dropped
+
+
+def _run_congestion(flow_control, phases):
+    from lshWebsocket import ESP32AudioStream
+    from audioFlowControl import FlowController
+    from fakeEsp32Server import FakeESP32Server
+    server = FakeESP32Server(link_kbps=phases[0][1]).start()
+    stream = ESP32AudioStream(server.url, sample_rate=SAMPLE_RATE)
+    playout = _VirtualPlayout(SAMPLE_RATE)
+    stream.set_audio_callback(playout.on_audio)
+    flow = FlowController(stream).add_buffer("playout", playout.level, playout.trim)
+    latencies = []
+    try:
+        stream.start()
+        if flow_control:
+            flow.start()
+        for duration, kbps in phases:
+            server.set_link_kbps(kbps)
+            end = time.monotonic() + duration
+            while time.monotonic() < end:
+                time.sleep(0.05)
+                # 端到端延迟 ≈ 设备端积压 + 主机播放缓冲
+                latencies.append(server.backlog_seconds() + playout.level())
+    finally:
+        flow.stop()
+        stream.stop()
+        server.stop()
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "latency_max_ms": float(np.max(latencies)) * 1000,
+        "underrun_s": playout.underrun_s,
+    }
+
+
+@benchmark("flow_control")
+def bench_flow_control():
+    """
+    假设备 + 链路带宽变化（充足 → 低于pcm16码率 → 低于μ-law码率 → 恢复），
+    对比开/关流控时的端到端延迟和播放欠载时长
+    """
+    phases = [(2.0, 400), (4.0, 180), (4.0, 90), (4.0, 400)]
+    metrics = {}
+    for label, enabled in (("off", False), ("on", True)):
+        result = _run_congestion(enabled, phases)
+        for key, value in result.items():
+            metrics[f"{label}_{key}"] = value
+    return metrics
+
+
+def _synth_wifi_capture(path, duration=30.0, frame_bytes=2 * BLOCK, seed=0):
+    """
+    合成一份类WiFi到达时间的抓包：按实时节奏发帧，叠加小抖动，并随机出现100~400ms的停顿，
+    停顿期间积压的帧在恢复后集中到达
+    """
+    from audioCapture import CaptureWriter
+    rng = np.random.default_rng(seed)
+    data = synth_pcm(duration, SAMPLE_RATE).tobytes()
+    frame_s = frame_bytes / 2 / SAMPLE_RATE
+    writer = CaptureWriter(path, SAMPLE_RATE)
+    stall_until = 0.0
+    last = 0.0
+    for i, offset in enumerate(range(0, len(data) - frame_bytes + 1, frame_bytes)):
+        t = i * frame_s + abs(rng.normal(0, 0.003))
+        if t > stall_until and rng.random() < 0.01:
+            stall_until = t + rng.uniform(0.1, 0.4)
+        t = max(t, stall_until, last)
+        writer.write(data[offset:offset + frame_bytes], t=t)
+        last = t
+    writer.close()
+    return path
+
+
+@benchmark("playaudio_replay")
+def bench_playaudio_replay(duration=30.0):
+    """
+    抓包回放驱动 PlayAudio 缓冲逻辑（虚拟时钟，结果可复现）：
+    原始节奏 / 额外抖动下的欠载时长和平均缓冲延迟，以及不等待回放的吞吐
+    """
+    from audioCapture import CaptureReader, CaptureReplayer
+    from lshWebsocket import ESP32AudioStream
+    from playAudio import PlayAudio, BUFFER_SIZE
+    frames = BUFFER_SIZE // 2
+    tick = frames / SAMPLE_RATE
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        replayer = CaptureReplayer(CaptureReader(_synth_wifi_capture(os.path.join(tmp, "wifi.cap"), duration)))
+        for label, jitter_ms in (("original", 0.0), ("jitter30", 30.0)):
+            player = PlayAudio(SAMPLE_RATE, 1)
+            stream = ESP32AudioStream("ws://replay/", sample_rate=SAMPLE_RATE)
+            stream.set_audio_callback(player.audio_callback)
+            outdata = np.zeros((frames, 1), dtype=np.int16)
+            silent, buffered = [0], []
+
+            def on_tick(_):
+                player.audio_playback_callback(outdata, frames, None, None)
+                silent[0] += not outdata.any()
+                buffered.append(player.buffered_seconds())
+
+            replayer.simulate(stream, tick, on_tick, jitter_ms=jitter_ms, seed=1)
+            metrics[f"{label}_underrun_s"] = silent[0] * tick
+            metrics[f"{label}_buffer_mean_ms"] = float(np.mean(buffered)) * 1000
+
+        stream = ESP32AudioStream("ws://replay/", sample_rate=SAMPLE_RATE)
+        stream.set_audio_callback(PlayAudio(SAMPLE_RATE, 1).audio_callback)
+        elapsed = replayer.play(stream, speed=float("inf"))
+        metrics["replay_x_realtime"] = duration / elapsed
+    return metrics
+
+
+def _tcp_head_of_line(link, n_packets, packet_interval, rto=0.2):
+    """
+    同一有损链路上的TCP对照：丢失的报文在RTO后重传（重传也可能再丢），按序交付，
+    后面已到达的报文必须等前面的重传完成，返回每个报文的交付延迟(秒)
+    """
+    latencies, delivered = [], 0.0
+    for i in range(n_packets):
+        send = i * packet_interval
+        wait = 0.0
+        delays = link.transmit(None)
+        while not delays:
+            wait += rto
+            delays = link.transmit(None)
+        delivered = max(delivered, send + wait + min(delays))
+        latencies.append(delivered - send)
+    return latencies
+
+
+@benchmark("udp_transport")
+def bench_udp_transport(duration=8.0, loss=0.03, burst=0.3, jitter_ms=30.0):
+    """
+    有损链路（3%丢包、成串丢包、30ms抖动、乱序）下UDP接收端的表现：不同最小播放缓冲下补静音的比例和实际延迟，
+    以及同一链路模型下TCP按序重传（队头阻塞）的交付延迟分布
+    """
+    import asyncio
+    from lossyUdpSender import LossyLink, UDPAudioSender, run_lossy_sender
+    from udpAudioStream import UDPAudioStream
+    pcm = synth_pcm(duration, SAMPLE_RATE).tobytes()
+    metrics = {}
+    for min_buffer in (0.05, 0.2):
+        stream = UDPAudioStream("127.0.0.1", 0, SAMPLE_RATE, min_buffer=min_buffer)
+        deliveries, sends = [], []
+        stream.set_audio_callback(lambda data: deliveries.append(time.monotonic()))
+        stream.start()
+        try:
+            asyncio.run(run_lossy_sender("127.0.0.1", stream.port, pcm, UDPAudioSender(SAMPLE_RATE),
+                                         LossyLink(loss, burst, jitter_ms=jitter_ms, seed=1),
+                                         on_frame=lambda i, t: sends.append(t)))
+            time.sleep(min_buffer + 0.05)
+        finally:
+            stream.stop()
+        label = f"udp_buf{int(min_buffer * 1000)}ms"
+        metrics[f"{label}_miss_rate"] = stream.stats["concealed_seconds"] / duration
+        metrics[f"{label}_latency_ms"] = (deliveries[0] - sends[0]) * 1000 if deliveries else 0.0
+    sender = UDPAudioSender(SAMPLE_RATE)
+    n_packets = int(duration / sender.frame_seconds) * len(sender.packetize(pcm[:sender.frame_bytes]))
+    tcp = _tcp_head_of_line(LossyLink(loss, burst, jitter_ms=jitter_ms, seed=1), n_packets,
+                            duration / n_packets)
+    metrics.update(latency_stats(tcp, "tcp_"))
+    return metrics
+
+
+def _naive_i2s_to_int16(data, sample_width, channels, shift):
+    """对照：逐步转换（整数解码 → 移位 → 拷贝成int16 → 转float64求平均），每一步都产生临时数组"""
+    if sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        x = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        x = np.where(x & 0x800000, x - 0x1000000, x)
+    else:
+        x = np.frombuffer(data, dtype=np.int32).copy()
+    x = (x >> shift).astype(np.int16)
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return x
+
+
+@benchmark("sample_format")
+def bench_sample_format(duration=60.0):
+    """
+    I2S原始帧格式转换吞吐（百万采样点/秒）：32位左对齐 / 24位右对齐 / 紧凑24位 → int16，
+    双声道32位 → 单声道float32，以及大端16位字节序转换；与逐步转换的写法对比
+    """
+    from sampleFormat import to_float32, to_int16
+    rng = np.random.default_rng(0)
+    n = int(duration * SAMPLE_RATE)
+    left32 = (rng.integers(-2 ** 31, 2 ** 31 - 1, 2 * n, dtype=np.int64)).astype("<i4")
+    right24 = left32 >> 8
+    packed24 = right24.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    cases = {
+        "left32_int16": (left32.tobytes(), dict(sample_width=4, channels=1), 16),
+        "right24_int16": (right24.tobytes(), dict(sample_width=4, channels=1, align="right"), 8),
+        "packed24_int16": (packed24, dict(sample_width=3, channels=1), 8),
+        "stereo32_int16": (left32.tobytes(), dict(sample_width=4, channels=2), 16),
+    }
+
+    def best_of(fn, repeat=3):
+        return min(time_once(fn)[1] for _ in range(repeat))
+
+    metrics = {}
+    for label, (data, options, shift) in cases.items():
+        n_samples = len(data) // options["sample_width"]
+        # 零拷贝视图也拷贝出连续数组，与对照的输出对等
+        fast = best_of(lambda: np.ascontiguousarray(to_int16(data, **options)))
+        naive = best_of(lambda: _naive_i2s_to_int16(data, options["sample_width"], options["channels"], shift))
+        metrics[f"{label}_msamples_per_s"] = n_samples / fast / 1e6
+        metrics[f"{label}_speedup"] = naive / fast
+    stereo = left32.tobytes()
+    elapsed = best_of(lambda: to_float32(stereo, 4, 2))
+    metrics["stereo32_float32_msamples_per_s"] = 2 * n / elapsed / 1e6
+    big16 = left32[:n].astype(">i2").tobytes()
+    elapsed = best_of(lambda: to_float32(big16, 2, 1, byteswap=True))
+    metrics["be16_float32_msamples_per_s"] = n / elapsed / 1e6
+    return metrics
+
+
+@benchmark("multistream_dsp")
+def bench_multistream_dsp(n_blocks=100):
+    """
+    多路处理：1/10/50/100路设备每路512点块，逐路AudioDispose与二维批量处理的每块总耗时，
+    批量模式下单路成本随路数的变化（近线性扩展时单路成本不随路数上升），以及单核能实时处理的路数
+    """
+    from audioDispose import AudioDispose
+    from multiStreamDispose import MultiStreamDispose
+    pcm = synth_pcm(n_blocks * BLOCK / SAMPLE_RATE + 1.0, SAMPLE_RATE)
+    block_s = BLOCK / SAMPLE_RATE
+    metrics = {}
+    for n in (1, 10, 50, 100):
+        # 每路错开起点，模拟不同设备
+        offsets = [(i * 997) % SAMPLE_RATE for i in range(n)]
+        blocks = [np.stack([pcm[o + b * BLOCK:o + (b + 1) * BLOCK] for o in offsets]) for b in range(n_blocks)]
+        batched = MultiStreamDispose(n, SAMPLE_RATE)
+        batched_s = sum(time_calls(batched.process, [(x,) for x in blocks])) / n_blocks
+        singles = [AudioDispose(SAMPLE_RATE) for _ in range(n)]
+
+        def loop(x):
+            for dispose, row in zip(singles, x):
+                dispose.process_audio(row.copy())
+
+        loop_s = sum(time_calls(loop, [(x,) for x in blocks])) / n_blocks
+        metrics[f"batched_{n}_block_ms"] = batched_s * 1000
+        metrics[f"loop_{n}_block_ms"] = loop_s * 1000
+        metrics[f"batched_{n}_per_stream_ms"] = batched_s / n * 1000
+        metrics[f"speedup_{n}"] = loop_s / batched_s
+    metrics["realtime_streams_per_core"] = 100 * block_s / (metrics["batched_100_block_ms"] / 1000)
+    return metrics
+
+
+
+@benchmark("broadcast_slow_consumer")
+def bench_broadcast_slow_consumer(duration=20.0, speed=20.0, work_s=0.15):
+    """
+    广播环：生产者按speed倍实时写入，慢消费者每块处理work_s秒（远超headroom）
+    每个采样点的值就是它的位置（模32768），消费者在fn里逐点核对：
+    视图模式下每个实际读到覆盖数据的块都必须被torn_blocks检测到；copy=True模式下交给fn的数据必须完整
+    """
+    from audioBroadcast import AudioBroadcastHub
+    results = {}
+    for copy in (False, True):
+        hub = AudioBroadcastHub(SAMPLE_RATE, capacity_seconds=1.0)
+        consumer = hub.subscribe("slow", max_lag_seconds=None)
+        corrupt = []
+
+        def check(data, consumer=consumer, corrupt=corrupt):
+            start = consumer.last_read_position
+            time.sleep(work_s)
+            expected = (np.arange(start, start + len(data)) % 32768).astype(np.int16)
+            if not np.array_equal(data, expected):
+                corrupt.append(start)
+
+        consumer.start_thread(check, 4 * BLOCK, copy=copy)
+        position = 0
+        for _ in range(int(duration * SAMPLE_RATE / BLOCK)):
+            hub.write((np.arange(position, position + BLOCK) % 32768).astype(np.int16))
+            position += BLOCK
+            time.sleep(BLOCK / SAMPLE_RATE / speed)
+        time.sleep(2 * work_s)
+        consumer.close()
+        mode = "copy" if copy else "view"
+        results[f"{mode}_torn_blocks"] = consumer.torn_blocks
+        results[f"{mode}_corrupt_blocks"] = len(corrupt)
+    if results["view_corrupt_blocks"] > results["view_torn_blocks"]:
+        raise AssertionError(f"视图模式有被覆盖的块未被检测到: {results}")
+    if results["copy_corrupt_blocks"]:
+        raise AssertionError(f"copy模式交给fn的数据被覆盖: {results}")
+    if not results["view_torn_blocks"]:
+        raise AssertionError(f"慢消费者场景没有产生覆盖，测试未覆盖到检测逻辑: {results}")
+    return results
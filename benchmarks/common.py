@@ -0,0 +1,90 @@
+"""
+基准测试公共工具：注册表、计时、路径设置
+每个基准函数返回 {指标名: 数值}，指标名后缀约定比较方向：
+    _ms / _s / _rtf / _mb / _cer 结尾 → 越小越好
+    其他（如 _per_s、x_realtime、speedup）→ 越大越好
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_DIR = os.path.join(ROOT_DIR, "client")
+
+# client目录下的模块互相按顶层模块导入（如 from lshWebsocket import ...）
+for path in (ROOT_DIR, CLIENT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+BENCHMARKS = {}
+
+LOWER_IS_BETTER = ("_ms", "_s", "_rtf", "_mb", "_cer", "_frr", "_per_h", "_miss_rate")
+
+
+def benchmark(name):
+    """注册基准测试函数"""
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+
+def lower_is_better(metric):
+    if metric.endswith("_per_s"):
+        return False
+    return metric.endswith(LOWER_IS_BETTER) or metric == "rtf"
+
+
+def edit_distance(ref, hyp):
+    """两个序列的编辑距离（逐行动态规划）"""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def error_rate(reference, hypothesis, language="zh"):
+    """中文按字计算CER，其他语言按词计算WER；忽略空白和常见标点"""
+    table = str.maketrans("", "", "，。！？、,.!?;；:：\"'“”‘’")
+    reference = reference.translate(table)
+    hypothesis = hypothesis.translate(table)
+    if language == "zh":
+        ref, hyp = list("".join(reference.split())), list("".join(hypothesis.split()))
+    else:
+        ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    return edit_distance(ref, hyp) / len(ref)
+
+
+def latency_stats(samples_s, prefix=""):
+    """把一组耗时(秒)汇总成 mean/p50/p99/max 毫秒指标"""
+    ms = np.asarray(samples_s) * 1000
+    return {
+        f"{prefix}mean_ms": float(ms.mean()),
+        f"{prefix}p50_ms": float(np.percentile(ms, 50)),
+        f"{prefix}p99_ms": float(np.percentile(ms, 99)),
+        f"{prefix}max_ms": float(ms.max()),
+    }
+
+
+def time_calls(fn, args_iter):
+    """逐个调用fn(*args)并记录每次耗时(秒)"""
+    timings = []
+    for args in args_iter:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_once(fn, *args, **kwargs):
+    """执行一次，返回 (结果, 耗时秒)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
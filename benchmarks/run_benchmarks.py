@@ -0,0 +1,126 @@
+"""
+性能基准测试入口（在仓库根目录执行）:
+    python -m benchmarks.run_benchmarks                       # 运行全部，结果写入 bench_results.json
+    python -m benchmarks.run_benchmarks -b audio_dispose_block -b mel_features
+    python -m benchmarks.run_benchmarks --save-baseline       # 把本次结果保存为基线
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --tolerance 0.2
+
+缺少依赖（如未安装whisper/sounddevice）的基准测试会记为skipped，不影响其他项。
+与基线比较时，任一指标变差超过容忍比例即视为回归，进程返回码为1；
+任一基准测试运行出错（status为error，如断言失败）时返回码同样为1，有没有基线都一样。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from benchmarks.common import BENCHMARKS, ROOT_DIR, lower_is_better
+# 导入即注册
+from benchmarks import bench_client, bench_asr  # noqa: F401
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, "benchmarks", "baseline.json")
+
+
+def run(names=None):
+    """运行指定（默认全部）基准测试，返回结果字典"""
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "benchmarks": {},
+    }
+    for name in names or BENCHMARKS:
+        fn = BENCHMARKS[name]
+        logger.info(f"运行基准测试: {name}")
+        try:
+            start = time.perf_counter()
+            metrics = fn()
+            results["benchmarks"][name] = {
+                "status": "ok",
+                "wall_s": time.perf_counter() - start,
+                "metrics": metrics,
+            }
+            logger.info(f"{name}: {metrics}")
+        except ImportError as e:
+            logger.warning(f"{name} 跳过（缺少依赖: {e}）")
+            results["benchmarks"][name] = {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            logger.error(f"{name} 失败: {e}", exc_info=True)
+            results["benchmarks"][name] = {"status": "error", "reason": str(e)}
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    与基线逐项比较，返回回归列表
+    每项: (基准名, 指标名, 基线值, 当前值, 变化比例)，变化比例为正表示变差
+    """
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if current.get("status") != "ok" or not base or base.get("status") != "ok":
+            continue
+        for metric, value in current["metrics"].items():
+            base_value = base["metrics"].get(metric)
+            if not base_value:
+                continue
+            change = (value - base_value) / abs(base_value)
+            worse = change if lower_is_better(metric) else -change
+            if worse > tolerance:
+                regressions.append((name, metric, base_value, value, worse))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音频/识别链路性能基准测试")
+    parser.add_argument("-b", "--bench", action="append", choices=sorted(BENCHMARKS),
+                        help="只运行指定基准测试，可重复")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="结果JSON输出路径")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线JSON路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的变差比例（默认20%%）")
+    args = parser.parse_args()
+
+    results = run(args.bench)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    logger.info(f"结果已写入 {args.output}")
+    # 出错的基准测试不产生指标，compare()无从比较，必须单独计入返回码
+    errors = [name for name, result in results["benchmarks"].items() if result.get("status") == "error"]
+    for name in errors:
+        logger.error(f"基准测试出错 {name}: {results['benchmarks'][name]['reason']}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        logger.info(f"基线已保存到 {args.baseline}")
+        return 1 if errors else 0
+
+    if not os.path.exists(args.baseline):
+        logger.info("未找到基线文件，跳过比较（可用 --save-baseline 生成）")
+        return 1 if errors else 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, base_value, value, worse in regressions:
+        logger.warning(f"性能回归 {name}.{metric}: {base_value:.4g} → {value:.4g}（变差{worse:.0%}）")
+    if not regressions:
+        logger.info("与基线相比无性能回归")
+    return 1 if regressions or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+合成测试音频：类语音信号（带共振峰的浊音音节 + 停顿）叠加噪声
+固定随机种子，保证每次基准测试输入完全一致
+"""
+import numpy as np
+
+
+def _syllable(n, f0, vibrato, formants, sample_rate):
+    """n个采样点的浊音音节：基频f0的谐波 → 共振峰加权 → sin²包络；基频按vibrato(Hz)轻微滑动，模拟语调"""
+    t = np.arange(n) / sample_rate
+    f0 = f0 * (1 + 0.1 * np.sin(2 * np.pi * vibrato * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = np.zeros(n)
+    for k in range(1, 20):
+        harmonic_freq = k * f0.mean()
+        if harmonic_freq > sample_rate / 2:
+            break
+        gain = sum(np.exp(-((harmonic_freq - f) / 200.0) ** 2) for f in formants) / k
+        voiced += gain * np.sin(k * phase)
+    return voiced * np.sin(np.pi * np.arange(n) / max(n, 1)) ** 2
+
+
+def synth_speech(duration=5.0, sample_rate=16000, seed=0):
+    """
+    生成类语音信号（float32，峰值约0.5）
+    每个音节：基频100~220Hz的谐波 → 共振峰加权 → 4Hz左右的音节包络，音节之间随机插入停顿
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_rate)
+    out = np.zeros(n, dtype=np.float32)
+    pos = 0
+    while pos < n:
+        syllable = int(rng.uniform(0.15, 0.35) * sample_rate)
+        syllable = min(syllable, n - pos)
+        f0, vibrato = rng.uniform(100, 220), rng.uniform(1, 3)
+        formants = rng.uniform([500, 1200, 2400], [900, 2000, 3200])
+        out[pos:pos + syllable] = _syllable(syllable, f0, vibrato, formants, sample_rate)
+        pos += syllable + int(rng.uniform(0.02, 0.3) * sample_rate)
+    peak = np.max(np.abs(out))
+    return out * (0.5 / peak) if peak > 0 else out
+
+
+def word_plan(n_syllables=3, seed=0):
+    """随机生成一个“词”的音节参数列表：[(时长, 基频, 共振峰), ...]，同一个plan可以用不同说话方式多次合成"""
+    rng = np.random.default_rng(seed)
+    return [(rng.uniform(0.18, 0.3), rng.uniform(110, 200), rng.uniform([500, 1200, 2400], [900, 2000, 3200]))
+            for _ in range(n_syllables)]
+
+
+def synth_word(plan, sample_rate=16000, pitch=1.0, tempo=1.0, seed=0):
+    """
+    按音节参数合成一个词（float32，峰值约0.5）
+    pitch: 基频倍数；tempo: 语速倍数（>1更快）；seed: 控制语调、共振峰和音节间隔的随机抖动，
+    相当于同一个人（或不同的人）每次说同一个词都略有不同
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for duration, f0, formants in plan:
+        n = int(duration / tempo * rng.uniform(0.9, 1.1) * sample_rate)
+        formants = formants * rng.uniform(0.95, 1.05, size=len(formants))
+        parts.append(_syllable(n, f0 * pitch, rng.uniform(1, 3), formants, sample_rate))
+        parts.append(np.zeros(int(rng.uniform(0.02, 0.06) / tempo * sample_rate)))
+    out = np.concatenate(parts[:-1]).astype(np.float32)
+    peak = np.max(np.abs(out))
+    return out * (0.5 / peak) if peak > 0 else out
+
+
+def add_noise(signal, snr_db=10.0, seed=1, sample_rate=16000):
+    """按信噪比叠加白噪声 + 50Hz工频干扰"""
+    rng = np.random.default_rng(seed)
+    signal_power = np.mean(signal ** 2) or 1e-6
+    noise_power = signal_power / (10 ** (snr_db / 10))
+    noise = rng.standard_normal(len(signal)) * np.sqrt(noise_power * 0.9)
+    t = np.arange(len(signal)) / sample_rate
+    hum = np.sqrt(2 * noise_power * 0.1) * np.sin(2 * np.pi * 50 * t)
+    return (signal + noise + hum).astype(np.float32)
+
+
+def synth_pcm(duration=5.0, sample_rate=16000, snr_db=10.0, seed=0):
+    """合成带噪语音并转为int16 PCM数组"""
+    audio = add_noise(synth_speech(duration, sample_rate, seed), snr_db, seed + 1, sample_rate)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def write_pcm(path, duration=5.0, sample_rate=16000, snr_db=10.0, seed=0):
+    """合成带噪语音并写为裸PCM文件，返回路径"""
+    synth_pcm(duration, sample_rate, snr_db, seed).tofile(path)
+    return path
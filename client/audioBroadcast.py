@@ -0,0 +1,242 @@
+import logging
+import threading
+import numpy as np
+from lshMetrics import METRICS
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+POLICY_DROP_OLDEST = "drop_oldest"  # 落后太多时跳到最新可读位置，丢弃中间数据
+POLICY_DETACH = "detach"            # 落后太多时直接断开该消费者
+
+
+class BroadcastConsumer:
+    """
+    广播环的一个读取游标，各消费者按自己的节奏读取，互不影响
+    read() 返回的是环形缓冲区上的只读视图（不拷贝）；落后量上限比容量少留了一个写入块的余量，
+    视图至少在生产者再写入headroom个采样点之前有效（正常节奏下即下一次read之前），需要长期保存的数据请自行 copy()
+    用完视图后可以用 is_valid(last_read_position) 检查处理期间它是否已被生产者覆盖
+    """
+
+    def __init__(self, hub, name, policy, max_lag):
+        self.hub = hub
+        self.name = name
+        self.policy = policy
+        self.max_lag = max_lag
+        self.position = hub.head      # 从订阅时刻开始读
+        self.last_read_position = None  # 最近一次read返回的视图的起始位置
+        self.detached = False
+        self.dropped_samples = 0
+        self.read_samples = 0
+        self.max_seen_lag = 0
+        self.torn_blocks = 0          # 处理期间被覆盖的块数
+        labels = {"consumer": name}
+        self._m_lag = METRICS.gauge("broadcast_consumer_lag_samples", "消费者落后写入位置的采样点数", labels)
+        self._m_dropped = METRICS.counter("broadcast_consumer_dropped_samples_total", "消费者因落后被丢弃的采样点数", labels)
+        self._m_torn = METRICS.counter("broadcast_consumer_torn_blocks_total", "处理期间被生产者覆盖的块数", labels)
+
+    @property
+    def lag(self):
+        return self.hub.head - self.position
+
+    def _apply_policy(self):
+        lag = self.lag
+        if lag > self.max_seen_lag:
+            self.max_seen_lag = lag
+        if lag <= self.max_lag:
+            return True
+        if self.policy == POLICY_DETACH:
+            logger.warning(f"消费者 {self.name} 落后 {lag} 采样点，已断开")
+            self.detached = True
+            self.hub._remove(self)
+            return False
+        skipped = lag - self.max_lag
+        self.position += skipped
+        self.dropped_samples += skipped
+        if METRICS.enabled:
+            self._m_dropped.inc(skipped)
+        return True
+
+    def read(self, max_samples=None):
+        """读取当前可读数据（最多max_samples个），返回只读视图；无数据或已断开时返回空数组"""
+        if self.detached or not self._apply_policy():
+            return self.hub.empty
+        available = self.hub.head - self.position
+        n = available if max_samples is None else min(available, max_samples)
+        if n <= 0:
+            return self.hub.empty
+        view = self.hub._view(self.position, n)
+        self.last_read_position = self.position
+        self.position += n
+        self.read_samples += n
+        if METRICS.enabled:
+            self._m_lag.set(self.hub.head - self.position)
+        return view
+
+    def read_exact(self, n, timeout=None):
+        """等待直到凑够n个采样点再返回视图；超时或断开返回None"""
+        if not self.hub.wait_for(lambda: self.detached or self.hub.head - self.position >= n, timeout):
+            return None
+        if self.detached:
+            return None
+        view = self.read(n)
+        return view if len(view) == n else None
+
+    def is_valid(self, start_position):
+        """检查从start_position开始拿到的视图是否仍未被覆盖"""
+        return self.hub.head - start_position <= self.hub.capacity
+
+    def _check_intact(self, start_position):
+        """视图用完后检查是否被覆盖，被覆盖时计数并告警"""
+        if self.is_valid(start_position):
+            return True
+        self.torn_blocks += 1
+        if METRICS.enabled:
+            self._m_torn.inc()
+        logger.warning(f"消费者 {self.name} 处理太慢，位置{start_position}开始的数据在处理期间已被覆盖")
+        return False
+
+    def start_thread(self, fn, block_samples, timeout=0.5, copy=False):
+        """
+        启动后台线程：每凑够block_samples个采样点调用一次fn(数据)
+        copy=False时fn拿到的是只读视图，处理耗时超过headroom对应的时长就可能读到已被覆盖的数据，
+        fn返回后会检查并计入torn_blocks；识别、写盘等慢消费者应使用copy=True，先拷贝再处理
+        """
+        def loop():
+            while not self.detached:
+                view = self.read_exact(block_samples, timeout)
+                if view is None:
+                    continue
+                start = self.last_read_position
+                if copy:
+                    view = view.copy()
+                    if not self._check_intact(start):  # 拷贝完成前就已被覆盖，丢弃这一块
+                        continue
+                try:
+                    fn(view)
+                except Exception as e:
+                    logger.error(f"消费者 {self.name} 处理失败: {e}")
+                if not copy:
+                    self._check_intact(start)
+        thread = threading.Thread(target=loop, name=f"broadcast-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.detached = True
+        self.hub._remove(self)
+
+    def stats(self):
+        return {
+            "lag_samples": self.lag,
+            "max_lag_samples": self.max_seen_lag,
+            "read_samples": self.read_samples,
+            "dropped_samples": self.dropped_samples,
+            "torn_blocks": self.torn_blocks,
+            "detached": self.detached,
+        }
+
+
+class AudioBroadcastHub:
+    """
+    单生产者、多消费者的广播环形缓冲区
+    - 生产者（WebSocket接收线程）只写一次，从不等待任何消费者
+    - 缓冲区做了“镜像”：每个采样点同时写在 i 和 i+capacity 两处，
+      因此任意长度不超过capacity的区间都是连续内存，消费者拿到的视图永远不需要拼接拷贝
+    - 位置用单调递增的总采样数表示，落后量 = head - position
+    """
+
+    def __init__(self, sample_rate=16000, capacity_seconds=5.0, dtype=np.int16, headroom_seconds=0.1):
+        """headroom_seconds: 预留的余量，不小于生产者单次写入的最大时长（ESP32一个网络包远小于100ms）"""
+        self.sample_rate = sample_rate
+        self.capacity = int(sample_rate * capacity_seconds)
+        self.headroom = int(sample_rate * headroom_seconds)
+        if not 0 <= self.headroom < self.capacity:
+            raise ValueError("headroom_seconds 必须小于 capacity_seconds")
+        self.dtype = np.dtype(dtype)
+        self._buf = np.zeros(self.capacity * 2, dtype=self.dtype)
+        self._readonly = self._buf.view()
+        self._readonly.flags.writeable = False
+        self.empty = self._readonly[:0]
+        self.head = 0                 # 已写入的总采样点数
+        self._pending = b""
+        self._consumers = []
+        self._cond = threading.Condition()
+
+    def attach(self, stream):
+        """挂到ESP32AudioStream上接收数据"""
+        stream.add_audio_sink(self.write_bytes)
+        return self
+
+    def subscribe(self, name, policy=POLICY_DROP_OLDEST, max_lag_seconds=None):
+        """
+        新增消费者
+        policy: drop_oldest（落后时丢弃最旧数据）或 detach（落后时断开）
+        max_lag_seconds: 允许的最大落后时长，默认（也是上限）为缓冲区容量减去headroom，
+                         保证读出的视图不会被紧接着的下一次写入覆盖
+        """
+        if policy not in (POLICY_DROP_OLDEST, POLICY_DETACH):
+            raise ValueError(f"未知的慢消费者策略: {policy}")
+        limit = self.capacity - self.headroom
+        max_lag = limit if max_lag_seconds is None else min(int(max_lag_seconds * self.sample_rate), limit)
+        consumer = BroadcastConsumer(self, name, policy, max_lag)
+        with self._cond:
+            self._consumers.append(consumer)
+        return consumer
+
+    def _remove(self, consumer):
+        with self._cond:
+            if consumer in self._consumers:
+                self._consumers.remove(consumer)
+            self._cond.notify_all()
+
+    def write_bytes(self, data: bytes):
+        """接收原始PCM字节（与audio_callback签名一致），不足一个采样点的尾巴留到下次"""
+        itemsize = self.dtype.itemsize
+        if self._pending:
+            data = self._pending + data
+        usable = len(data) - len(data) % itemsize
+        self._pending = data[usable:]
+        if usable:
+            self.write(np.frombuffer(data, dtype=self.dtype, count=usable // itemsize))
+
+    def write(self, samples):
+        """生产者写入采样点：镜像写两份后再推进head，消费者只会看到完整数据"""
+        n = len(samples)
+        if n > self.capacity:
+            # 超过容量只保留最新部分，跳过的部分对所有消费者都视为丢弃
+            self.head += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        start = self.head % self.capacity
+        first = min(n, self.capacity - start)
+        buf = self._buf
+        cap = self.capacity
+        buf[start:start + first] = samples[:first]
+        buf[start + cap:start + cap + first] = samples[:first]
+        if first < n:
+            rest = samples[first:]
+            buf[:n - first] = rest
+            buf[cap:cap + n - first] = rest
+        self.head += n
+        with self._cond:
+            self._cond.notify_all()
+
+    def _view(self, position, n):
+        start = position % self.capacity
+        return self._readonly[start:start + n]
+
+    def wait_for(self, predicate, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout)
+
+    def consumers(self):
+        with self._cond:
+            return list(self._consumers)
+
+    def stats(self):
+        return {c.name: c.stats() for c in self.consumers()}
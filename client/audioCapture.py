@@ -0,0 +1,216 @@
+"""
+现场抓包与回放：把ESP32AudioStream收到的每一帧连同到达时间记录成紧凑的二进制文件，
+之后不需要设备和网络，按原始 / 加速 / 加抖动的节奏把同样的帧重新喂给同一套回调
+
+文件格式（小端）：
+    文件头  magic(8) "ESPCAP1\\0" | sample_rate(u32) | channels(u16) | sample_width(u16) | 开始墙钟时间(f64)
+    每帧    距上一帧的间隔微秒(u32) | 类型(u8, 0=二进制音频 1=文本) | 长度(u32) | 原始载荷
+每帧只多9字节开销；记录的是解码前的原始帧，文本帧（如设备格式切换事件）也一并记录，回放时行为完全一致
+"""
+import time
+import json
+import struct
+import logging
+import argparse
+import threading
+
+import numpy as np
+from audioFlowControl import CODEC_BYTES
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ESPCAP1\0"
+_HEADER = struct.Struct("<8sIHHd")
+_RECORD = struct.Struct("<IBI")
+KIND_BINARY = 0
+KIND_TEXT = 1
+
+
+class CaptureWriter:
+    """抓包写入器：在接收线程里调用，只做一次带缓冲的顺序写"""
+
+    def __init__(self, path, sample_rate=16000, channels=1, sample_width=2, buffering=1024 * 1024):
+        self.path = path
+        self._file = open(path, "wb", buffering=buffering)
+        self._file.write(_HEADER.pack(MAGIC, sample_rate, channels, sample_width, time.time()))
+        self._last = None
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+
+    def write(self, message, t=None):
+        """
+        记录一帧；t为到达时间（time.monotonic()秒），默认取当前时间
+        合成测试数据时可以显式传入t
+        """
+        if t is None:
+            t = time.monotonic()
+        if isinstance(message, str):
+            kind, payload = KIND_TEXT, message.encode("utf-8")
+        else:
+            kind, payload = KIND_BINARY, bytes(message)
+        with self._lock:
+            if self._file is None:
+                return
+            delta = 0 if self._last is None else max(0, int(round((t - self._last) * 1e6)))
+            self._last = t if self._last is None else self._last + delta / 1e6
+            self._file.write(_RECORD.pack(min(delta, 0xFFFFFFFF), kind, len(payload)))
+            self._file.write(payload)
+            self.frames += 1
+            self.bytes += len(payload)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"抓包已保存: {self.path}（{self.frames}帧，{self.bytes}字节）")
+
+
+class CaptureReader:
+    """读取抓包文件"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, self.sample_rate, self.channels, self.sample_width, self.start_wall = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"不是抓包文件: {path}")
+        # 一次性解析出时间轴和载荷
+        self.times = []
+        self.kinds = []
+        self.payloads = []
+        offset = _HEADER.size
+        t = 0.0
+        view = memoryview(data)
+        while offset + _RECORD.size <= len(data):
+            delta, kind, length = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if offset + length > len(data):
+                logger.warning(f"抓包文件末尾不完整，已忽略（{path}）")
+                break
+            t += delta / 1e6
+            payload = view[offset:offset + length]
+            offset += length
+            self.times.append(t)
+            self.kinds.append(kind)
+            self.payloads.append(payload.tobytes().decode("utf-8") if kind == KIND_TEXT else payload.tobytes())
+        self.times = np.array(self.times)
+
+    def __len__(self):
+        return len(self.payloads)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    def schedule(self, speed=1.0, jitter_ms=0.0, seed=0):
+        """
+        返回回放时间轴（秒，从0开始）
+        speed: 加速倍数，2.0表示两倍速；float("inf")表示不等待
+        jitter_ms: 在原始到达时间上叠加的额外延迟（半正态分布，标准差jitter_ms），
+                   保持帧顺序不变（与TCP一致），延迟的帧会和后面的帧挤在一起到达
+        """
+        if speed == float("inf"):
+            return np.zeros(len(self.times))
+        t = self.times / speed
+        if jitter_ms > 0:
+            rng = np.random.default_rng(seed)
+            t = np.maximum.accumulate(t + np.abs(rng.normal(0.0, jitter_ms / 1000.0, len(t))))
+        return t
+
+    def stats(self):
+        gaps = np.diff(self.times) * 1000 if len(self.times) > 1 else np.zeros(1)
+        # 设备中途可能切换线上格式（如降级为8k μ-law），之后的字节按格式事件里的采样率和编码折算时长
+        audio = 0
+        audio_seconds = 0.0
+        bytes_per_second = self.sample_rate * self.channels * self.sample_width
+        for payload, kind in zip(self.payloads, self.kinds):
+            if kind == KIND_BINARY:
+                audio += 1
+                audio_seconds += len(payload) / bytes_per_second
+                continue
+            try:
+                event = json.loads(payload)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and event.get("event") == "format":
+                codec = event.get("codec")
+                rate = int(event.get("sample_rate", self.sample_rate))
+                bytes_per_second = rate * self.channels * CODEC_BYTES.get(codec, self.sample_width)
+        return {
+            "frames": len(self),
+            "audio_frames": audio,
+            "duration_s": self.duration,
+            "audio_s": audio_seconds,
+            "gap_mean_ms": float(np.mean(gaps)),
+            "gap_p99_ms": float(np.percentile(gaps, 99)),
+            "gap_max_ms": float(np.max(gaps)),
+        }
+
+
+class CaptureReplayer:
+    """
+    把抓包按指定节奏重新喂给ESP32AudioStream（走_on_message，与真实接收完全同一路径：
+    格式切换、解码、audio_callback、各接收端），不需要设备和网络
+    """
+
+    def __init__(self, capture):
+        self.capture = CaptureReader(capture) if isinstance(capture, str) else capture
+
+    def play(self, stream, speed=1.0, jitter_ms=0.0, seed=0):
+        """按墙钟节奏回放（阻塞直到回放结束），返回实际耗时(秒)"""
+        schedule = self.capture.schedule(speed, jitter_ms, seed)
+        start = time.monotonic()
+        for t, payload in zip(schedule, self.capture.payloads):
+            delay = start + t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            stream._on_message(None, payload)
+        return time.monotonic() - start
+
+    def simulate(self, stream, tick_interval, on_tick, speed=1.0, jitter_ms=0.0, seed=0):
+        """
+        虚拟时钟回放：不睡眠，按时间顺序交错执行“帧到达”和“周期性tick”（如播放回调），
+        结果完全可复现，适合对缓冲/DSP逻辑做确定性基准测试
+        on_tick(virtual_time): 每tick_interval秒调用一次，直到最后一帧到达之后
+        返回tick次数
+        """
+        schedule = self.capture.schedule(speed, jitter_ms, seed)
+        next_tick = tick_interval
+        ticks = 0
+        for t, payload in zip(schedule, self.capture.payloads):
+            while next_tick <= t:
+                on_tick(next_tick)
+                ticks += 1
+                next_tick += tick_interval
+            stream._on_message(None, payload)
+        end = schedule[-1] if len(schedule) else 0.0
+        while next_tick <= end + tick_interval:
+            on_tick(next_tick)
+            ticks += 1
+            next_tick += tick_interval
+        return ticks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ESP32音频抓包查看/导出")
+    parser.add_argument("capture", help="抓包文件")
+    parser.add_argument("--export", help="把音频帧拼接导出为裸PCM文件（仅pcm16格式的抓包）")
+    args = parser.parse_args()
+
+    reader = CaptureReader(args.capture)
+    for key, value in reader.stats().items():
+        print(f"{key}: {value}")
+    if args.export:
+        with open(args.export, "wb") as f:
+            for kind, payload in zip(reader.kinds, reader.payloads):
+                if kind == KIND_BINARY:
+                    f.write(payload)
+        print(f"已导出: {args.export}")
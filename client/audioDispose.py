@@ -4,6 +4,7 @@ import time
 import scipy.signal as signal
 import soundfile as sf
 import noisereduce as nr
+from lshMetrics import METRICS
 
 # 配置日志
 logging.basicConfig(
@@ -23,6 +24,37 @@ NOISE_THRESHOLD = 600
 TARGET_PEAK = 28000
 dc_offset = 0.0  # 全局直流偏移变量
 
+# 各处理阶段耗时
+_STAGE_DC = METRICS.histogram("dispose_stage_seconds", "AudioDispose各阶段耗时", {"stage": "dc_offset"})
+_STAGE_NOISE = METRICS.histogram("dispose_stage_seconds", "AudioDispose各阶段耗时", {"stage": "noise_gate"})
+_STAGE_FILTER = METRICS.histogram("dispose_stage_seconds", "AudioDispose各阶段耗时", {"stage": "filter"})
+_SAMPLES = METRICS.counter("dispose_samples_total", "AudioDispose处理的采样点数")
+
+def design_biquad(cutoff, filter_type, q, sample_rate):
+    """二阶节（RBJ）高通/低通滤波器系数，返回归一化后的 (b, a)"""
+    normalized_cutoff = cutoff / (0.5 * sample_rate)
+    w0 = 2 * np.pi * normalized_cutoff
+    alpha = np.sin(w0) / (2 * q)
+    if filter_type == 'highpass':
+        b0 = (1 + np.cos(w0)) / 2
+        b1 = -(1 + np.cos(w0))
+        b2 = (1 + np.cos(w0)) / 2
+    elif filter_type == 'lowpass':
+        b0 = (1 - np.cos(w0)) / 2
+        b1 = 1 - np.cos(w0)
+        b2 = (1 - np.cos(w0)) / 2
+    else:
+        raise ValueError("滤波器类型必须是 'highpass' 或 'lowpass'")
+    a0 = 1 + alpha
+    a1 = -2 * np.cos(w0)
+    a2 = 1 - alpha
+
+    b = np.array([b0, b1, b2]) / a0
+    a = np.array([1, a1/a0, a2/a0])
+
+    return b, a
+
+
 class AudioDispose:
     def __init__(self, sample_rate, highpass_cutoff=80, lowpass_cutoff=17000, q=1.0):
         self.sample_rate = sample_rate
@@ -44,32 +76,7 @@ class AudioDispose:
 
 
     def _design_biquad_filter(self, cutoff, filter_type, q):
-        normalized_cutoff =  cutoff/ self.nyquist
-        if filter_type == 'highpass':
-            w0 = 2 * np.pi * normalized_cutoff
-            alpha = np.sin(w0) / (2 * q)
-            b0 = (1 + np.cos(w0)) / 2
-            b1 = -(1 + np.cos(w0))
-            b2 = (1 + np.cos(w0)) / 2
-            a0 = 1 + alpha
-            a1 = -2 * np.cos(w0)
-            a2 = 1 - alpha
-        elif filter_type == 'lowpass':
-            w0 = 2 * np.pi * normalized_cutoff
-            alpha = np.sin(w0) / (2 * q)
-            b0 = (1 - np.cos(w0)) / 2
-            b1 = 1 - np.cos(w0)
-            b2 = (1 - np.cos(w0)) / 2
-            a0 = 1 + alpha
-            a1 = -2 * np.cos(w0)
-            a2 = 1 - alpha
-        else:
-            raise ValueError("滤波器类型必须是 'highpass' 或 'lowpass'")
-
-        b = np.array([b0, b1, b2]) / a0
-        a = np.array([1, a1/a0, a2/a0])
-
-        return b, a
+        return design_biquad(cutoff, filter_type, q, self.sample_rate)
 
 
     def _process_filter(self, audio_chunk):
@@ -232,10 +239,15 @@ class AudioDispose:
 
     def process_audio(self, samples):
 
-        samples = self._remove_dc_offset(samples)
-        samples = self._reduce_noise(samples)
+        if METRICS.enabled:
+            _SAMPLES.inc(len(samples))
+        with METRICS.timer(_STAGE_DC):
+            samples = self._remove_dc_offset(samples)
+        with METRICS.timer(_STAGE_NOISE):
+            samples = self._reduce_noise(samples)
         # samples = self._boost_volume(samples)
-        samples = self._process_filter(samples)
+        with METRICS.timer(_STAGE_FILTER):
+            samples = self._process_filter(samples)
         
         # samples = self.process_segment(samples)
         return samples
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""
+接收端驱动的流控：主机根据消费端缓冲水位，通过WebSocket文本通道反馈给设备并请求调整发送格式
+
+控制协议（JSON文本帧，与音频二进制帧走同一连接，顺序有保证）：
+    主机 → 设备
+        {"cmd": "buffer_level", "buffered_ms": 320, "arrival_ratio": 0.97}
+        {"cmd": "set_format", "sample_rate": 8000, "codec": "ulaw", "chunk_bytes": 512}
+        {"cmd": "flush"}                       丢弃设备端积压的未发送音频
+    设备 → 主机
+        {"event": "format", "sample_rate": 8000, "codec": "ulaw", "chunk_bytes": 512}
+        设备切换格式后回复，此后的二进制帧即为新格式
+
+主机端收到非标称格式的帧会先解码、重采样回标称格式，所有消费者（播放、录音、识别）看到的数据格式不变，
+流控只是在链路拥塞时用音质换带宽
+"""
+import time
+import logging
+import threading
+
+import numpy as np
+from lshMetrics import METRICS
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ---------------- 编解码 ----------------
+_ULAW_BIAS = 0x84
+_ULAW_CLIP = 32635
+
+
+def _build_ulaw_table():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + _ULAW_BIAS) << exponent) - _ULAW_BIAS
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+_ULAW_TABLE = _build_ulaw_table()
+
+
+def ulaw_decode(data: bytes):
+    """G.711 μ-law 字节 → int16，查表实现"""
+    return _ULAW_TABLE[np.frombuffer(data, dtype=np.uint8)]
+
+
+def ulaw_encode(samples):
+    """int16 → G.711 μ-law 字节（假设备用）"""
+    x = samples.astype(np.int32)
+    sign = (x < 0).astype(np.int32) << 7
+    x = np.minimum(np.abs(x), _ULAW_CLIP) + _ULAW_BIAS
+    exponent = np.clip(np.floor(np.log2(x)).astype(np.int32) - 7, 0, 7)
+    mantissa = (x >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+CODECS = {
+    "pcm16": lambda data: np.frombuffer(data, dtype=np.int16, count=len(data) // 2),
+    "ulaw": ulaw_decode,
+}
+# 每种编码每个采样点的字节数（用于估算码率）
+CODEC_BYTES = {"pcm16": 2, "ulaw": 1}
+
+
+def decode_frame(data: bytes, codec, from_rate, to_rate):
+    """把一帧设备数据解码并线性插值重采样到主机标称采样率，返回int16数组"""
+    samples = CODECS[codec](data)
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    n_out = int(round(len(samples) * to_rate / from_rate))
+    positions = np.arange(n_out) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+
+
+# 降级阶梯：从高码率到低码率，拥塞时逐级下调，恢复后逐级上调
+DEFAULT_LADDER = (
+    {"sample_rate": 16000, "codec": "pcm16", "chunk_bytes": 1024},   # 256 kbps
+    {"sample_rate": 16000, "codec": "ulaw", "chunk_bytes": 512},     # 128 kbps
+    {"sample_rate": 8000, "codec": "ulaw", "chunk_bytes": 256},      # 64 kbps
+)
+
+
+class FlowController:
+    """
+    主机端流控：周期采样各消费者缓冲水位和到达速率，
+    - 每个周期向设备反馈缓冲水位
+    - 水位低于low_watermark且到达速率跟不上实时（链路拥塞）→ 降一级格式
+    - 水位超过critical_watermark（拥塞恢复后的突发积压）→ 让设备丢弃积压，并把本地缓冲裁到target_seconds，保证端到端延迟有上限
+    - 连续probe_interval秒稳定 → 尝试升一级；升级后很快又拥塞则下一次探测间隔翻倍
+    格式切换以设备回复的format事件为准：发出set_format后在ack_timeout内不再发新的切换请求，
+    收到确认才更新当前阶梯下标和升降级计数；不支持文本命令的固件不会回复，level保持不变
+    连接重新建立（stream发出connected事件）时设备回到默认格式，流控状态也回到初始值
+
+    注意：需要固件能读取并处理文本帧，目前固件尚未支持，PlayAudio中默认不启用（见AUDIO_FLOW_CONTROL）
+    """
+
+    def __init__(self, stream, ladder=DEFAULT_LADDER, interval=0.2, low_watermark=0.1,
+                 high_watermark=0.6, critical_watermark=1.0, target_seconds=0.3,
+                 congestion_ratio=0.9, probe_interval=5.0, max_probe_interval=60.0, ack_timeout=2.0):
+        """
+        stream: ESP32AudioStream
+        ladder: 可选发送格式列表，按码率从高到低排列
+        interval: 采样/反馈周期(秒)
+        low_watermark/high_watermark/critical_watermark: 缓冲水位阈值(秒)
+        target_seconds: 超过critical_watermark时裁剪后保留的缓冲时长
+        congestion_ratio: 到达速率低于实时的多少倍认为拥塞
+        probe_interval: 稳定多久后尝试升级格式
+        ack_timeout: 等待设备确认格式切换的时间(秒)，超时后允许重新请求
+        """
+        self.stream = stream
+        self.ladder = list(ladder)
+        self.interval = interval
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.critical_watermark = critical_watermark
+        self.target_seconds = target_seconds
+        self.congestion_ratio = congestion_ratio
+        self.base_probe_interval = probe_interval
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.level = 0                    # 设备已确认的阶梯下标
+        self.ack_timeout = ack_timeout
+        self._pending = None              # (请求的阶梯下标, 请求时间)，等待设备确认
+        self._buffers = []
+        self._running = False
+        self._thread = None
+        self._last_received = None
+        self._ratio = 1.0                 # 到达速率的指数平滑值，单个周期只有几帧，直接用噪声太大
+        self._last_change = time.monotonic()
+        self._stable_since = time.monotonic()
+        self.stats = {"downgrades": 0, "upgrades": 0, "trims": 0, "trimmed_seconds": 0.0, "feedback": 0,
+                      "unacked": 0}
+        self._m_level = METRICS.gauge("flow_buffer_seconds", "流控采样到的最大消费端缓冲时长")
+        self._m_format = METRICS.gauge("flow_format_level", "设备已确认的发送格式阶梯下标（0为最高码率）")
+        stream.add_control_listener(self._on_device_event)
+
+    def add_buffer(self, name, level_fn, trim_fn=None):
+        """
+        注册一个消费端缓冲
+        level_fn(): 返回当前缓冲时长(秒)
+        trim_fn(keep_seconds): 丢弃最旧数据只保留keep_seconds，返回丢弃的秒数
+        """
+        self._buffers.append((name, level_fn, trim_fn))
+        return self
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="flow-control", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while self._running:
+            time.sleep(self.interval)
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"流控处理失败: {e}")
+
+    def step(self):
+        """执行一个流控周期（后台线程调用，也可以手动驱动）"""
+        if not self._buffers or not self.stream.is_connected():
+            return
+        levels = {name: level_fn() for name, level_fn, _ in self._buffers}
+        buffered = max(levels.values())
+        arrival_ratio = self._arrival_ratio()
+        now = time.monotonic()
+        if METRICS.enabled:
+            self._m_level.set(buffered)
+        self.stream._send_command("buffer_level", {
+            "buffered_ms": int(buffered * 1000),
+            "arrival_ratio": round(arrival_ratio, 3),
+        })
+        self.stats["feedback"] += 1
+        if self._pending is not None:
+            if now - self._pending[1] < self.ack_timeout:
+                return  # 等待设备确认上一次格式切换
+            logger.warning(f"设备未确认格式切换: {self.ladder[self._pending[0]]}")
+            self.stats["unacked"] += 1
+            self._pending = None
+
+        if buffered > self.critical_watermark:
+            self._trim(buffered)
+            self._stable_since = now
+        elif buffered < self.low_watermark and arrival_ratio < self.congestion_ratio:
+            if self.level < len(self.ladder) - 1 and now - self._last_change >= 1.0:
+                # 刚升级就拥塞，说明探测失败，下一次探测等更久
+                if now - self._last_change < self.probe_interval:
+                    self.probe_interval = min(self.probe_interval * 2, self.max_probe_interval)
+                self._request(self.level + 1)
+            self._stable_since = now
+        elif buffered > self.high_watermark or arrival_ratio < self.congestion_ratio:
+            self._stable_since = now
+        elif self.level > 0 and now - self._stable_since >= self.probe_interval:
+            self._request(self.level - 1)
+            self._stable_since = now
+        elif self.level == 0:
+            # 已回到最高码率，探测退避清零
+            self.probe_interval = self.base_probe_interval
+
+    def _arrival_ratio(self):
+        """两次采样之间收到的音频时长 / 经过的墙钟时间，1.0表示与实时同步"""
+        now = time.monotonic()
+        received = self.stream.received_seconds
+        last = self._last_received
+        self._last_received = (now, received)
+        # 还没收到过数据（刚连接）时不判断拥塞
+        if last is None or now - last[0] <= 0 or received == 0:
+            return self._ratio
+        self._ratio += 0.3 * ((received - last[1]) / (now - last[0]) - self._ratio)
+        return self._ratio
+
+    def _trim(self, buffered):
+        self.stream._send_command("flush")
+        dropped = 0.0
+        for name, _, trim_fn in self._buffers:
+            if trim_fn is not None:
+                dropped += trim_fn(self.target_seconds) or 0.0
+        self.stats["trims"] += 1
+        self.stats["trimmed_seconds"] += dropped
+        logger.warning(f"缓冲积压 {buffered:.2f}s 超过上限，已裁剪 {dropped:.2f}s")
+
+    def _request(self, level):
+        """发送格式切换请求，返回是否发送成功；升降级次数在设备确认时才计入stats"""
+        fmt = self.ladder[level]
+        if not self.stream._send_command("set_format", fmt):
+            return False
+        logger.info(f"请求设备切换格式: {fmt}")
+        self._pending = (level, time.monotonic())
+        self._last_change = time.monotonic()
+        return True
+
+    def _reset(self):
+        """设备重连后按默认格式发送：回到阶梯顶端，放弃未确认的请求，探测退避清零"""
+        now = time.monotonic()
+        self.level = 0
+        self._pending = None
+        self.probe_interval = self.base_probe_interval
+        self._last_change = now
+        self._stable_since = now
+        self._last_received = None
+        self._ratio = 1.0
+        if METRICS.enabled:
+            self._m_format.set(0)
+
+    def _on_device_event(self, event):
+        if event.get("event") == "connected":
+            self._reset()
+            return
+        if event.get("event") != "format":
+            return
+        logger.info(f"设备已切换格式: {event}")
+        for level, fmt in enumerate(self.ladder):
+            if int(event.get("sample_rate", 0)) == fmt["sample_rate"] and event.get("codec") == fmt["codec"]:
+                if level > self.level:
+                    self.stats["downgrades"] += 1
+                elif level < self.level:
+                    self.stats["upgrades"] += 1
+                self.level = level
+                self._last_change = time.monotonic()
+                if METRICS.enabled:
+                    self._m_format.set(level)
+                break
+        self._pending = None
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import wave
+import bisect
+import logging
+import threading
+from collections import deque
+from lshMetrics import METRICS
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WAV_HEADER_BYTES = 44
+INDEX_NAME = "index.jsonl"
+# flac 支持的样本宽度(字节) -> soundfile 子类型
+FLAC_SUBTYPES = {2: "PCM_16", 3: "PCM_24"}
+
+
+class SegmentedRecorder:
+    """
+    后台分段录音：接收线程只把数据放进有界队列（不做磁盘IO），由后台线程攒成大块写入
+    - 按时长切分成多个WAV/FLAC文件
+    - 队列超过上限（磁盘跟不上）时丢弃新数据并计数，接收线程永远不会被阻塞
+    - 写一个index.jsonl，记录 墙钟时间 → (文件, 帧偏移, 字节偏移)，用于快速定位
+    """
+
+    def __init__(self, output_dir, device_id="esp32", sample_rate=16000, channels=1, sample_width=2,
+                 segment_seconds=600, fmt="wav", max_queue_bytes=32 * 1024 * 1024,
+                 write_buffer_bytes=1024 * 1024, flush_interval=1.0, index_interval=1.0):
+        """
+        output_dir: 录音根目录，每个设备一个子目录
+        device_id: 设备标识（用作子目录名和文件名前缀）
+        segment_seconds: 每个文件的时长(秒)
+        fmt: "wav" 或 "flac"（flac需要soundfile，只支持16/24位样本）
+        max_queue_bytes: 待写队列上限，超出后丢弃
+        write_buffer_bytes: 攒够多少字节写一次磁盘
+        flush_interval: 数据不足时最长多久也写一次(秒)
+        index_interval: 每隔多少秒音频写一条索引
+        """
+        if fmt not in ("wav", "flac"):
+            raise ValueError("fmt 必须是 'wav' 或 'flac'")
+        if fmt == "flac" and sample_width not in FLAC_SUBTYPES:
+            raise ValueError(f"flac 只支持 sample_width {sorted(FLAC_SUBTYPES)}，当前为 {sample_width}")
+        self.device_id = device_id
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        self.segment_frames = int(segment_seconds * sample_rate)
+        self.fmt = fmt
+        self.max_queue_bytes = max_queue_bytes
+        self.write_buffer_bytes = write_buffer_bytes
+        self.flush_interval = flush_interval
+        self.index_frames = max(1, int(index_interval * sample_rate))
+        self.directory = os.path.join(output_dir, device_id)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._queue = deque()
+        self._queue_bytes = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+        # 写入线程内部状态
+        self._segment = None
+        self._segment_name = None
+        self._segment_frames = 0
+        self._next_index_frame = 0
+        self._pending = b""          # 不足一帧的尾巴字节
+        self._index_file = None
+
+        # 统计
+        self.written_bytes = 0
+        self.dropped_bytes = 0
+        self.dropped_chunks = 0
+        self.segments = 0
+        labels = {"device": device_id}
+        self._m_written = METRICS.counter("recorder_written_bytes_total", "录音写入字节数", labels)
+        self._m_dropped = METRICS.counter("recorder_dropped_bytes_total", "磁盘跟不上时丢弃的字节数", labels)
+        self._m_queue = METRICS.gauge("recorder_queue_bytes", "录音待写队列字节数", labels)
+
+    def attach(self, stream):
+        """挂到ESP32AudioStream上，作为额外的音频接收端"""
+        stream.add_audio_sink(self.write)
+        self.start()
+        return self
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._index_file = open(os.path.join(self.directory, INDEX_NAME), "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._writer_loop, name=f"recorder-{self.device_id}", daemon=True)
+        self._thread.start()
+        logger.info(f"录音已启动: {self.directory}")
+
+    def stop(self):
+        """停止并把队列中剩余数据写完"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        logger.info(f"录音已停止: {self.stats()}")
+
+    def write(self, data: bytes):
+        """接收线程调用：只入队，不阻塞；队列满时丢弃并计数"""
+        arrival = time.time()
+        n = len(data)
+        with self._lock:
+            if self._queue_bytes + n > self.max_queue_bytes:
+                self.dropped_bytes += n
+                self.dropped_chunks += 1
+                if METRICS.enabled:
+                    self._m_dropped.inc(n)
+                return False
+            self._queue.append((arrival, bytes(data)))
+            self._queue_bytes += n
+            queued = self._queue_bytes
+        if METRICS.enabled:
+            self._m_queue.set(queued)
+        if queued >= self.write_buffer_bytes:
+            self._wakeup.set()
+        return True
+
+    def stats(self):
+        with self._lock:
+            queued = self._queue_bytes
+        return {
+            "written_bytes": self.written_bytes,
+            "dropped_bytes": self.dropped_bytes,
+            "dropped_chunks": self.dropped_chunks,
+            "queue_bytes": queued,
+            "segments": self.segments,
+        }
+
+    # ---------------- 后台写入线程 ----------------
+    def _writer_loop(self):
+        try:
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._drain()
+                if not self._running:
+                    self._drain()
+                    break
+        except Exception as e:
+            logger.error(f"录音写入失败: {e}", exc_info=True)
+        finally:
+            self._close_segment()
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+
+    def _drain(self):
+        """取出当前队列全部数据，合并成一整块写入（每次最多一次磁盘写，跨分段时按分段拆开）"""
+        with self._lock:
+            chunks = list(self._queue)
+            self._queue.clear()
+            self._queue_bytes = 0
+        if METRICS.enabled:
+            self._m_queue.set(0)
+        if not chunks:
+            return
+        # 记录每个小块在合并数据中的起始字节和到达时间，索引的墙钟时间据此折算
+        offsets, arrivals = [], []
+        total = len(self._pending)
+        for arrival, data in chunks:
+            offsets.append(total)
+            arrivals.append(arrival)
+            total += len(data)
+        data = b"".join([self._pending] + [data for _, data in chunks])
+        self._write_block(data, offsets, arrivals)
+
+    def _arrival_at(self, offset, offsets, arrivals):
+        """合并数据中第offset字节的近似墙钟时间：所在小块的到达时间 + 块内偏移折算的时长"""
+        i = max(0, bisect.bisect_right(offsets, offset) - 1)
+        return arrivals[i] + (offset - offsets[i]) / self.frame_bytes / self.sample_rate
+
+    def _write_block(self, data, offsets, arrivals):
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        offset = 0
+        while offset < usable:
+            if self._segment is None or self._segment_frames >= self.segment_frames:
+                self._open_segment(self._arrival_at(offset, offsets, arrivals))
+            frames = min((usable - offset) // self.frame_bytes, self.segment_frames - self._segment_frames)
+            piece = data[offset:offset + frames * self.frame_bytes]
+            # 这一段写入覆盖的每个索引点都记下来（一次写入可能有几秒数据）
+            while self._next_index_frame < self._segment_frames + frames:
+                frame = self._next_index_frame
+                byte = offset + (frame - self._segment_frames) * self.frame_bytes
+                self._write_index(self._arrival_at(byte, offsets, arrivals), frame)
+            self._write_frames(piece)
+            self._segment_frames += frames
+            offset += len(piece)
+            self.written_bytes += len(piece)
+            if METRICS.enabled:
+                self._m_written.inc(len(piece))
+
+    def _write_index(self, t, frame):
+        record = {"t": round(t, 4), "file": self._segment_name, "frame": frame}
+        if self.fmt == "wav":
+            record["byte"] = WAV_HEADER_BYTES + frame * self.frame_bytes
+        self._index_file.write(json.dumps(record) + "\n")
+        self._index_file.flush()
+        while self._next_index_frame <= frame:
+            self._next_index_frame += self.index_frames
+
+    def _open_segment(self, arrival):
+        self._close_segment()
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(arrival))
+        # 带上分段序号，同一秒内切出多个分段也不会重名
+        self._segment_name = f"{self.device_id}_{stamp}_{self.segments:05d}.{self.fmt}"
+        path = os.path.join(self.directory, self._segment_name)
+        if self.fmt == "wav":
+            self._segment = wave.open(path, "wb")
+            self._segment.setnchannels(self.channels)
+            self._segment.setsampwidth(self.sample_width)
+            self._segment.setframerate(self.sample_rate)
+        else:
+            import soundfile as sf
+            self._segment = sf.SoundFile(path, "w", samplerate=self.sample_rate,
+                                         channels=self.channels, format="FLAC",
+                                         subtype=FLAC_SUBTYPES[self.sample_width])
+        self._segment_frames = 0
+        self._next_index_frame = 0
+        self.segments += 1
+
+    def _write_frames(self, piece):
+        if self.fmt == "wav":
+            # writeframes每次写完回写头部的长度字段（每次drain只写一次，开销可以忽略），
+            # 进程崩溃时已写入的数据在头部中也是完整的
+            self._segment.writeframes(piece)
+        else:
+            import numpy as np
+            if self.sample_width == 2:
+                samples = np.frombuffer(piece, dtype=np.int16)
+            else:
+                # 24位小端打包样本：低位补一个零字节展开成int32（值左移8位），soundfile写PCM_24时取高24位
+                packed = np.frombuffer(piece, dtype=np.uint8).reshape(-1, 3)
+                wide = np.zeros((len(packed), 4), dtype=np.uint8)
+                wide[:, 1:] = packed
+                samples = wide.view("<i4").ravel()
+            samples = samples.reshape(-1, self.channels)
+            self._segment.write(samples)
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+class RecordingIndex:
+    """读取录音索引，按墙钟时间定位到具体文件和偏移"""
+
+    def __init__(self, device_dir):
+        self.directory = device_dir
+        self.entries = []
+        with open(os.path.join(device_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self.entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        self.entries.sort(key=lambda e: e["t"])
+        self._times = [e["t"] for e in self.entries]
+
+    def locate(self, timestamp):
+        """返回不晚于timestamp的最近索引项 (文件路径, 帧偏移, 时间误差秒)，找不到返回None"""
+        i = bisect.bisect_right(self._times, timestamp) - 1
+        if i < 0:
+            return None
+        entry = self.entries[i]
+        return os.path.join(self.directory, entry["file"]), entry["frame"], timestamp - entry["t"]
+
+    def read(self, timestamp, duration):
+        """
+        读取从timestamp开始duration秒的PCM字节（仅WAV，不跨文件）
+        可读帧数按文件大小计算而不是头部的帧数：正在录制或异常中断的分段，头部长度可能落后于实际数据
+        """
+        located = self.locate(timestamp)
+        if located is None:
+            return b""
+        path, frame, delta = located
+        with wave.open(path, "rb") as wf:
+            rate = wf.getframerate()
+            frame_bytes = wf.getsampwidth() * wf.getnchannels()
+        available = max(0, os.path.getsize(path) - WAV_HEADER_BYTES) // frame_bytes
+        start = min(frame + int(delta * rate), available)
+        count = min(int(duration * rate), available - start)
+        with open(path, "rb") as f:
+            f.seek(WAV_HEADER_BYTES + start * frame_bytes)
+            return f.read(count * frame_bytes)
@@ -0,0 +1,309 @@
+"""
+共享内存音频槽池：接收进程只写一次，识别工作进程按句柄直接拿NumPy视图，不再pickle整段PCM
+
+    接收进程                                  识别工作进程
+    ESP32AudioStream → SharedAudioSink        worker_loop
+        写入槽位（共享内存）                       view(handle) → handler(stream_id, 视图)
+        jobs.put((stream_id, handle)) ──────→     release(handle)
+
+- 一整块SharedMemory按固定大小切成slots个槽（slab），分配时从上次位置往后找空闲槽（环形next-fit）
+- 每个槽有引用计数：分配时为1，retain()加一（例如同一段音频分给多个消费者），release()减一，归零即回收
+- 每次分配槽的代数(generation)加一，句柄里带着代数，回收后再用旧句柄会直接报错而不是读到别的流的数据
+- 引用计数用跨进程的Condition保护，只在分配/释放时加锁（每句话一次），读写音频数据本身不加锁
+
+Condition必须在创建工作进程时随参数传入（Process args / 进程池initializer），不能通过Queue传递
+"""
+import time
+import logging
+import threading
+from collections import namedtuple
+from multiprocessing import shared_memory
+import multiprocessing
+
+import numpy as np
+from lshMetrics import METRICS
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 每个槽的头部：引用计数(int32) + 代数(uint32) + 有效采样点数(int64)
+_HEADER_DTYPE = np.dtype([("refcount", np.int32), ("generation", np.uint32), ("length", np.int64)])
+_ALIGN = 64
+
+# 在进程间传递的句柄，pickle后只有几十字节
+SlotHandle = namedtuple("SlotHandle", ["slot", "generation", "length"])
+
+
+class PoolExhausted(Exception):
+    """所有槽都在使用中且等待超时"""
+
+
+class SharedAudioPool:
+    """基于multiprocessing.shared_memory的定长槽池"""
+
+    def __init__(self, slots=64, slot_seconds=30.0, sample_rate=16000, dtype=np.int16,
+                 ctx=None, _attach=None):
+        """
+        slots: 槽数量，决定同时在途的音频段上限
+        slot_seconds: 每个槽能容纳的最长音频(秒)
+        ctx: multiprocessing上下文（决定Condition的类型），默认使用当前默认上下文
+        """
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self.slot_samples = int(slot_seconds * sample_rate)
+        self.sample_rate = sample_rate
+        header_bytes = -(-slots * _HEADER_DTYPE.itemsize // _ALIGN) * _ALIGN
+        slot_bytes = -(-self.slot_samples * self.dtype.itemsize // _ALIGN) * _ALIGN
+        total = header_bytes + slots * slot_bytes
+        if _attach is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=total)
+            self.owner = True
+            self._cond = (ctx or multiprocessing).Condition()
+        else:
+            name, self._cond = _attach
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        header = np.ndarray((slots,), dtype=_HEADER_DTYPE, buffer=self.shm.buf)
+        self._refcount = header["refcount"]
+        self._generation = header["generation"]
+        self._length = header["length"]
+        self._data = np.ndarray((slots, slot_bytes // self.dtype.itemsize), dtype=self.dtype,
+                                buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            header[:] = 0
+        self._next = 0
+        self.peak_in_use = 0
+        self.alloc_waits = 0
+        self._m_in_use = METRICS.gauge("shm_pool_slots_in_use", "共享内存槽池已占用槽数")
+
+    # ---------------- 跨进程共享 ----------------
+    def spec(self):
+        """传给工作进程的描述信息（包含Condition，只能作为进程启动参数传递）"""
+        return {
+            "name": self.shm.name,
+            "cond": self._cond,
+            "slots": self.slots,
+            "slot_seconds": self.slot_samples / self.sample_rate,
+            "sample_rate": self.sample_rate,
+            "dtype": self.dtype.str,
+        }
+
+    @classmethod
+    def attach(cls, spec):
+        """工作进程中按spec打开同一块共享内存"""
+        return cls(slots=spec["slots"], slot_seconds=spec["slot_seconds"], sample_rate=spec["sample_rate"],
+                   dtype=np.dtype(spec["dtype"]), _attach=(spec["name"], spec["cond"]))
+
+    # ---------------- 分配与释放 ----------------
+    def alloc(self, timeout=None):
+        """
+        分配一个空闲槽，返回可写视图和句柄（此时length为0，写完后用commit()确定长度）
+        没有空闲槽时等待其他进程释放，超时抛PoolExhausted
+        """
+        refcount = self._refcount
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                for k in range(self.slots):
+                    slot = (self._next + k) % self.slots
+                    if refcount[slot] == 0:
+                        break
+                else:
+                    slot = None
+                if slot is not None:
+                    break
+                self.alloc_waits += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolExhausted(f"共享内存槽池已满（{self.slots}个槽）")
+                self._cond.wait(remaining)
+            refcount[slot] = 1
+            self._generation[slot] += 1
+            self._length[slot] = 0
+            generation = int(self._generation[slot])
+            in_use = int(np.count_nonzero(refcount))
+        self._next = (slot + 1) % self.slots
+        self.peak_in_use = max(self.peak_in_use, in_use)
+        if METRICS.enabled:
+            self._m_in_use.set(in_use)
+        return self._data[slot, :self.slot_samples], SlotHandle(slot, generation, 0)
+
+    def commit(self, handle, length):
+        """写完数据后确定有效长度，返回带长度的新句柄"""
+        self._check(handle)
+        if length > self.slot_samples:
+            raise ValueError(f"长度{length}超过槽容量{self.slot_samples}")
+        self._length[handle.slot] = length
+        return handle._replace(length=length)
+
+    def write(self, samples, timeout=None):
+        """分配一个槽并写入samples（唯一一次拷贝），返回句柄"""
+        samples = np.asarray(samples, dtype=self.dtype)
+        if len(samples) > self.slot_samples:
+            raise ValueError(f"音频长度{len(samples)}超过槽容量{self.slot_samples}")
+        buf, handle = self.alloc(timeout)
+        buf[:len(samples)] = samples
+        return self.commit(handle, len(samples))
+
+    def view(self, handle):
+        """按句柄取只读视图（不拷贝）；视图在release之前有效"""
+        self._check(handle)
+        view = self._data[handle.slot, :handle.length]
+        view.flags.writeable = False
+        return view
+
+    def retain(self, handle, n=1):
+        """增加引用计数（把同一段音频交给更多消费者之前调用）"""
+        with self._cond:
+            self._check(handle)
+            self._refcount[handle.slot] += n
+
+    def release(self, handle):
+        """减少引用计数，归零时槽位回收并唤醒等待分配的进程"""
+        with self._cond:
+            self._check(handle)
+            if self._refcount[handle.slot] <= 0:
+                raise RuntimeError(f"槽{handle.slot}重复释放")
+            self._refcount[handle.slot] -= 1
+            if self._refcount[handle.slot] == 0:
+                self._cond.notify_all()
+
+    def _check(self, handle):
+        if int(self._generation[handle.slot]) != handle.generation:
+            raise RuntimeError(f"槽{handle.slot}已被回收重用，句柄失效")
+
+    def in_use(self):
+        return int(np.count_nonzero(self._refcount))
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "in_use": self.in_use(),
+            "peak_in_use": self.peak_in_use,
+            "alloc_waits": self.alloc_waits,
+        }
+
+    def close(self):
+        """关闭本进程的映射；创建者同时删除共享内存"""
+        self._refcount = self._generation = self._length = self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedAudioSink:
+    """
+    接收端：挂到ESP32AudioStream上，把收到的PCM直接写进共享内存槽，
+    攒够chunk_seconds（或flush()）后把句柄投递到jobs队列
+    """
+
+    def __init__(self, pool, jobs, stream_id, chunk_seconds=5.0, process=None, timeout=1.0):
+        """
+        pool: SharedAudioPool
+        jobs: multiprocessing队列，投递 (stream_id, SlotHandle)
+        chunk_seconds: 每段音频时长，不能超过槽容量
+        process: 可选的逐块处理函数（如AudioDispose.process_audio），输入为槽类型（通常int16）的数组，
+                 输出可以是任意数值类型（AudioDispose返回浮点），写入槽前按槽类型的取值范围截断再转换
+        timeout: 槽池满时最多等待多久，超时丢弃本块并计数（不阻塞接收线程太久）
+        """
+        self.pool = pool
+        self.jobs = jobs
+        self.stream_id = stream_id
+        self.chunk_samples = min(int(chunk_seconds * pool.sample_rate), pool.slot_samples)
+        self.process = process
+        self.timeout = timeout
+        self._buf = None
+        self._handle = None
+        self._filled = 0
+        self._pending = b""
+        self._lock = threading.Lock()
+        self.dropped_samples = 0
+        self.chunks = 0
+
+    def attach(self, stream):
+        stream.add_audio_sink(self.write_bytes)
+        return self
+
+    def write_bytes(self, data: bytes):
+        """与audio_callback签名一致"""
+        itemsize = self.pool.dtype.itemsize
+        if self._pending:
+            data = self._pending + data
+        usable = len(data) - len(data) % itemsize
+        self._pending = data[usable:]
+        if usable:
+            self.write(np.frombuffer(data, dtype=self.pool.dtype, count=usable // itemsize))
+
+    def write(self, samples):
+        if self.process is not None:
+            samples = self._to_pool_dtype(self.process(samples))
+        with self._lock:
+            offset = 0
+            while offset < len(samples):
+                if self._buf is None:
+                    try:
+                        self._buf, self._handle = self.pool.alloc(self.timeout)
+                    except PoolExhausted:
+                        self.dropped_samples += len(samples) - offset
+                        logger.warning(f"流 {self.stream_id}: 共享内存槽池已满，丢弃 {len(samples) - offset} 个采样点")
+                        return
+                    self._filled = 0
+                n = min(len(samples) - offset, self.chunk_samples - self._filled)
+                self._buf[self._filled:self._filled + n] = samples[offset:offset + n]
+                self._filled += n
+                offset += n
+                if self._filled >= self.chunk_samples:
+                    self._submit()
+
+    def _to_pool_dtype(self, samples):
+        """处理结果转成槽类型：整数槽先截断到取值范围，避免超出范围的值直接回绕成反相的爆音"""
+        samples = np.asarray(samples)
+        dtype = self.pool.dtype
+        if samples.dtype == dtype:
+            return samples
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            samples = np.clip(samples, info.min, info.max)
+        return samples.astype(dtype)
+
+    def flush(self):
+        """把未满的当前段也投递出去（例如检测到一句话结束时）"""
+        with self._lock:
+            if self._buf is not None and self._filled > 0:
+                self._submit()
+
+    def _submit(self):
+        handle = self.pool.commit(self._handle, self._filled)
+        self._buf, self._handle, self._filled = None, None, 0
+        self.chunks += 1
+        self.jobs.put((self.stream_id, handle))
+
+
+def worker_loop(spec, jobs, handler, results=None):
+    """
+    工作进程主循环：从jobs取 (stream_id, 句柄)，在共享内存视图上调用handler(stream_id, 视图)，
+    处理完释放槽位；handler返回值放入results队列。收到None时退出
+    handler拿到的视图在返回后即失效，需要保留的数据请自行拷贝（pcmToText内部重采样本身就会拷贝）
+    """
+    pool = SharedAudioPool.attach(spec)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            stream_id, handle = job
+            try:
+                result = handler(stream_id, pool.view(handle))
+            except Exception as e:
+                logger.error(f"流 {stream_id} 处理失败: {e}")
+                result = None
+            finally:
+                pool.release(handle)
+            if results is not None:
+                results.put((stream_id, result))
+    finally:
+        pool.close()
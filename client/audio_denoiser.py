@@ -1,17 +1,24 @@
+import os
+import sys
+import time
+import resource
+import argparse
 import numpy as np
 import soundfile as sf
 import noisereduce as nr
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+PCM_DTYPES = {
+    8: np.uint8,
+    16: np.int16,
+    32: np.int32,
+    64: np.int64
+}
 
 def read_pcm_file(file_path, sample_rate=16000, bit_depth=16, channels=1):
     """读取PCM格式音频文件"""
     # 根据位深确定数据类型
-    dtype = {
-        8: np.uint8,
-        16: np.int16,
-        32: np.int32,
-        64: np.int64
-    }.get(bit_depth, np.int16)
+    dtype = PCM_DTYPES.get(bit_depth, np.int16)
     
     # 读取PCM原始数据
     with open(file_path, 'rb') as f:
@@ -29,12 +36,7 @@ def read_pcm_file(file_path, sample_rate=16000, bit_depth=16, channels=1):
 def write_pcm_file(audio_data, file_path, bit_depth=16):
     """将音频数据写入PCM文件"""
     # 将归一化数据转换回原始位深
-    dtype = {
-        8: np.uint8,
-        16: np.int16,
-        32: np.int32,
-        64: np.int64
-    }.get(bit_depth, np.int16)
+    dtype = PCM_DTYPES.get(bit_depth, np.int16)
     
     # 反归一化
     audio_data = audio_data * (2** (bit_depth - 1) - 1)
@@ -46,9 +48,9 @@ def write_pcm_file(audio_data, file_path, bit_depth=16):
 
 def denoise_audio(input_file, output_file, is_pcm=False, 
                  sample_rate=16000, bit_depth=16, channels=1,
-                 noise_sample_duration=1.0):
+                 noise_sample_duration=1.0, show_plot=True):
     """
-    对音频文件进行降噪处理，支持PCM和常见音频格式
+    对音频文件进行降噪处理，支持PCM和常见音频格式（整段读入内存，适合短文件）
     
     参数:
     input_file (str): 输入音频文件路径
@@ -58,6 +60,7 @@ def denoise_audio(input_file, output_file, is_pcm=False,
     bit_depth (int): 位深，PCM文件需要指定
     channels (int): 声道数，PCM文件需要指定
     noise_sample_duration (float): 用于提取噪声样本的时长(秒)
+    show_plot (bool): 是否弹出波形对比图
     """
     # 读取音频文件
     if is_pcm:
@@ -91,10 +94,147 @@ def denoise_audio(input_file, output_file, is_pcm=False,
     print(f"降噪完成，已保存至 {output_file}")
     
     # 绘制原始音频和降噪后音频的波形图对比
-    plot_waveforms(audio_data, denoised_audio, sample_rate)
+    if show_plot:
+        plot_waveforms(audio_data, denoised_audio, sample_rate)
+
+
+def _peak_memory_mb():
+    """进程峰值常驻内存(MB)，Linux下ru_maxrss单位为KB，macOS为字节"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _open_block_reader(input_file, is_pcm, sample_rate, bit_depth, channels):
+    """
+    打开分块读取器，返回 (总采样组数, 采样率, read(start, count), close)
+    PCM文件使用内存映射，其他格式用soundfile按需seek读取，都不会整段读入内存
+    read返回归一化到[-1, 1]的float32单声道数据
+    """
+    if is_pcm:
+        data = np.memmap(input_file, dtype=PCM_DTYPES.get(bit_depth, np.int16), mode="r")
+        data = data[:len(data) - len(data) % channels].reshape(-1, channels)
+        scale = np.float32(1.0 / (2 ** (bit_depth - 1)))
+
+        def read(start, count):
+            block = data[start:start + count].astype(np.float32) * scale
+            return block.mean(axis=1) if channels > 1 else block[:, 0]
+
+        return data.shape[0], sample_rate, read, lambda: None
+
+    f = sf.SoundFile(input_file)
+
+    def read(start, count):
+        f.seek(start)
+        block = f.read(count, dtype="float32", always_2d=True)
+        return block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+    return f.frames, f.samplerate, read, f.close
+
+
+def denoise_audio_stream(input_file, output_file, is_pcm=False,
+                         sample_rate=16000, bit_depth=16, channels=1,
+                         noise_sample_duration=1.0, block_duration=10.0,
+                         overlap_duration=0.25):
+    """
+    无界面的流式降噪：内存映射读取 → 重叠分块降噪 → 交叉淡化拼接 → 增量写出
+    噪声样本只在开头提取一次，所有分块共用（持久噪声画像），峰值内存只与块大小有关
+
+    参数（与denoise_audio相同的不再赘述）:
+    block_duration (float): 每块时长(秒)
+    overlap_duration (float): 相邻块重叠时长(秒)，重叠部分做线性交叉淡化消除拼接处跳变
+
+    返回: 统计信息字典（音频时长、耗时、×实时倍数、峰值内存）
+    """
+    start_time = time.perf_counter()
+    total, sample_rate, read, close = _open_block_reader(
+        input_file, is_pcm, sample_rate, bit_depth, channels
+    )
+    block = int(block_duration * sample_rate)
+    overlap = min(int(overlap_duration * sample_rate), block)
+    noise_sample = read(0, int(noise_sample_duration * sample_rate))
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+    fade_out = 1.0 - fade_in
+
+    if is_pcm:
+        dtype = PCM_DTYPES.get(bit_depth, np.int16)
+        scale = 2 ** (bit_depth - 1) - 1
+        out = open(output_file, "wb")
+        write = lambda samples: out.write((np.clip(samples, -1.0, 1.0) * scale).astype(dtype).tobytes())
+    else:
+        out = sf.SoundFile(output_file, "w", samplerate=sample_rate, channels=1)
+        write = out.write
+
+    try:
+        prev_tail = None
+        pos = 0
+        while pos < total:
+            # 每块多读overlap个采样点，与下一块的开头重叠
+            chunk = read(pos, block + overlap)
+            denoised = nr.reduce_noise(y=chunk, sr=sample_rate, y_noise=noise_sample).astype(np.float32)
+            if prev_tail is not None:
+                n = min(len(prev_tail), len(denoised))
+                denoised[:n] = denoised[:n] * fade_in[:n] + prev_tail[:n] * fade_out[:n]
+            if pos + block >= total:
+                write(denoised)
+                break
+            write(denoised[:block])
+            prev_tail = denoised[block:]
+            pos += block
+    finally:
+        out.close()
+        close()
+
+    elapsed = time.perf_counter() - start_time
+    duration = total / sample_rate
+    stats = {
+        "input": input_file,
+        "audio_seconds": duration,
+        "elapsed_seconds": elapsed,
+        "x_realtime": duration / elapsed if elapsed > 0 else 0.0,
+        "peak_memory_mb": _peak_memory_mb(),
+    }
+    print(f"降噪完成，已保存至 {output_file}（{stats['x_realtime']:.1f}×实时，峰值内存 {stats['peak_memory_mb']:.1f}MB）")
+    return stats
+
+
+def denoise_directory(input_dir, output_dir, workers=2, is_pcm=False, **kwargs):
+    """
+    目录批量流式降噪，使用进程池并行处理
+    kwargs 透传给 denoise_audio_stream
+    返回: 汇总统计（总音频时长、墙钟耗时、整体×实时倍数、各进程最大峰值内存）
+    """
+    extensions = (".pcm",) if is_pcm else (".wav", ".flac", ".ogg")
+    os.makedirs(output_dir, exist_ok=True)
+    files = sorted(name for name in os.listdir(input_dir) if name.lower().endswith(extensions))
+    start_time = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(denoise_audio_stream, os.path.join(input_dir, name),
+                            os.path.join(output_dir, name), is_pcm, **kwargs)
+            for name in files
+        ]
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"降噪失败: {e}")
+    elapsed = time.perf_counter() - start_time
+    audio_seconds = sum(r["audio_seconds"] for r in results)
+    summary = {
+        "files": len(results),
+        "audio_seconds": audio_seconds,
+        "elapsed_seconds": elapsed,
+        "x_realtime": audio_seconds / elapsed if elapsed > 0 else 0.0,
+        "peak_memory_mb": max((r["peak_memory_mb"] for r in results), default=0.0),
+    }
+    print(f"目录降噪完成: {summary}")
+    return summary
+
 
 def plot_waveforms(original, denoised, sample_rate):
     """绘制原始音频和降噪后音频的波形图"""
+    import matplotlib.pyplot as plt
     time = np.linspace(0, len(original)/sample_rate, len(original))
     
     plt.figure(figsize=(12, 8))
@@ -115,21 +255,27 @@ def plot_waveforms(original, denoised, sample_rate):
     plt.show()
 
 if __name__ == "__main__":
-    # 处理PCM文件示例
-    denoise_audio(
-        input_file="input.pcm",
-        output_file="output_denoised.pcm",
-        is_pcm=True,
-        sample_rate=16000,  # 根据实际PCM文件的采样率设置
-        bit_depth=16,       # 根据实际PCM文件的位深设置
-        channels=1,         # 根据实际PCM文件的声道数设置
-        noise_sample_duration=0.2
-    )
-    
-    # 处理普通音频文件示例（如WAV）
-    # denoise_audio(
-    #     input_file="input.wav",
-    #     output_file="output_denoised.wav",
-    #     is_pcm=False
-    # )
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="音频降噪")
+    parser.add_argument("input", nargs="?", default="input.pcm", help="输入文件或目录")
+    parser.add_argument("output", nargs="?", default="output_denoised.pcm", help="输出文件或目录")
+    parser.add_argument("--stream", action="store_true", help="无界面流式分块模式（适合长文件/批处理）")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="目录模式的进程数")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="PCM文件的采样率")
+    parser.add_argument("--bit-depth", type=int, default=16, help="PCM文件的位深")
+    parser.add_argument("--channels", type=int, default=1, help="PCM文件的声道数")
+    parser.add_argument("--noise-duration", type=float, default=0.2, help="噪声样本时长(秒)")
+    parser.add_argument("--block", type=float, default=10.0, help="流式模式每块时长(秒)")
+    args = parser.parse_args()
+
+    options = dict(sample_rate=args.sample_rate, bit_depth=args.bit_depth, channels=args.channels,
+                   noise_sample_duration=args.noise_duration)
+    if os.path.isdir(args.input):
+        is_pcm = any(name.lower().endswith(".pcm") for name in os.listdir(args.input))
+        denoise_directory(args.input, args.output, workers=args.workers, is_pcm=is_pcm,
+                          block_duration=args.block, **options)
+    elif args.stream:
+        denoise_audio_stream(args.input, args.output, is_pcm=args.input.lower().endswith(".pcm"),
+                             block_duration=args.block, **options)
+    else:
+        # 原有整段处理方式，结束后弹出波形对比图
+        denoise_audio(args.input, args.output, is_pcm=args.input.lower().endswith(".pcm"), **options)
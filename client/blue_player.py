@@ -1,56 +1,376 @@
 import asyncio
+import argparse
+import logging
+import threading
+import time
 import numpy as np
 import sounddevice as sd
 from bleak import BleakClient, BleakScanner
 
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
 # ESP32 的 BLE 服务和特征值 UUID（需与设备端一致）
 AUDIO_SERVICE_UUID = "00001234-0000-1000-8000-00805f9b34fb"
 AUDIO_CHAR_UUID = "00005678-0000-1000-8000-00805f9b34fb"
 
 # 音频配置（需与 ESP32 采样率一致）
 SAMPLE_RATE = 16000
-audio_buffer = []
-
-# BLE 数据接收回调
-def handle_audio_data(sender, data):
-    # 将接收到的字节数据转换为 16bit 整数数组
-    audio_chunk = np.frombuffer(data, dtype=np.int16)
-    audio_buffer.extend(audio_chunk)
-
-# 播放音频的协程
-async def play_audio():
-    sd.default.samplerate = SAMPLE_RATE
-    sd.default.channels = 1
-    while True:
-        if len(audio_buffer) >= 1024:  # 积累到一定数据量再播放，避免卡顿
-            chunk = np.array(audio_buffer[:1024], dtype=np.int16)
-            sd.play(chunk)
-            del audio_buffer[:1024]
-        await asyncio.sleep(0.01)
-
-# 主函数：扫描并连接 ESP32
-async def main():
-    print("扫描 ESP32-Audio 设备...")
-    devices = await BleakScanner.discover()
-    esp32_device = None
-    for d in devices:
-        if d.name == "ESP32-Audio":
-            esp32_device = d
-            break
-    if not esp32_device:
-        print("未找到 ESP32-Audio 设备")
-        return
-
-    print(f"连接到 {esp32_device.address}...")
-    async with BleakClient(esp32_device.address) as client:
-        print("连接成功，开始接收音频...")
-        # 启用特征值通知
-        await client.start_notify(AUDIO_CHAR_UUID, handle_audio_data)
-        # 启动音频播放协程
-        await play_audio()
+DEVICE_NAME = "ESP32-Audio"
+BLOCK_SIZE = 512              # 输出流每次回调的帧数
+RING_DURATION = 2.0           # 每个设备环形缓冲区时长(秒)
+PREBUFFER_DURATION = 0.1      # 开始播放/欠载后恢复前需要积累的时长(秒)
+GAP_THRESHOLD = 0.1           # 两次通知间隔超过该值(秒)记为一次断流
+
+
+class AudioRingBuffer:
+    """
+    预分配的int16环形缓冲区，写入方(BLE通知)和读取方(音频回调)在不同线程
+    满了之后覆盖最旧数据，保证延迟有上限
+    """
+
+    def __init__(self, capacity):
+        self._buf = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self._read_pos = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self._size
+
+    def write(self, samples):
+        """写入采样点，返回因缓冲区满而丢弃的旧采样点数"""
+        n = len(samples)
+        with self._lock:
+            if n >= self.capacity:
+                # 单次写入超过容量，只保留最新的部分
+                dropped = self._size + n - self.capacity
+                self._buf[:] = samples[-self.capacity:]
+                self._read_pos = 0
+                self._size = self.capacity
+                return dropped
+            dropped = max(0, self._size + n - self.capacity)
+            if dropped:
+                self._read_pos = (self._read_pos + dropped) % self.capacity
+                self._size -= dropped
+            write_pos = (self._read_pos + self._size) % self.capacity
+            first = min(n, self.capacity - write_pos)
+            self._buf[write_pos:write_pos + first] = samples[:first]
+            self._buf[:n - first] = samples[first:]
+            self._size += n
+            return dropped
+
+    def read_into(self, out):
+        """读出最多len(out)个采样点到out，返回实际读出数量"""
+        with self._lock:
+            n = min(len(out), self._size)
+            first = min(n, self.capacity - self._read_pos)
+            out[:first] = self._buf[self._read_pos:self._read_pos + first]
+            out[first:n] = self._buf[:n - first]
+            self._read_pos = (self._read_pos + n) % self.capacity
+            self._size -= n
+            return n
+
+    def clear(self):
+        with self._lock:
+            self._read_pos = 0
+            self._size = 0
+
+
+class StreamStats:
+    """单个设备的接收/播放统计"""
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.notifications = 0
+        self.bytes_received = 0
+        self.samples_played = 0
+        self.underruns = 0            # 回调时数据不足的次数
+        self.underrun_samples = 0     # 补静音的采样点数
+        self.overflow_samples = 0     # 缓冲区满被丢弃的采样点数
+        self.gaps = 0                 # 通知间隔超过阈值的次数
+        self.max_gap = 0.0
+        self.reconnects = 0
+        self._last_notify = None
+
+    def on_notification(self, nbytes, gap_threshold):
+        now = time.monotonic()
+        if self._last_notify is not None:
+            gap = now - self._last_notify
+            if gap > gap_threshold:
+                self.gaps += 1
+            self.max_gap = max(self.max_gap, gap)
+        self._last_notify = now
+        self.notifications += 1
+        self.bytes_received += nbytes
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        return {
+            "notifications": self.notifications,
+            "throughput_kbps": self.bytes_received * 8 / elapsed / 1000,
+            "samples_played": self.samples_played,
+            "underruns": self.underruns,
+            "underrun_samples": self.underrun_samples,
+            "overflow_samples": self.overflow_samples,
+            "gaps": self.gaps,
+            "max_gap_ms": self.max_gap * 1000,
+            "reconnects": self.reconnects,
+        }
+
+
+class BleAudioDevice:
+    """
+    单个BLE音频设备：负责连接/重连，把通知数据重组为int16写入环形缓冲区
+    client_factory 默认是 BleakClient，测试时可换成 FakeNotificationSource
+    """
+
+    def __init__(self, address, name=None, sample_rate=SAMPLE_RATE, char_uuid=AUDIO_CHAR_UUID,
+                 client_factory=BleakClient, gap_threshold=GAP_THRESHOLD, max_backoff=30):
+        self.address = address
+        self.name = name or address
+        self.char_uuid = char_uuid
+        self.client_factory = client_factory
+        self.gap_threshold = gap_threshold
+        self.max_backoff = max_backoff
+        self.ring = AudioRingBuffer(int(sample_rate * RING_DURATION))
+        self.prebuffer = int(sample_rate * PREBUFFER_DURATION)
+        self.stats = StreamStats()
+        self.playing = False          # 是否已积累足够数据开始播放
+        self._pending = b""           # 通知被拆到奇数字节时留下的半个采样点
+
+    def handle_notification(self, sender, data):
+        """BLE通知回调：拼接上次剩余字节，按完整采样点写入缓冲区"""
+        self.stats.on_notification(len(data), self.gap_threshold)
+        if self._pending:
+            data = self._pending + bytes(data)
+        usable = len(data) - len(data) % 2
+        self._pending = bytes(data[usable:])
+        if usable:
+            self.stats.overflow_samples += self.ring.write(np.frombuffer(data, dtype=np.int16, count=usable // 2))
+
+    async def run(self, stop_event):
+        """保持连接，断开后指数退避重连，直到stop_event被设置"""
+        attempts = 0
+        while not stop_event.is_set():
+            client = self.client_factory(self.address)
+            try:
+                await client.connect()
+                logger.info(f"[{self.name}] 连接成功，开始接收音频")
+                attempts = 0
+                self._pending = b""
+                await client.start_notify(self.char_uuid, self.handle_notification)
+                while client.is_connected and not stop_event.is_set():
+                    await asyncio.sleep(0.2)
+                if client.is_connected:
+                    await client.stop_notify(self.char_uuid)
+            except Exception as e:
+                logger.error(f"[{self.name}] 连接异常: {e}")
+            finally:
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+            if stop_event.is_set():
+                break
+            attempts += 1
+            self.stats.reconnects += 1
+            delay = min(2 ** attempts, self.max_backoff)
+            logger.info(f"[{self.name}] 连接断开，{delay}秒后重连")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+class BleAudioPlayer:
+    """
+    多设备BLE音频播放：一个持续打开的OutputStream，回调里从各设备缓冲区取数并混音
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, blocksize=BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.devices = []
+        self.stream = None
+        # 回调中使用的预分配缓冲，避免实时线程里分配内存
+        self._scratch = np.zeros(blocksize * 4, dtype=np.int16)
+        self._mix = np.zeros(blocksize * 4, dtype=np.int32)
+
+    def add_device(self, device):
+        self.devices.append(device)
+
+    def _ensure_scratch(self, frames):
+        if frames > len(self._scratch):
+            self._scratch = np.zeros(frames, dtype=np.int16)
+            self._mix = np.zeros(frames, dtype=np.int32)
+
+    def audio_playback_callback(self, outdata, frames, pa_time, status):
+        """sounddevice输出回调：各设备取数混音，数据不足补静音并记为欠载"""
+        self._ensure_scratch(frames)
+        mix = self._mix[:frames]
+        mix.fill(0)
+        scratch = self._scratch[:frames]
+        for device in self.devices:
+            if not device.playing:
+                if device.ring.available < device.prebuffer:
+                    continue
+                device.playing = True
+            n = device.ring.read_into(scratch)
+            mix[:n] += scratch[:n]
+            device.stats.samples_played += n
+            if n < frames:
+                # 欠载：本次剩余部分为静音，重新进入预缓冲
+                device.stats.underruns += 1
+                device.stats.underrun_samples += frames - n
+                device.playing = False
+        np.clip(mix, -32768, 32767, out=mix)
+        outdata[:, 0] = mix
+
+    def start_output(self, device_id=None):
+        """打开并保持一个输出流"""
+        self.stream = sd.OutputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype=np.int16,
+            blocksize=self.blocksize,
+            callback=self.audio_playback_callback,
+            device=device_id
+        )
+        self.stream.start()
+        logger.info("音频播放已启动")
+
+    def stop_output(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def stats(self):
+        return {device.name: device.stats.snapshot() for device in self.devices}
+
+    async def run(self, stop_event, stats_interval=5.0):
+        """运行所有设备的接收协程，并定期打印统计"""
+        tasks = [asyncio.create_task(device.run(stop_event)) for device in self.devices]
+        try:
+            while not stop_event.is_set():
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=stats_interval)
+                except asyncio.TimeoutError:
+                    for name, snapshot in self.stats().items():
+                        logger.info(f"[{name}] {snapshot}")
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class FakeNotificationSource:
+    """
+    模拟BleakClient接口的假设备：按实时节奏发送正弦波PCM通知，不需要蓝牙硬件
+    mtu_payload: 每次通知的字节数（故意可设为奇数，验证半采样点重组）
+    jitter: 每次发送间隔的随机抖动(秒)
+    stall_every/stall_duration: 每隔多少次通知停顿一次，模拟断流
+    disconnect_after: 发送多少次通知后模拟断开
+    """
+
+    def __init__(self, address, sample_rate=SAMPLE_RATE, mtu_payload=244, frequency=440.0,
+                 jitter=0.0, stall_every=0, stall_duration=0.2, disconnect_after=None, seed=0):
+        self.address = address
+        self.sample_rate = sample_rate
+        self.mtu_payload = mtu_payload
+        self.frequency = frequency
+        self.jitter = jitter
+        self.stall_every = stall_every
+        self.stall_duration = stall_duration
+        self.disconnect_after = disconnect_after
+        self.is_connected = False
+        self._rng = np.random.default_rng(seed)
+        self._task = None
+
+    async def connect(self):
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def start_notify(self, char_uuid, callback):
+        self._task = asyncio.create_task(self._emit(callback))
+
+    async def stop_notify(self, char_uuid):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _emit(self, callback):
+        # 预先生成1秒的正弦波字节流，循环发送
+        t = np.arange(self.sample_rate) / self.sample_rate
+        pcm = (np.sin(2 * np.pi * self.frequency * t) * 8000).astype(np.int16).tobytes()
+        interval = self.mtu_payload / 2 / self.sample_rate
+        pos = 0
+        count = 0
+        next_time = time.monotonic()
+        while self.is_connected:
+            chunk = pcm[pos:pos + self.mtu_payload]
+            if len(chunk) < self.mtu_payload:
+                chunk += pcm[:self.mtu_payload - len(chunk)]
+            pos = (pos + self.mtu_payload) % len(pcm)
+            callback(AUDIO_CHAR_UUID, bytearray(chunk))
+            count += 1
+            if self.disconnect_after and count >= self.disconnect_after:
+                self.is_connected = False
+                break
+            next_time += interval
+            if self.stall_every and count % self.stall_every == 0:
+                next_time += self.stall_duration
+            delay = next_time - time.monotonic()
+            if self.jitter:
+                delay += self._rng.uniform(0, self.jitter)
+            await asyncio.sleep(max(0.0, delay))
+
+
+# 主函数：扫描并连接 ESP32（或使用假设备）
+async def main(names, fake=0, output_device=None):
+    player = BleAudioPlayer()
+    if fake:
+        for i in range(fake):
+            player.add_device(BleAudioDevice(
+                f"fake-{i}", client_factory=lambda address, i=i: FakeNotificationSource(
+                    address, frequency=440.0 * (i + 1), jitter=0.005, stall_every=200)
+            ))
+    else:
+        logger.info(f"扫描 {names} 设备...")
+        devices = await BleakScanner.discover()
+        for d in devices:
+            if d.name in names:
+                player.add_device(BleAudioDevice(d.address, name=f"{d.name}({d.address})"))
+        if not player.devices:
+            logger.error(f"未找到 {names} 设备")
+            return
+
+    stop_event = asyncio.Event()
+    player.start_output(output_device)
+    try:
+        await player.run(stop_event)
+    finally:
+        stop_event.set()
+        player.stop_output()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BLE音频接收播放")
+    parser.add_argument("--name", action="append", default=None, help="设备名称，可重复指定多个")
+    parser.add_argument("--fake", type=int, default=0, help="使用N个假设备代替真实蓝牙")
+    parser.add_argument("--output-device", type=int, default=None, help="sounddevice输出设备ID")
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.name or [DEVICE_NAME], fake=args.fake, output_device=args.output_device))
     except KeyboardInterrupt:
-        print("退出程序")
\ No newline at end of file
+        print("退出程序")
@@ -0,0 +1,304 @@
+"""
+本地假ESP32设备：最小的WebSocket服务端（只用标准库），按实时节奏发送正弦波PCM，并实现流控协议的设备侧
+
+- 采集线程每20ms产生一块音频放入设备端队列（有上限，满了丢最旧的，模拟设备内存有限）
+- 发送线程按当前格式编码、按chunk_bytes分帧，并按link_kbps限速，模拟WiFi链路拥塞
+- 接收线程处理主机发来的控制命令：set_format / flush / buffer_level（见audioFlowControl）
+
+链路带宽低于当前码率时设备端队列会越积越多，队列时长就是设备侧的延迟
+"""
+import base64
+import hashlib
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from audioFlowControl import CODEC_BYTES, ulaw_encode
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OP_TEXT, _OP_BINARY, _OP_CLOSE, _OP_PING, _OP_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+CAPTURE_INTERVAL = 0.02
+
+
+def _recv_exact(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        data += chunk
+    return data
+
+
+def _encode_frame(opcode, payload):
+    """服务端发出的帧不加掩码"""
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+
+def _read_frame(sock):
+    """读取一个客户端帧（客户端帧总是带掩码），返回 (opcode, payload)"""
+    b1, b2 = _recv_exact(sock, 2)
+    opcode = b1 & 0x0F
+    n = b2 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", _recv_exact(sock, 2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", _recv_exact(sock, 8))[0]
+    mask = _recv_exact(sock, 4) if b2 & 0x80 else None
+    payload = _recv_exact(sock, n)
+    if mask:
+        payload = (np.frombuffer(payload, dtype=np.uint8) ^ np.resize(np.frombuffer(mask, dtype=np.uint8), n)).tobytes()
+    return opcode, payload
+
+
+def _handshake(sock):
+    request = b""
+    while b"\r\n\r\n" not in request:
+        chunk = sock.recv(1024)
+        if not chunk:
+            raise ConnectionError("握手期间连接关闭")
+        request += chunk
+    key = None
+    for line in request.decode("latin-1").split("\r\n"):
+        if line.lower().startswith("sec-websocket-key:"):
+            key = line.split(":", 1)[1].strip()
+    if key is None:
+        raise ConnectionError("不是WebSocket握手请求")
+    accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+    sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+
+class FakeESP32Server:
+    """单客户端的假设备（与固件一样同一时间只服务一个连接）"""
+
+    def __init__(self, host="127.0.0.1", port=0, sample_rate=16000, chunk_bytes=1024, link_kbps=None,
+                 device_buffer_seconds=3.0, frequency=440.0):
+        """
+        port: 0表示随机端口，启动后见self.url
+        sample_rate/chunk_bytes: 初始发送格式（pcm16）
+        link_kbps: 链路带宽上限，None为不限速；运行中可用set_link_kbps修改
+        device_buffer_seconds: 设备端待发送队列上限
+        """
+        self.host = host
+        self.capture_rate = 16000         # 麦克风采集采样率，发送采样率更低时在设备端抽取
+        self.format = {"sample_rate": sample_rate, "codec": "pcm16", "chunk_bytes": chunk_bytes}
+        self._initial_format = dict(self.format)
+        self.link_kbps = link_kbps
+        self.device_buffer_samples = int(device_buffer_seconds * self.capture_rate)
+        self.frequency = frequency
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self.port = self._server.getsockname()[1]
+        self._queue = deque()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._client = None
+        self._running = False
+        self._phase = 0
+        self.sent_bytes = 0
+        self.dropped_samples = 0
+        self.flushed_samples = 0
+        self.commands = {}
+        self.last_feedback = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/"
+
+    def set_link_kbps(self, kbps):
+        self.link_kbps = kbps
+
+    def backlog_seconds(self):
+        """设备端积压（待发送）的音频时长"""
+        with self._lock:
+            return self._queued / self.capture_rate
+
+    def start(self):
+        self._running = True
+        self._server.listen(1)
+        threading.Thread(target=self._accept_loop, name="fake-esp32-accept", daemon=True).start()
+        threading.Thread(target=self._capture_loop, name="fake-esp32-capture", daemon=True).start()
+        logger.info(f"假设备已启动: {self.url}")
+        return self
+
+    def stop(self):
+        self._running = False
+        try:
+            self._server.close()
+        except OSError:
+            pass
+        if self._client is not None:
+            try:
+                self._client.close()
+            except OSError:
+                pass
+
+    # ---------------- 采集 ----------------
+    def _capture_loop(self):
+        n = int(self.capture_rate * CAPTURE_INTERVAL)
+        next_time = time.monotonic()
+        while self._running:
+            t = (self._phase + np.arange(n)) / self.capture_rate
+            self._phase += n
+            block = (8000 * np.sin(2 * np.pi * self.frequency * t)).astype(np.int16)
+            if self._client is not None:
+                with self._lock:
+                    self._queue.append(block)
+                    self._queued += n
+                    while self._queued > self.device_buffer_samples:
+                        dropped = self._queue.popleft()
+                        self._queued -= len(dropped)
+                        self.dropped_samples += len(dropped)
+            next_time += CAPTURE_INTERVAL
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    # ---------------- 连接 ----------------
+    def _accept_loop(self):
+        while self._running:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                break
+            try:
+                _handshake(client)
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"握手失败: {e}")
+                client.close()
+                continue
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # 与真实固件一样，每次新连接都从默认的pcm16格式开始
+            self.format = dict(self._initial_format)
+            self._client = client
+            sender = threading.Thread(target=self._send_loop, args=(client,), name="fake-esp32-send", daemon=True)
+            sender.start()
+            self._recv_loop(client)
+            self._client = None
+            with self._lock:
+                self._queue.clear()
+                self._queued = 0
+            sender.join()
+
+    def _send(self, client, opcode, payload):
+        with self._send_lock:
+            client.sendall(_encode_frame(opcode, payload))
+
+    def _send_loop(self, client):
+        try:
+            while self._running and self._client is client:
+                fmt = self.format
+                # 一帧chunk_bytes对应的采集采样点数（低采样率时设备端抽取）
+                need = fmt["chunk_bytes"] // CODEC_BYTES[fmt["codec"]] * (self.capture_rate // fmt["sample_rate"])
+                block = self._take(need)
+                if block is None:
+                    time.sleep(0.005)
+                    continue
+                # 在发送锁内按当前格式编码，切换格式的回复和之后的帧不会交错
+                with self._send_lock:
+                    frame = self._encode(block, self.format)
+                    client.sendall(_encode_frame(_OP_BINARY, frame))
+                self.sent_bytes += len(frame)
+                if self.link_kbps:
+                    # 按链路带宽限速：发完这一帧需要的时间
+                    time.sleep(len(frame) * 8 / (self.link_kbps * 1000))
+        except OSError:
+            pass
+
+    def _take(self, need):
+        """从设备队列取最多need个采样点，不足时有多少取多少"""
+        with self._lock:
+            if not self._queue:
+                return None
+            parts, taken = [], 0
+            while self._queue and taken < need:
+                block = self._queue.popleft()
+                if taken + len(block) > need:
+                    self._queue.appendleft(block[need - taken:])
+                    block = block[:need - taken]
+                parts.append(block)
+                taken += len(block)
+            self._queued -= taken
+        return np.concatenate(parts)
+
+    def _encode(self, block, fmt):
+        if fmt["sample_rate"] != self.capture_rate:
+            block = block[::self.capture_rate // fmt["sample_rate"]]
+        if fmt["codec"] == "ulaw":
+            return ulaw_encode(block)
+        return block.tobytes()
+
+    def _recv_loop(self, client):
+        try:
+            while self._running:
+                opcode, payload = _read_frame(client)
+                if opcode == _OP_CLOSE:
+                    self._send(client, _OP_CLOSE, b"")
+                    break
+                if opcode == _OP_PING:
+                    self._send(client, _OP_PONG, payload)
+                elif opcode == _OP_TEXT:
+                    self._handle_command(client, payload.decode("utf-8"))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            try:
+                client.close()
+            except OSError:
+                pass
+
+    def _handle_command(self, client, text):
+        try:
+            command = json.loads(text)
+        except ValueError:
+            command = {"cmd": text}
+        if not isinstance(command, dict):
+            command = {"cmd": text}
+        name = command.get("cmd")
+        self.commands[name] = self.commands.get(name, 0) + 1
+        if name == "buffer_level":
+            self.last_feedback = command
+        elif name == "flush":
+            with self._lock:
+                self.flushed_samples += self._queued
+                self._queue.clear()
+                self._queued = 0
+        elif name == "set_format":
+            fmt = {k: command.get(k, self.format[k]) for k in self.format}
+            if fmt["codec"] not in CODEC_BYTES or self.capture_rate % int(fmt["sample_rate"]):
+                logger.warning(f"不支持的格式: {fmt}")
+                return
+            # 在发送锁内切换并回复，保证回复之后的二进制帧都是新格式
+            with self._send_lock:
+                self.format = fmt
+                client.sendall(_encode_frame(_OP_TEXT, json.dumps({"event": "format", **fmt}).encode()))
+
+    def stats(self):
+        return {
+            "format": dict(self.format),
+            "backlog_seconds": self.backlog_seconds(),
+            "sent_bytes": self.sent_bytes,
+            "dropped_samples": self.dropped_samples,
+            "flushed_samples": self.flushed_samples,
+            "commands": dict(self.commands),
+        }
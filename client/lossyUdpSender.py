@@ -0,0 +1,165 @@
+"""
+本地UDP发送端 + 有损链路模拟器，用于在没有设备、没有WiFi的情况下测试UDPAudioStream
+
+- UDPAudioSender: 发送端逻辑（见“音频流处理流程”）：原始音频按帧编号frameId，超过MTU时分片，
+  已发送的帧连同是否分片、分片数据、发送时间缓存一段时间后清理（为之后的重传预留）
+- LossyLink: 模拟链路，按概率丢包（支持突发丢包）、加随机时延（时延不同自然产生乱序）、重复报文
+- run_lossy_sender: 按实时节奏把PCM经过LossyLink发给接收端
+
+用法示例：
+    python lossyUdpSender.py --port 12346 --duration 30 --loss 0.05 --burst 0.3 --jitter-ms 30
+    python lossyUdpSender.py --local --duration 10 --loss 0.1          # 同时启动本地接收端并打印统计
+"""
+import time
+import asyncio
+import logging
+import argparse
+
+import numpy as np
+from udpAudioStream import fragment_frame
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class UDPAudioSender:
+    """把连续PCM切成帧并打包成UDP报文"""
+
+    def __init__(self, sample_rate=16000, channels=1, sample_width=2, frame_ms=100, cache_seconds=1.0):
+        """frame_ms: 每帧时长，默认100ms（16kHz pcm16为3200字节，会被分成3片）"""
+        self.sample_rate = sample_rate
+        self.frame_seconds = frame_ms / 1000
+        self.bytes_per_sample = channels * sample_width
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * self.bytes_per_sample
+        self.cache_seconds = cache_seconds
+        self.frame_id = 0
+        self.timestamp = 0
+        # frameId -> {"raw": 原始帧, "is_fragmented": bool, "fragments": [报文], "sent_time": 发送时间}
+        self.sent_cache = {}
+
+    def packetize(self, frame: bytes, now=None):
+        """给一帧编号并分片，返回报文列表"""
+        now = time.monotonic() if now is None else now
+        datagrams = fragment_frame(self.frame_id, self.timestamp, frame)
+        self.sent_cache[self.frame_id] = {"raw": frame, "is_fragmented": len(datagrams) > 1,
+                                          "fragments": datagrams, "sent_time": now}
+        self.frame_id += 1
+        self.timestamp += len(frame) // self.bytes_per_sample
+        # 超时清理发送缓存
+        for frame_id in [fid for fid, item in self.sent_cache.items() if now - item["sent_time"] > self.cache_seconds]:
+            del self.sent_cache[frame_id]
+        return datagrams
+
+    def frames(self, pcm: bytes):
+        """按帧长切分整段PCM（最后不足一帧的部分丢弃）"""
+        for offset in range(0, len(pcm) - self.frame_bytes + 1, self.frame_bytes):
+            yield pcm[offset:offset + self.frame_bytes]
+
+
+class LossyLink:
+    """有损链路：每个报文独立决定是否丢弃、附加多少时延、是否重复"""
+
+    def __init__(self, loss=0.05, burst=0.0, delay_ms=5.0, jitter_ms=20.0, duplicate=0.0, seed=0):
+        """
+        loss: 平均丢包率
+        burst: 上一个报文丢失时，本报文也丢失的概率（0为独立丢包，越大丢包越成串）
+        delay_ms: 固定传输时延
+        jitter_ms: 附加时延（半正态分布的标准差）
+        duplicate: 报文重复的概率
+        """
+        self.loss = loss
+        self.burst = burst
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.duplicate = duplicate
+        self.rng = np.random.default_rng(seed)
+        self._lost = False
+        self.stats = {"sent": 0, "dropped": 0, "duplicated": 0}
+
+    def transmit(self, datagram):
+        """返回该报文的到达时延列表(秒)：空列表表示丢失，多个表示重复"""
+        self.stats["sent"] += 1
+        # 两状态模型：保证平均丢包率为loss的同时按burst形成成串丢包
+        p = self.burst if self._lost else self.loss * (1 - self.burst) / max(1e-9, 1 - self.loss)
+        self._lost = self.rng.random() < min(1.0, p)
+        if self._lost:
+            self.stats["dropped"] += 1
+            return []
+        copies = 1
+        if self.rng.random() < self.duplicate:
+            copies = 2
+            self.stats["duplicated"] += 1
+        return [(self.delay_ms + abs(self.rng.normal(0.0, self.jitter_ms))) / 1000 for _ in range(copies)]
+
+
+async def run_lossy_sender(host, port, pcm: bytes, sender=None, link=None, speed=1.0, on_frame=None):
+    """
+    按实时节奏（speed倍速）把pcm分帧，经过LossyLink发送到host:port
+    on_frame(frame_index, send_time): 每帧发送时的回调（测试用，记录发送时刻）
+    返回链路统计
+    """
+    loop = asyncio.get_running_loop()
+    sender = sender or UDPAudioSender()
+    link = link or LossyLink()
+    transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+    try:
+        start = time.monotonic()
+        for i, frame in enumerate(sender.frames(pcm)):
+            await asyncio.sleep(max(0.0, start + i * sender.frame_seconds / speed - time.monotonic()))
+            if on_frame is not None:
+                on_frame(i, time.monotonic())
+            for datagram in sender.packetize(frame):
+                for delay in link.transmit(datagram):
+                    loop.call_later(delay / speed, transport.sendto, datagram)
+        # 等最后几个被延迟的报文发出
+        await asyncio.sleep((link.delay_ms + 5 * link.jitter_ms) / 1000 / speed)
+    finally:
+        transport.close()
+    return dict(link.stats)
+
+
+def _sine(duration, sample_rate, frequency=440.0):
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    return (8000 * np.sin(2 * np.pi * frequency * t)).astype(np.int16).tobytes()
+
+
+async def _main(args):
+    receiver = None
+    host, port = args.host, args.port
+    if args.local:
+        from udpAudioStream import UDPAudioStream
+        receiver = UDPAudioStream("127.0.0.1", 0, args.sample_rate, min_buffer=args.min_buffer)
+        receiver.set_audio_callback(lambda data: None)
+        receiver.start()
+        host, port = "127.0.0.1", receiver.port
+    sender = UDPAudioSender(args.sample_rate, frame_ms=args.frame_ms)
+    link = LossyLink(args.loss, args.burst, args.delay_ms, args.jitter_ms, args.duplicate, args.seed)
+    stats = await run_lossy_sender(host, port, _sine(args.duration, args.sample_rate), sender, link)
+    print(f"链路: {stats}")
+    if receiver is not None:
+        await asyncio.sleep(args.min_buffer + 0.1)
+        receiver.stop()
+        print(f"接收端: {receiver.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="有损UDP音频发送模拟器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12346)
+    parser.add_argument("--local", action="store_true", help="同时启动本地UDPAudioStream接收并打印统计")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--frame-ms", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="发送时长(秒)")
+    parser.add_argument("--loss", type=float, default=0.05, help="平均丢包率")
+    parser.add_argument("--burst", type=float, default=0.0, help="突发丢包概率")
+    parser.add_argument("--delay-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--duplicate", type=float, default=0.0, help="报文重复概率")
+    parser.add_argument("--min-buffer", type=float, default=0.2, help="本地接收端最小播放缓冲(秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,324 @@
+"""
+轻量指标模块：计数器 / 仪表 / HDR风格延迟直方图，支持Prometheus文本格式和JSON导出
+
+默认关闭，关闭时计时上下文为空操作，热路径开销接近于零；开启方式：
+    环境变量 AUDIO_METRICS=1，或代码中调用 METRICS.enable()
+    环境变量 AUDIO_METRICS_PORT=9108 时，可调用 METRICS.start_http_server() 开启本地HTTP导出：
+        /metrics       Prometheus文本格式
+        /metrics.json  JSON
+
+client目录下的模块按顶层模块导入（import lshMetrics），Audio_AI按包导入（client.lshMetrics），
+两种方式拿到的是同一个模块实例（见文件末尾的sys.modules别名），指标不会分裂成两份。
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 5                   # 每个2倍区间细分32档，相对误差约3%
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 36                     # 以微秒计，上限约2^41微秒，足够覆盖任何延迟
+# Prometheus导出时使用的固定桶边界（秒）
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                      0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    """单调递增计数器（GIL下的+=在极端竞争时可能少计，作为监控数据可以接受）"""
+    kind = "counter"
+
+    def __init__(self, name, help_text="", labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    HDR风格对数-线性直方图：以微秒为单位，每个2倍区间再线性分32档
+    observe为O(1)的整数运算 + 列表自增，不做排序和内存分配
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.counts = [0] * (SUB_BUCKET_COUNT * (MAX_EXPONENT + 1))
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+
+    @staticmethod
+    def _index(micros):
+        if micros < SUB_BUCKET_COUNT:
+            return micros
+        shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * SUB_BUCKET_COUNT + (micros >> shift) - SUB_BUCKET_COUNT
+
+    @staticmethod
+    def _upper_bound(index):
+        """桶的上界（秒）"""
+        group, offset = divmod(index, SUB_BUCKET_COUNT)
+        if group == 0:
+            return (offset + 1) / 1e6
+        return ((SUB_BUCKET_COUNT + offset + 1) << (group - 1)) / 1e6
+
+    def observe(self, seconds):
+        micros = int(seconds * 1e6)
+        if micros < 0:
+            micros = 0
+        index = self._index(micros)
+        if index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """q为0~100，返回对应分位数（秒，取所在桶上界）"""
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(round(self.count * q / 100.0)))
+        seen = 0
+        for index, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= target:
+                    return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def cumulative_buckets(self, bounds=PROMETHEUS_BUCKETS):
+        """按固定边界汇总为Prometheus累积桶 [(le, 累积数)]"""
+        result = []
+        seen = 0
+        bound_iter = iter(bounds)
+        le = next(bound_iter, None)
+        for index, c in enumerate(self.counts):
+            if not c:
+                continue
+            upper = self._upper_bound(index)
+            while le is not None and upper > le:
+                result.append((le, seen))
+                le = next(bound_iter, None)
+            seen += c
+        while le is not None:
+            result.append((le, seen))
+            le = next(bound_iter, None)
+        return result
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min or 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """指标注册表：按(名称, 标签)去重创建指标，负责导出"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _get(self, cls, name, help_text, labels):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help_text, key[1])
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", labels=None):
+        return self._get(Histogram, name, help_text, labels)
+
+    def timer(self, histogram):
+        """计时上下文：未开启时返回空操作对象"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(histogram)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def prometheus_text(self):
+        """导出Prometheus文本格式"""
+        lines = []
+        described = set()
+        for (name, labels), metric in sorted(self._metrics.items(), key=lambda kv: kv[0]):
+            if name not in described:
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                described.add(name)
+            if metric.kind == "histogram":
+                for le, cumulative in metric.cumulative_buckets():
+                    bucket_labels = _format_labels(labels + (("le", repr(le)),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {metric.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        result = {}
+        for (name, labels), metric in self._metrics.items():
+            result.setdefault(name, []).append({"labels": dict(labels), "value": metric.snapshot()})
+        return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+    def start_http_server(self, port=None, host="127.0.0.1"):
+        """在后台线程启动本地HTTP导出服务，返回实际监听端口"""
+        if self._server is not None:
+            return self._server.server_address[1]
+        port = int(port if port is not None else os.environ.get("AUDIO_METRICS_PORT", 9108))
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, content_type = registry.to_json(), "application/json; charset=utf-8"
+                elif self.path.startswith("/metrics"):
+                    body, content_type = registry.prometheus_text(), "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        logger.info(f"指标导出服务已启动: http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server.server_address[1]
+
+    def stop_http_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+METRICS = MetricsRegistry(enabled=os.environ.get("AUDIO_METRICS", "") not in ("", "0"))
+
+# 顶层导入(lshMetrics)和包导入(client.lshMetrics)共用同一个模块实例
+sys.modules.setdefault("lshMetrics", sys.modules[__name__])
+sys.modules.setdefault("client.lshMetrics", sys.modules[__name__])
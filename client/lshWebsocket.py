@@ -6,6 +6,10 @@ import logging
 import numpy as np
 from typing import Callable, Optional
 import json
+from lshMetrics import METRICS
+from audioFlowControl import decode_frame
+from audioCapture import CaptureWriter
+from sampleFormat import to_int16
 
 # 配置日志
 logging.basicConfig(
@@ -18,7 +22,8 @@ class ESP32AudioStream:
     """ESP32S3音频流处理模块"""
     
     def __init__(self, ws_url: str, sample_rate: int = 16000, 
-                 channels: int = 1, sample_width: int = 2):
+                 channels: int = 1, sample_width: int = 2, align: str = "left",
+                 shift: Optional[int] = None, channel: Optional[int] = None):
         """
         初始化音频流处理器
         
@@ -26,19 +31,39 @@ class ESP32AudioStream:
             ws_url: ESP32S3的WebSocket服务器地址
             sample_rate: 采样率(Hz)
             channels: 声道数
-            sample_width: 采样宽度(字节)
+            sample_width: 采样宽度(字节)，I2S 24/32位为3/4
+            align/shift/channel: 非16位单声道输入的转换方式（见sampleFormat.to_int16）
+        注意：设备发送的格式不是16位单声道时，回调和接收端拿到的数据统一转换为16位单声道
         """
         self.ws_url = ws_url
         self.sample_rate = sample_rate
         self.channels = channels
         self.sample_width = sample_width
+        self._convert = None
+        if (sample_width, channels) != (2, 1):
+            self._convert = lambda data: to_int16(data, sample_width, channels, align, shift, channel=channel).tobytes()
         self.ws = None
         self.is_running = False
         self.audio_callback = None
         self.error_callback = None
+        self.open_callback = None
+        self.audio_sinks = []  # 额外的音频接收端（如录音），在audio_callback之后调用
+        self.control_listeners = []  # 设备文本事件（JSON）的监听者，如流控
+        # 设备当前实际发送的格式；与标称格式不同时先解码、重采样再交给回调
+        self.wire_format = {"sample_rate": sample_rate, "codec": "pcm16"}
+        self.received_seconds = 0.0  # 已收到音频的累计时长（按标称格式），流控据此计算到达速率
+        self._capture = None  # 抓包写入器，开启后记录每一帧原始数据和到达时间
         self._connection_lock = threading.Lock()
         self._reconnect_attempts = 0
         self._max_reconnect_attempts = 10
+
+        # 接收指标（按连接地址区分）
+        labels = {"url": ws_url}
+        self._m_frames = METRICS.counter("ws_frames_total", "收到的二进制音频帧数", labels)
+        self._m_bytes = METRICS.counter("ws_bytes_total", "收到的音频字节数", labels)
+        self._m_interarrival = METRICS.histogram("ws_frame_interarrival_seconds", "相邻音频帧到达间隔", labels)
+        self._m_callback = METRICS.histogram("ws_audio_callback_seconds", "音频回调处理耗时", labels)
+        self._last_frame_time = None
         
         # websocket.enableTrace(True)
         
@@ -51,6 +76,32 @@ class ESP32AudioStream:
         """
         self.audio_callback = callback
         
+    def add_audio_sink(self, sink: Callable[[bytes], None]):
+        """
+        添加额外的音频接收端，与audio_callback收到同样的数据
+        接收端在WebSocket接收线程中调用，必须快速返回（耗时操作放到自己的线程）
+        """
+        self.audio_sinks.append(sink)
+
+    def remove_audio_sink(self, sink: Callable[[bytes], None]):
+        if sink in self.audio_sinks:
+            self.audio_sinks.remove(sink)
+
+    def start_capture(self, path: str):
+        """开启抓包：之后收到的每一帧（解码前）连同到达时间写入path，可用audioCapture回放"""
+        self.stop_capture()
+        self._capture = CaptureWriter(path, self.sample_rate, self.channels, self.sample_width)
+        logger.info(f"开始抓包: {path}")
+
+    def stop_capture(self):
+        capture, self._capture = self._capture, None
+        if capture is not None:
+            capture.close()
+
+    def add_control_listener(self, listener: Callable[[dict], None]):
+        """添加设备控制事件监听者，参数为设备发来的JSON对象"""
+        self.control_listeners.append(listener)
+
     def set_error_callback(self, callback: Callable[[str], None]):
         """
         设置错误回调函数
@@ -86,6 +137,7 @@ class ESP32AudioStream:
                 except Exception as e:
                     logger.error(f"关闭WebSocket连接失败: {e}")
                 self.ws = None
+            self.stop_capture()
             logger.info("音频流已停止")
             
     def _connect(self):
@@ -120,6 +172,7 @@ class ESP32AudioStream:
         """连接建立回调"""
         logger.info("WebSocket连接已建立")
         self._reconnect_attempts = 0
+        self._reset_wire_format()
         if self.open_callback:
             self.open_callback()
         # 发送启动音频流命令
@@ -127,19 +180,70 @@ class ESP32AudioStream:
         
     def _on_message(self, ws, message):
         """消息接收回调"""
+        capture = self._capture
+        if capture is not None:
+            capture.write(message)
         if isinstance(message, bytes):
+            if self.wire_format["codec"] != "pcm16" or self.wire_format["sample_rate"] != self.sample_rate:
+                message = decode_frame(message, self.wire_format["codec"],
+                                       self.wire_format["sample_rate"], self.sample_rate).tobytes()
+            elif self._convert is not None:
+                message = self._convert(message)
+            self.received_seconds += len(message) / (2 * self.sample_rate)
+            if METRICS.enabled:
+                now = time.perf_counter()
+                self._m_frames.inc()
+                self._m_bytes.inc(len(message))
+                if self._last_frame_time is not None:
+                    self._m_interarrival.observe(now - self._last_frame_time)
+                self._last_frame_time = now
             # 处理二进制音频数据
             if self.audio_callback:
                 try:
-                    self.audio_callback(message)
+                    with METRICS.timer(self._m_callback):
+                        self.audio_callback(message)
                 except Exception as e:
                     self._handle_error(f"处理音频数据失败: {e}")
-            else:
+            elif not self.audio_sinks:
                 logger.warning("未设置音频回调函数，丢弃数据")
+            for sink in self.audio_sinks:
+                try:
+                    sink(message)
+                except Exception as e:
+                    self._handle_error(f"音频接收端处理失败: {e}")
         else:
-            # 处理文本消息
-            logger.info(f"收到文本消息: {message}")
+            # 处理文本消息：JSON为设备控制事件，其它按原样记录
+            try:
+                event = json.loads(message)
+            except ValueError:
+                event = None
+            if not isinstance(event, dict):
+                logger.info(f"收到文本消息: {message}")
+                return
+            if event.get("event") == "format":
+                self.wire_format = {
+                    "sample_rate": int(event.get("sample_rate", self.wire_format["sample_rate"])),
+                    "codec": event.get("codec", self.wire_format["codec"]),
+                }
+            for listener in self.control_listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    self._handle_error(f"控制事件处理失败: {e}")
             
+    def _reset_wire_format(self):
+        """
+        新连接（设备重启/重连）时设备按默认的pcm16标称格式发送，之前协商的格式作废；
+        同时向控制事件监听者发出 {"event": "connected"}，流控据此回到初始状态
+        """
+        self.wire_format = {"sample_rate": self.sample_rate, "codec": "pcm16"}
+        self._last_frame_time = None
+        for listener in self.control_listeners:
+            try:
+                listener({"event": "connected"})
+            except Exception as e:
+                self._handle_error(f"控制事件处理失败: {e}")
+
     def _on_error(self, ws, error):
         """错误回调"""
         self._handle_error(f"WebSocket错误: {error}")
@@ -168,11 +272,17 @@ class ESP32AudioStream:
             self._handle_error("达到最大重连次数，停止尝试")
             self.is_running = False
             
+    def is_connected(self) -> bool:
+        return bool(self.ws and self.ws.sock and self.ws.sock.connected)
+
     def _send_command(self, command: str, params: Optional[dict] = None):
-        if self.ws and self.ws.sock and self.ws.sock.connected:
+        if self.is_connected():
             try:
-                # 改为发送纯文本命令
-                self.ws.send(command)  # 直接发送字符串
+                # 不带参数时发送纯文本命令；带参数时发送JSON（控制协议见audioFlowControl）
+                if params is None:
+                    self.ws.send(command)  # 直接发送字符串
+                else:
+                    self.ws.send(json.dumps({"cmd": command, **params}))
                 logger.debug(f"发送命令: {command}")
                 return True
             except Exception as e:
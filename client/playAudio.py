@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import sounddevice as sd
 import queue
@@ -7,6 +8,10 @@ import logging
 import time
 from collections import deque
 from audioDispose import AudioDispose
+from lshMetrics import METRICS
+from audioRecorder import SegmentedRecorder
+from audioFlowControl import FlowController
+from udpAudioStream import UDPAudioStream
 
 # 配置日志
 logging.basicConfig(
@@ -18,13 +23,25 @@ logger = logging.getLogger(__name__)
 # 配置参数（需与ESP32匹配）
 ESP32_IP = "192.168.0.106"  # ESP32的IP地址（在ESP32串口日志中查看）
 ESP32_PORT = 12345
+UDP_PORT = 12346    # AUDIO_TRANSPORT=udp 时本地监听的UDP端口
 SAMPLE_RATE = 16000
 CHANNELS = 1
 BUFFER_SIZE = 1024  # 与ESP32发送的缓冲区大小一致
+# 设备发送的原始采样格式（I2S 24/32位或双声道时，接收端统一转换为16位单声道后再交给播放）
+DEVICE_SAMPLE_WIDTH = 2
+DEVICE_CHANNELS = 1
 
 TARGET_BUFFER_DURATION = 0.3  # 目标缓冲区时长(秒)
 MIN_BUFFER_DURATION = 0.1     # 最小缓冲区时长(秒)
 
+# 播放指标
+_CALLBACK_TIME = METRICS.histogram("playback_callback_seconds", "播放回调耗时")
+_BUFFER_FILL = METRICS.gauge("playback_raw_buffer_seconds", "待处理原始缓冲时长")
+_PROCESSED_QUEUE = METRICS.gauge("playback_processed_queue_chunks", "待播放队列中的数据块数")
+_UNDERRUNS = METRICS.counter("playback_underruns_total", "播放数据不足（补静音）的回调次数")
+_TARGET_MAX = METRICS.gauge("playback_target_max_seconds", "动态调整后的目标缓冲时长")
+_TARGET_MIN = METRICS.gauge("playback_target_min_seconds", "动态调整后的最小缓冲时长")
+
 class PlayAudio:
     def __init__(self, sample_rate=16000, channel=1):
         self.start_time = None
@@ -86,6 +103,36 @@ class PlayAudio:
         total_samples = sum(len(chunk) for chunk in self.raw_queue)
         return total_samples/self.sample_rate
 
+    def buffered_seconds(self):
+        """待处理 + 待播放的总缓冲时长，供流控判断水位"""
+        processed = sum(len(chunk) for chunk in list(self.processed_queue.queue))
+        return self.get_buffer_duration() + processed / self.sample_rate
+
+    def trim_buffer(self, keep_seconds):
+        """丢弃最旧的缓冲数据，只保留keep_seconds，返回丢弃的秒数（流控在积压过多时调用）"""
+        dropped = 0
+        excess = int((self.buffered_seconds() - keep_seconds) * self.sample_rate)
+        # 待播放队列里的数据比原始队列更旧，先丢这部分
+        while excess > 0:
+            try:
+                chunk = self.processed_queue.get_nowait()
+            except queue.Empty:
+                break
+            if len(chunk) > excess:
+                with self.processed_queue.mutex:
+                    self.processed_queue.queue.appendleft(chunk[excess:])
+                chunk = chunk[:excess]
+            excess -= len(chunk)
+            dropped += len(chunk)
+        while excess > 0 and self.raw_queue:
+            chunk = self.raw_queue.popleft()
+            if len(chunk) > excess:
+                self.raw_queue.appendleft(chunk[excess:])
+                chunk = chunk[:excess]
+            excess -= len(chunk)
+            dropped += len(chunk)
+        return dropped / self.sample_rate
+
     def adjust_thresholds(self):
         #记录历史音频数据播放时长
         if len(self.buffer_history) < 10: #
@@ -99,12 +146,16 @@ class PlayAudio:
             new_target = min(self.max_target_buffer_duration + self.adjustment_step, self.max_target)
             if new_target != self.max_target_buffer_duration:
                 self.max_target_buffer_duration = new_target
+                if METRICS.enabled:
+                    _TARGET_MAX.set(new_target)
                 print(f"动态调整目标缓冲区至: {self.max_target_buffer_duration:.2f}s")
         elif avg_duration < self.max_target_buffer_duration * 0.7:
             # 缓冲区长期低于目标，减小目标阈值
             new_target = max(self.max_target_buffer_duration - self.adjustment_step, self.min_target)
             if new_target != self.max_target_buffer_duration:
                 self.max_target_buffer_duration = new_target
+                if METRICS.enabled:
+                    _TARGET_MAX.set(new_target)
                 print(f"动态调整目标缓冲区至: {self.max_target_buffer_duration:.2f}s")
 
         # 调整最小缓冲区阈值（保持为目标阈值的1/3 ~ 1/2）
@@ -112,6 +163,8 @@ class PlayAudio:
         new_min = max(min(ideal_min, self.max_min), self.min_min)
         if abs(new_min - self.min_target_buffer_duration) > 0.01:
             self.min_target_buffer_duration = new_min
+            if METRICS.enabled:
+                _TARGET_MIN.set(new_min)
             print(f"动态调整最小缓冲区至: {self.min_target_buffer_duration:.2f}s")
 
     def adjust_thresholds_based_on_lag(self):
@@ -159,6 +212,10 @@ class PlayAudio:
 
     ### 音频播放 ###
     def audio_playback_callback(self, outdata, frames, pa_time, status):
+        with METRICS.timer(_CALLBACK_TIME):
+            self._fill_output(outdata, frames)
+
+    def _fill_output(self, outdata, frames):
         # 初始化时间跟踪
         if self.start_time is None:
             self.start_time = time.time()
@@ -166,6 +223,9 @@ class PlayAudio:
         
         #满足设置的最大最小目标缓冲区时常才会进行数据处理播放流程
         buffer_duration = self.get_buffer_duration()
+        if METRICS.enabled:
+            _BUFFER_FILL.set(buffer_duration)
+            _PROCESSED_QUEUE.set(self.processed_queue.qsize())
         if buffer_duration >= self.max_target_buffer_duration or buffer_duration < self.min_target_buffer_duration:
             processed_duration = self.process_audio()
             if processed_duration > 0:
@@ -177,7 +237,9 @@ class PlayAudio:
             processed_data = self.processed_queue.get_nowait()
             if len(processed_data) < frames:
                 outdata[:len(processed_data), 0] = processed_data #实际数据不足，先填充前半部分
-                outdata[len(processed_data), 0] = 0 #后半部分填充0，静音
+                outdata[len(processed_data):, 0] = 0 #后半部分填充0，静音
+                if METRICS.enabled:
+                    _UNDERRUNS.inc()
             else:
                 outdata[:, 0] = processed_data[:frames] #填满
                 remaining = processed_data[frames:] #剩余的塞回去。。。
@@ -187,6 +249,8 @@ class PlayAudio:
                 self.total_samples += frames
         except queue.Empty:
             outdata.fill(0)
+            if METRICS.enabled:
+                _UNDERRUNS.inc()
 
     
     def open_callback(self):
@@ -211,8 +275,13 @@ class PlayAudio:
 def main():
     WS_URL = f"ws://{ESP32_IP}:{ESP32_PORT}/"
 
-    # 创建音频流处理器
-    stream = ESP32AudioStream(ws_url=WS_URL)
+    # 创建音频流处理器；AUDIO_TRANSPORT=udp 时改用UDP接收（丢包不阻塞后续数据），回调接口相同
+    if os.environ.get("AUDIO_TRANSPORT") == "udp":
+        stream = UDPAudioStream(port=int(os.environ.get("AUDIO_UDP_PORT", UDP_PORT)), sample_rate=SAMPLE_RATE,
+                                channels=DEVICE_CHANNELS, sample_width=DEVICE_SAMPLE_WIDTH)
+    else:
+        stream = ESP32AudioStream(ws_url=WS_URL, sample_rate=SAMPLE_RATE,
+                                  channels=DEVICE_CHANNELS, sample_width=DEVICE_SAMPLE_WIDTH)
 
     playAudio = PlayAudio(SAMPLE_RATE, CHANNELS)
 
@@ -220,9 +289,30 @@ def main():
     stream.set_error_callback(playAudio.error_callback)
     stream.set_open_callback(playAudio.open_callback)
 
+    if METRICS.enabled and os.environ.get("AUDIO_METRICS_PORT"):
+        METRICS.start_http_server()
+
+    # 设置AUDIO_RECORD_DIR时，同时把原始音频分段录制到该目录
+    recorder = None
+    if os.environ.get("AUDIO_RECORD_DIR"):
+        recorder = SegmentedRecorder(os.environ["AUDIO_RECORD_DIR"], device_id=ESP32_IP.replace(".", "_"),
+                                     sample_rate=SAMPLE_RATE, channels=CHANNELS).attach(stream)
+
+    # 设置AUDIO_CAPTURE_FILE时，记录每一帧及到达时间，之后可用audioCapture离线回放
+    if os.environ.get("AUDIO_CAPTURE_FILE"):
+        stream.start_capture(os.environ["AUDIO_CAPTURE_FILE"])
+
+    # 设置AUDIO_FLOW_CONTROL=1时，根据播放缓冲水位向设备反馈，拥塞时请求降低码率，积压过多时裁剪
+    # 需要固件读取并处理文本帧（当前固件的httpd_ws_recv_frame只读帧长、不读载荷），默认关闭
+    flow = None
+    if os.environ.get("AUDIO_FLOW_CONTROL") == "1":
+        flow = FlowController(stream).add_buffer("playback", playAudio.buffered_seconds, playAudio.trim_buffer)
+
     try:
         # 启动音频流
         stream.start()
+        if flow is not None:
+            flow.start()
         logger.info("按Ctrl+C停止录音...")
 
         stop_event = playAudio.start_audio_playback()
@@ -232,8 +322,12 @@ def main():
 
     except KeyboardInterrupt:
         # 停止音频流并保存文件
+        if flow is not None:
+            flow.stop()
         stream.stop()
         stop_event.set()  # 通知播放线程退出
+        if recorder is not None:
+            recorder.stop()
 
 
 if __name__ == "__main__":
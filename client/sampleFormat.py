@@ -0,0 +1,139 @@
+"""
+采样格式转换：把ESP32 I2S麦克风的原始帧统一成下游需要的格式
+    - 播放/录音/流控：int16 单声道
+    - 浏览器/Whisper：float32，归一化到[-1, 1]
+
+支持的输入（sample_width为每个声道采样的字节数）：
+    2  int16
+    3  紧凑24位（3字节一个采样）
+    4  32位槽：align="left" 有效数据在高位（I2S标准MSB对齐，含完整32位数据），
+              align="right" 24位数据在低位（已符号扩展）
+多声道为交错存储（L R L R ...），byteswap=True表示大端数据
+
+转int16时右移位数可以用shift覆盖（“音频流处理流程”中提到移多少位需要实测：麦克风灵敏度低时少移几位相当于加增益，超出范围会饱和）。
+shift为8的整数倍时，直接在原始缓冲区上按步长取出对应的两个字节，是零拷贝视图；其余情况一次遍历完成计算
+"""
+import logging
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 各输入格式的默认右移位数（得到int16）和满幅值（得到float32）
+_DEFAULT_SHIFT = {(2, "left"): 0, (2, "right"): 0, (3, "left"): 8, (3, "right"): 8, (4, "left"): 16, (4, "right"): 8}
+_FULL_SCALE = {(2, "left"): 2 ** 15, (2, "right"): 2 ** 15, (3, "left"): 2 ** 23, (3, "right"): 2 ** 23,
+               (4, "left"): 2 ** 31, (4, "right"): 2 ** 23}
+
+
+def _check(sample_width, align):
+    if (sample_width, align) not in _DEFAULT_SHIFT:
+        raise ValueError(f"不支持的采样格式: sample_width={sample_width}, align={align}")
+
+
+def _buffer(data, sample_width, channels):
+    """按完整帧截断，返回可直接做视图的字节缓冲"""
+    if isinstance(data, np.ndarray):
+        data = data.reshape(-1).view(np.uint8)
+    frame = sample_width * channels
+    usable = len(data) - len(data) % frame
+    if usable != len(data):
+        logger.debug(f"丢弃不完整帧的{len(data) - usable}字节")
+    return memoryview(data)[:usable] if not isinstance(data, np.ndarray) else data[:usable]
+
+
+def samples(data, sample_width=2, byteswap=False):
+    """
+    原始字节 → 整数采样（不做缩放）：2字节为int16视图，4字节为int32视图（零拷贝），
+    紧凑24位在高位补零组装成int32后算术右移8位（一次组装）
+    """
+    order = ">" if byteswap else "<"
+    if sample_width == 2:
+        return np.frombuffer(data, dtype=order + "i2")
+    if sample_width == 4:
+        return np.frombuffer(data, dtype=order + "i4")
+    if sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        if byteswap:
+            raw = raw[:, ::-1]
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw  # 小端：低字节补零，相当于左移8位，符号位落在最高位
+        return padded.view("<i4").reshape(-1) >> 8
+    raise ValueError(f"不支持的采样宽度: {sample_width}")
+
+
+def deinterleave(frames, channels):
+    """交错采样 → (channels, 采样组数) 的视图（零拷贝，按步长访问）"""
+    return frames.reshape(-1, channels).T
+
+
+def _channel_sum(frames):
+    """逐声道累加到float32（每次处理一整列，比沿长度只有2的轴做归约快得多）"""
+    total = frames[:, 0].astype(np.float32)
+    for c in range(1, frames.shape[1]):
+        total += frames[:, c]
+    return total
+
+
+def downmix(frames, channel=None):
+    """
+    (采样组数, 声道数) → 单声道
+    channel: 取指定声道（视图，零拷贝），例如单麦克风只接在左声道槽时应取0而不是平均；
+             None时各声道平均，结果为float32
+    """
+    if frames.ndim == 1 or frames.shape[1] == 1:
+        return frames.reshape(-1)
+    if channel is not None:
+        return frames[:, channel]
+    total = _channel_sum(frames)
+    total *= np.float32(1.0 / frames.shape[1])
+    return total
+
+
+def to_int16(data, sample_width=2, channels=1, align="left", shift=None, byteswap=False, channel=None,
+             mono=True):
+    """
+    原始字节 → int16
+    mono=True时返回单声道一维数组（按channel取声道或平均），否则返回(采样组数, 声道数)
+    """
+    _check(sample_width, align)
+    data = _buffer(data, sample_width, channels)
+    shift = _DEFAULT_SHIFT[(sample_width, align)] if shift is None else shift
+    bits = sample_width * 8
+    if shift % 8 == 0 and 0 <= shift <= bits - 16:
+        # 零拷贝：每个采样取出[shift, shift+16)位所在的两个字节
+        offset = shift // 8 if not byteswap else sample_width - 2 - shift // 8
+        n = len(data) // sample_width
+        out = np.ndarray((n,), dtype=(">" if byteswap else "<") + "i2", buffer=data, offset=offset,
+                         strides=(sample_width,))
+    else:
+        wide = samples(data, sample_width, byteswap).astype(np.int32, copy=False)
+        wide = wide >> shift if shift >= 0 else wide << -shift
+        out = np.clip(wide, -32768, 32767).astype(np.int16)
+    frames = out.reshape(-1, channels)
+    if not mono:
+        return frames
+    mixed = downmix(frames, channel)
+    return mixed if mixed.dtype == np.int16 else mixed.astype(np.int16)
+
+
+def to_float32(data, sample_width=2, channels=1, align="left", byteswap=False, channel=None, mono=True):
+    """
+    原始字节 → float32，按输入格式的满幅值归一化到[-1, 1]（保留24/32位输入的全部精度）
+    缩放与类型转换在同一次ufunc遍历中完成
+    """
+    _check(sample_width, align)
+    data = _buffer(data, sample_width, channels)
+    frames = samples(data, sample_width, byteswap).reshape(-1, channels)
+    if mono:
+        if channel is not None or channels == 1:
+            frames = frames[:, channel or 0]
+        else:
+            # 平均与缩放合并：先在float32里求和，再一次乘以 1/(满幅 * 声道数)
+            total = _channel_sum(frames)
+            return np.multiply(total, np.float32(1.0 / (_FULL_SCALE[(sample_width, align)] * channels)), out=total)
+    return np.multiply(frames, np.float32(1.0 / _FULL_SCALE[(sample_width, align)]), dtype=np.float32)
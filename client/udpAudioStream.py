@@ -0,0 +1,275 @@
+"""
+UDP音频接收（类RTP，设计见“音频流处理流程”中UDP传输一节）：丢包只影响丢失的那一帧，不会像TCP那样阻塞后面的数据
+
+报文格式（网络字节序）：
+    frameId(u32) | timestamp(u32, 帧首采样点序号) | 分片序号(u16) | 分片总数(u16) | 载荷
+一帧超过MTU（1500 - IP/UDP头 = 1472字节）时按分片发送，每个报文载荷最多 1472 - 12 字节
+
+接收流程：
+    1. 按frameId缓存到frameCache，分片收齐后isReady，立即按timestamp放入readyPlayQueue（小顶堆）
+    2. 定期检查：frameCache中超过frame_timeout仍未收齐、或已错过播放时间的残缺帧直接丢弃
+    3. 播放时钟 = 第一帧到达时刻 + min_buffer，当前时间 ≥ 帧应播放时间才交给audio_callback；
+       中间缺失的帧按时长补静音（可关闭），保证下游看到的音频时长和节奏不变
+    4. timestamp按u32回绕展开成连续序号；换了发送方、长时间没有数据、或timestamp跳变超过max_jump（设备重启从0开始计数）时，
+       清空缓存并重建播放时钟，按新的第一帧重新对齐
+交给回调的数据与ESP32AudioStream完全一致（标称格式PCM），PlayAudio / 录音 / 流控可以直接换用
+"""
+import json
+import time
+import heapq
+import struct
+import asyncio
+import logging
+import threading
+
+from lshWebsocket import ESP32AudioStream
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!IIHH")
+MTU_PAYLOAD = 1472
+MAX_FRAGMENT = MTU_PAYLOAD - HEADER.size
+TIMESTAMP_RANGE = 1 << 32
+
+
+def fragment_frame(frame_id, timestamp, payload, mtu=MTU_PAYLOAD):
+    """把一帧拆成不超过mtu的UDP报文列表（不超过时只有一个报文）"""
+    size = mtu - HEADER.size
+    count = max(1, -(-len(payload) // size))
+    return [HEADER.pack(frame_id & 0xFFFFFFFF, timestamp & 0xFFFFFFFF, i, count) + payload[i * size:(i + 1) * size]
+            for i in range(count)]
+
+
+class _FrameEntry:
+    """frameCache中一帧的接收状态"""
+    __slots__ = ("timestamp", "fragments", "received", "first_seen")
+
+    def __init__(self, timestamp, count, now):
+        self.timestamp = timestamp
+        self.fragments = [None] * count
+        self.received = 0
+        self.first_seen = now
+
+    @property
+    def is_ready(self):
+        return self.received == len(self.fragments)
+
+
+class _ReceiverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, stream):
+        self.stream = stream
+
+    def datagram_received(self, data, addr):
+        self.stream._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        self.stream._handle_error(f"UDP接收错误: {exc}")
+
+
+class UDPAudioStream(ESP32AudioStream):
+    """UDP音频流接收：接口与ESP32AudioStream相同（set_audio_callback / add_audio_sink / start / stop ...）"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 12346, sample_rate: int = 16000,
+                 channels: int = 1, sample_width: int = 2, min_buffer: float = 0.2,
+                 frame_timeout: float = 0.5, check_interval: float = 0.005, conceal_loss: bool = True,
+                 reset_after: float = 1.0, max_jump: float = 2.0, **format_options):
+        """
+        Args:
+            host/port: 本地监听地址，port=0表示随机端口（启动后见self.port）
+            min_buffer: 最小播放缓冲(秒)，即允许的网络抖动，也是固定的附加延迟
+            frame_timeout: 残缺帧在frameCache中最多保留多久(秒)
+            check_interval: 检查frameCache和播放时钟的周期(秒)
+            conceal_loss: 丢失的帧是否按时长补静音
+            reset_after: 超过多少秒没有收到报文，下一帧重新建立播放时钟
+            max_jump: timestamp与上一帧相差超过多少秒（前后都算）视为发送端重启，重新建立播放时钟
+            format_options: align/shift/channel，非16位单声道输入的转换方式（同ESP32AudioStream）
+        """
+        super().__init__(f"udp://{host}:{port}", sample_rate, channels, sample_width, **format_options)
+        self.host = host
+        self.port = port
+        self.min_buffer = min_buffer
+        self.frame_timeout = frame_timeout
+        self.check_interval = check_interval
+        self.conceal_loss = conceal_loss
+        self.reset_after = reset_after
+        self.max_jump_samples = int(max_jump * sample_rate)
+        self.frame_cache = {}          # frameId -> _FrameEntry（未收齐的帧）
+        self.ready_play_queue = []     # (timestamp, frameId, payload) 小顶堆
+        self._bytes_per_sample = sample_width * channels
+        self._clock_base = None        # timestamp=0 对应的本地播放时刻
+        self._next_ts = None           # 下一段应播放的采样点序号
+        self._last_ts = None           # 最近一个报文展开回绕后的timestamp
+        self._peer = None
+        self._last_packet = None
+        self._loop = None
+        self._transport = None
+        self._thread = None
+        self.stats = {"packets": 0, "duplicates": 0, "late": 0, "invalid": 0, "frames": 0,
+                      "expired": 0, "lost_frames": 0, "concealed_seconds": 0.0, "resets": 0}
+
+    # ---------------- 启停 ----------------
+    def start(self):
+        """启动接收（在后台线程运行asyncio事件循环），返回时端口已绑定"""
+        with self._connection_lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="udp-audio", daemon=True)
+            self._thread.start()
+            ready.wait()
+            logger.info(f"UDP音频接收已启动: {self.host}:{self.port}")
+
+    def stop(self):
+        with self._connection_lock:
+            self.is_running = False
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop = None
+            self.stop_capture()
+            logger.info("UDP音频接收已停止")
+
+    def _run_loop(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._transport, _ = loop.run_until_complete(loop.create_datagram_endpoint(
+                lambda: _ReceiverProtocol(self), local_addr=(self.host, self.port)))
+        except OSError as e:
+            self.is_running = False
+            self._handle_error(f"UDP端口绑定失败: {e}")
+            ready.set()
+            loop.close()
+            return
+        self.port = self._transport.get_extra_info("sockname")[1]
+        self._loop = loop
+        checker = loop.create_task(self._check_loop())
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            checker.cancel()
+            self._transport.close()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                self._check(time.monotonic())
+            except Exception as e:
+                self._handle_error(f"UDP播放调度失败: {e}")
+
+    def _connect(self):
+        # UDP无连接，不需要重连
+        pass
+
+    def is_connected(self) -> bool:
+        """最近2秒内收到过报文视为在线"""
+        return self.is_running and self._last_packet is not None and time.monotonic() - self._last_packet < 2.0
+
+    def _send_command(self, command: str, params=None):
+        """控制命令发回最近一个发送方地址（协议同WebSocket文本帧）"""
+        if self._peer is None or self._loop is None:
+            self._handle_error("尚未收到设备数据，命令发送失败")
+            return False
+        message = command if params is None else json.dumps({"cmd": command, **params})
+        self._loop.call_soon_threadsafe(self._transport.sendto, message.encode("utf-8"), self._peer)
+        return True
+
+    # ---------------- 接收 / 重组 ----------------
+    def _on_datagram(self, data, addr, now=None):
+        now = time.monotonic() if now is None else now
+        if len(data) < HEADER.size:
+            self.stats["invalid"] += 1
+            return
+        frame_id, raw_ts, index, count = HEADER.unpack_from(data)
+        if count == 0 or index >= count:
+            self.stats["invalid"] += 1
+            return
+        if self._peer is None and self.open_callback:
+            self.open_callback()
+        if self._peer is not None and addr != self._peer:
+            self._reset_clock(f"发送方变为{addr}")
+        elif self._last_packet is not None and now - self._last_packet > self.reset_after:
+            self._reset_clock(f"{now - self._last_packet:.1f}秒未收到数据")
+        timestamp = self._unwrap(raw_ts)
+        if self._last_ts is not None and abs(timestamp - self._last_ts) > self.max_jump_samples:
+            self._reset_clock(f"timestamp跳变{(timestamp - self._last_ts) / self.sample_rate:+.1f}秒")
+            timestamp = raw_ts
+        self._peer = addr
+        self._last_packet = now
+        self._last_ts = timestamp
+        self.stats["packets"] += 1
+        if self._next_ts is not None and timestamp < self._next_ts:
+            # 播放时钟已经越过这一帧（来得太晚或重传重复）
+            self.stats["late"] += 1
+            return
+        entry = self.frame_cache.get(frame_id)
+        if entry is None:
+            entry = self.frame_cache[frame_id] = _FrameEntry(timestamp, count, now)
+        if index >= len(entry.fragments) or entry.fragments[index] is not None:
+            self.stats["duplicates"] += 1
+            return
+        entry.fragments[index] = data[HEADER.size:]
+        entry.received += 1
+        if entry.is_ready:
+            del self.frame_cache[frame_id]
+            self.stats["frames"] += 1
+            heapq.heappush(self.ready_play_queue, (timestamp, frame_id, b"".join(entry.fragments)))
+            if self._clock_base is None:
+                self._clock_base = now + self.min_buffer - timestamp / self.sample_rate
+
+    def _unwrap(self, timestamp):
+        """u32 timestamp回绕后按与上一帧的最短距离展开成连续序号"""
+        if self._last_ts is None:
+            return timestamp
+        delta = (timestamp - self._last_ts + TIMESTAMP_RANGE // 2) % TIMESTAMP_RANGE - TIMESTAMP_RANGE // 2
+        return self._last_ts + delta
+
+    def _reset_clock(self, reason):
+        """丢弃旧的缓存和播放时钟，下一帧到齐后重新对齐"""
+        logger.info(f"重建UDP播放时钟: {reason}")
+        self.frame_cache.clear()
+        self.ready_play_queue.clear()
+        self._clock_base = None
+        self._next_ts = None
+        self._last_ts = None
+        self.stats["resets"] += 1
+        self._reset_wire_format()
+
+    # ---------------- 过期清理 / 播放 ----------------
+    def _check(self, now):
+        """清理残缺帧，并把到播放时间的帧按timestamp顺序交给回调（事件循环线程中调用）"""
+        for frame_id in [fid for fid, entry in self.frame_cache.items()
+                         if now - entry.first_seen > self.frame_timeout
+                         or (self._next_ts is not None and entry.timestamp < self._next_ts)]:
+            del self.frame_cache[frame_id]
+            self.stats["expired"] += 1
+        if self._clock_base is None:
+            return
+        due_ts = (now - self._clock_base) * self.sample_rate
+        while self.ready_play_queue and self.ready_play_queue[0][0] <= due_ts:
+            timestamp, _, payload = heapq.heappop(self.ready_play_queue)
+            if self._next_ts is not None and timestamp < self._next_ts:
+                self.stats["late"] += 1
+                continue
+            if self._next_ts is not None and timestamp > self._next_ts:
+                gap = timestamp - self._next_ts
+                self.stats["lost_frames"] += max(1, round(gap * self._bytes_per_sample / len(payload)))
+                if self.conceal_loss:
+                    self.stats["concealed_seconds"] += gap / self.sample_rate
+                    self._on_message(None, bytes(gap * self._bytes_per_sample))
+            self._on_message(None, payload)
+            self._next_ts = timestamp + len(payload) // self._bytes_per_sample
+
+    def buffered_seconds(self):
+        """已重组待播放的音频时长"""
+        return sum(len(p) for _, _, p in self.ready_play_queue) / (self._bytes_per_sample * self.sample_rate)